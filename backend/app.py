@@ -1,13 +1,35 @@
 # Blockchain Forensics APP with Deep Analysis
 
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, Header, HTTPException, Query, Response
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
+from pydantic_core import to_json
 from typing import List, Dict, Optional, Any
-from datetime import datetime, timedelta
-from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from collections import OrderedDict, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from array import array
+from bisect import bisect_left, bisect_right
+import asyncio
+import base64
+import cProfile
+import contextvars
+import csv
+import functools
+import hashlib
+import hmac
+import json
+import logging
+import marshal
+import math
+import operator
+import sqlite3
+import sys
+import threading
+import time
 import requests
 import os
+import random
 from dotenv import load_dotenv
 
 # Load environment variables from the .env file
@@ -28,6 +50,7 @@ app.add_middleware(
     allow_credentials=True, # Allow sending cookies/credentials
     allow_methods=["*"],  # Allow all HTTP methods (GET, POST, etc.)
     allow_headers=["*"],  # Allow all headers
+    expose_headers=["X-Upstream-Compute-Units"],  # Let the dashboard read per-request provider cost
 )
 
 MORALIS_API_KEY = os.getenv("MORALIS_KEY")
@@ -36,6 +59,22 @@ MORALIS_BASE_URL = "https://deep-index.moralis.io/api/v2.2"
 if not MORALIS_API_KEY or MORALIS_API_KEY == "MORALIS_KEY":
     raise ValueError("❌ MORALIS_KEY not found in .env file")
 
+# Upper bound on simultaneous upstream calls across every fan-out (tracing, multi-address fetches)
+MORALIS_MAX_CONCURRENCY = int(os.getenv("MORALIS_MAX_CONCURRENCY", "8"))
+
+# Pooled HTTP session so concurrent fan-outs reuse TLS connections instead of reconnecting per call
+moralis_session = requests.Session()
+moralis_session.mount("https://", requests.adapters.HTTPAdapter(
+    pool_connections=MORALIS_MAX_CONCURRENCY,
+    pool_maxsize=MORALIS_MAX_CONCURRENCY
+))
+
+# Dedicated worker pool for blocking Moralis calls; its size is the global concurrency limit
+moralis_executor = ThreadPoolExecutor(
+    max_workers=MORALIS_MAX_CONCURRENCY,
+    thread_name_prefix="moralis"
+)
+
 # Define a dictionary of sanctioned addresses (e.g., Tornado Cash, known hackers)
 SANCTIONS_LIST = {
     "0x8576acc5c05d6ce88f4e49bf65bde93d537e45d1": "OFAC Sanctioned - Tornado Cash",
@@ -64,6 +103,50 @@ KNOWN_EXCHANGES = {
     "0x267be1c1d684f78cb4f6a176c4911b741e4ffdc0": "Bitfinex Hot Wallet"
 }
 
+# Embedded SQLite database holding persisted state (wallet clusters, ...)
+FORENSICS_DB_PATH = os.getenv(
+    "FORENSICS_DB_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "forensics.db")
+)
+
+# Declarative scoring rules (compiled at load time, hot-reloaded when the file changes)
+RISK_RULES_PATH = os.getenv(
+    "RISK_RULES_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "risk_rules.json")
+)
+RISK_RULES_RELOAD_SECONDS = float(os.getenv("RISK_RULES_RELOAD_SECONDS", "1"))
+
+# Offline price history: one CSV per asset (e.g. prices/ETH.csv with `timestamp,price` rows)
+PRICE_DATA_DIR = os.getenv(
+    "PRICE_DATA_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "prices")
+)
+
+# Native asset of each supported chain (Moralis chain identifiers)
+CHAIN_NATIVE_ASSETS = {
+    "eth": "ETH",
+    "sepolia": "ETH",
+    "arbitrum": "ETH",
+    "base": "ETH",
+    "optimism": "ETH",
+    "linea": "ETH",
+    "polygon": "POL",
+    "bsc": "BNB",
+    "avalanche": "AVAX",
+    "fantom": "FTM"
+}
+
+# Flat USD prices used when no series is loaded for an asset (JSON override: FALLBACK_USD_PRICES)
+FALLBACK_USD_PRICES = json.loads(os.getenv("FALLBACK_USD_PRICES", '{"ETH": 2500}'))
+
+# Value thresholds in USD, with the native-unit thresholds used when an asset has no price
+HIGH_VALUE_USD, VERY_HIGH_VALUE_USD = 25_000, 250_000
+LARGE_TX_USD, VERY_LARGE_TX_USD = 25_000, 125_000
+HIGH_VOLUME_USD, VERY_HIGH_VOLUME_USD = 250_000, 1_250_000
+HIGH_VALUE_NATIVE, VERY_HIGH_VALUE_NATIVE = 10, 100
+LARGE_TX_NATIVE, VERY_LARGE_TX_NATIVE = 10, 50
+HIGH_VOLUME_NATIVE, VERY_HIGH_VOLUME_NATIVE = 100, 500
+
 # High-Risk Method Patterns (Identify suspicious smart contract interactions)
 HIGH_RISK_METHODS = {
     "delegatecall", "selfdestruct", "create2", "suicide",
@@ -74,11 +157,18 @@ HIGH_RISK_METHODS = {
 MIXER_KEYWORDS = ["tornado", "mixer", "tumbler", "privacy", "blender", "anonymizer"]
 
 # Pydantic Models for Data Validation and Schema Documentation
+class RiskFlag(BaseModel):
+    code: str                  # Stable machine-readable code (e.g., UNLIMITED_APPROVAL)
+    params: Dict[str, Any]     # Values the message was rendered from
+    message: str               # Human-readable text, as shown in `flags`
+
 class EventAnalysis(BaseModel):
     event_type: str           
     count: int                
     risk_flags: List[str]      
     details: List[Dict[str, Any]] 
+    token_totals: Dict[str, str] = {} # Emitting contract -> exact summed amount (raw units)
+    top_addresses: Dict[str, int] = {} # Most frequent participants -> occurrences
 
 class TransactionDetails(BaseModel):
     from_address: str
@@ -88,6 +178,8 @@ class TransactionDetails(BaseModel):
     to_label: Optional[str]
     to_entity: Optional[str]
     value: str                 
+    value_wei: str = "0"       # Exact native amount in wei (integer string); `value` is its display form
+    value_usd: Optional[float] = None # Value at the block's USD price (None if unpriced)
     block_number: int
     block_timestamp: str       
     gas_used: str
@@ -96,6 +188,15 @@ class TransactionDetails(BaseModel):
     nonce: int                 # Transaction count for sender
     decoded_call: Optional[Dict] # Details of the function called
 
+class CircularFlowFinding(BaseModel):
+    scope: str                 # "transaction" (within one tx) or "address_history" (round trip across txs)
+    token: str                 # Token contract address, or "native"
+    path: List[str]            # Addresses in cycle order; the first address is repeated at the end
+    value: str                 # Amount that went all the way around (raw units, bottleneck of the cycle)
+    component_size: int        # Addresses in the strongly connected component (history scope: 2)
+    tx_hashes: List[str]       # Transactions forming the round trip (history scope)
+    duration_seconds: Optional[int] # Time between leaving and returning (history scope)
+
 class AnalysisResult(BaseModel):
     tx_hash: str
     risk_score: int            # Calculated risk (0-100)
@@ -110,6 +211,8 @@ class AnalysisResult(BaseModel):
     entity_labels: List[str]   # Labels found for involved addresses
     complexity_score: int      # Score based on tx complexity
     timing_flags: List[str]    # Alerts regarding timing (e.g., late night)
+    flag_codes: List[RiskFlag] = [] # Structured form of `flags` and `timing_flags`
+    circular_flows: List[CircularFlowFinding] = [] # Cycles in the token-transfer graph
 
 class TimePattern(BaseModel):
     tx_per_hour: float
@@ -123,8 +226,10 @@ class AddressTransaction(BaseModel):
     from_address: str
     to_address: str
     value: str
+    value_wei: str = "0"  # Exact native amount in wei (integer string)
     risk_score: int
     flags: List[str]
+    flag_codes: List[str] = []
     entity_interaction: Optional[str]
     direction: str  # "incoming" or "outgoing"
     category: str  # "transfer", "exchange", "nft", "contract"
@@ -144,6 +249,491 @@ class AddressAnalysis(BaseModel):
     mixer_interaction: bool
     time_patterns: TimePattern
     behavior_summary: Dict[str, Any] # Aggregate behavioral stats
+    flag_codes: List[RiskFlag] = [] # Structured form of `flags`
+    circular_flows: List[CircularFlowFinding] = [] # Funds returning to the address within the window
+    next_transactions_cursor: Optional[str] = None # Set when `recent_transactions` was paginated and more remain
+
+class ChainBreakdown(BaseModel):
+    chain: str
+    status: str                # "ok", "no_activity" or "error"
+    error: Optional[str]
+    elapsed_seconds: float
+    analysis: Optional[AddressAnalysis]
+
+class MultiChainAddressAnalysis(BaseModel):
+    address: str
+    chains: List[str]          # Chains requested
+    active_chains: List[str]   # Chains with transactions
+    total_transactions: int
+    risk_score: int            # Unified score over the merged flags of every chain
+    risk_level: str
+    risk_factors: List[str]
+    flags: List[str]           # Per-chain flags, prefixed with the chain name
+    flag_codes: List[RiskFlag]
+    high_risk_counterparties: List[str]
+    sanctions_check: bool
+    mixer_interaction: bool
+    elapsed_seconds: float     # Wall time of the whole fan-out (bounded by the slowest chain)
+    per_chain: Dict[str, ChainBreakdown]
+
+class ClusterWallet(BaseModel):
+    address: str
+    heuristic: Optional[str]      # Heuristic that first linked this wallet into the cluster
+    risk_category: Optional[str]  # "sanctioned" or "mixer" if on a static list
+
+class ClusterLink(BaseModel):
+    source: str
+    target: str
+    heuristic: str                # "shared_deposit", "funding_source" or "gas_payer"
+    tx_hash: str
+
+class WalletCluster(BaseModel):
+    address: str
+    cluster_id: str               # Root wallet of the cluster
+    size: int
+    heuristics: Dict[str, int]    # Evidence count per heuristic
+    wallets: List[ClusterWallet]
+    links: List[ClusterLink]
+
+class FlowEdge(BaseModel):
+    source: str
+    target: str
+    token: str                 # Token contract address, or "native" for the chain's coin
+    amount: str                # Exact sum of raw token units (integer string); NFTs count 1 per ERC-721 token
+    transfer_count: int
+    first_log_index: Optional[int] # None for the top-level native value transfer
+    kind: str                  # "transfer", "nft", "wrap", "unwrap" or "native"
+    token_ids: List[str] = []  # ERC-721/1155 token IDs moved along the edge; empty for fungible transfers
+
+class FlowBalance(BaseModel):
+    token: str
+    inflow: str                # Raw token units received
+    outflow: str               # Raw token units sent
+    net: str                   # inflow - outflow
+
+class FlowNode(BaseModel):
+    address: str
+    label: Optional[str]
+    swap_count: int            # Swap events emitted by this address (DEX pools)
+    balances: List[FlowBalance]
+
+class TransactionFlowGraph(BaseModel):
+    tx_hash: str
+    chain: str
+    log_count: int
+    transfer_count: int
+    tokens: List[str]
+    nodes: List[FlowNode]
+    edges: List[FlowEdge]
+
+class TraceHop(BaseModel):
+    from_address: str
+    to_address: str
+    tx_hash: str
+    value: str
+    value_wei: str = "0"  # Exact native amount in wei (integer string)
+    block_timestamp: str
+
+class TracePath(BaseModel):
+    target: str
+    target_label: str          # Sanctions reason or mixer name
+    category: str              # "sanctioned" or "mixer"
+    hops: int
+    path: List[TraceHop]       # Shortest hop sequence from the traced address to the target
+
+class TraceResult(BaseModel):
+    address: str
+    chain: str
+    direction: str             # "incoming", "outgoing" or "both"
+    max_hops: int
+    nodes_visited: int
+    requests_used: int
+    budget_exhausted: bool     # True if the request budget cut the crawl short
+    elapsed_seconds: float
+    paths: List[TracePath]
+
+class StoredAnalysis(BaseModel):
+    id: int
+    kind: str                  # "transaction" or "address"
+    subject: str               # Transaction hash or address that was analyzed
+    chain: str
+    analyzed_at: str
+    block_time: Optional[str]  # Block time of the transaction (latest transaction for address profiles)
+    risk_score: int
+    risk_level: str
+    value_native: Optional[float]
+    value_usd: Optional[float]
+    flag_codes: List[str]
+    result: Optional[Dict[str, Any]] # Full response as originally returned
+
+class AnalysisSearchResult(BaseModel):
+    items: List[StoredAnalysis]
+    next_cursor: Optional[str] # Pass back as `cursor` for the next page; None on the last page
+    elapsed_ms: float
+
+class ExposureSource(BaseModel):
+    source: str                # Sanctioned or mixer address the funds trace back to
+    category: str              # "sanctioned" or "mixer"
+    label: Optional[str]
+    hops: int                  # 1 = received directly from the source
+    amount: float              # Decayed tainted amount received (native units)
+
+class ExposureSummary(BaseModel):
+    address: str
+    chain: str
+    sanctioned_amount: float   # Decayed inflow tracing to sanctioned sources (native units)
+    mixer_amount: float        # Decayed inflow tracing to mixers (native units)
+    nearest_hops: Optional[int]
+    sources: List[ExposureSource]
+    index_updated_at: Optional[str] # When the background job last rebuilt this chain's index
+
+class BaselineMetric(BaseModel):
+    mean: float                # Mean in natural units (back-transformed from the log scale)
+    ewma: float                # Recent level in natural units (exponentially weighted)
+    std_log: float             # Standard deviation on the log1p scale used for z-scores
+
+class AddressBaselineStats(BaseModel):
+    address: str
+    chain: str
+    transactions_observed: int
+    mature: bool               # Enough history for wallet-relative flags to replace fixed thresholds
+    last_seen: Optional[str]
+    value: BaselineMetric      # Native value per transaction
+    inter_arrival_seconds: BaselineMetric
+    counterparty_churn: float  # Share of transactions with a never-seen counterparty
+    counterparty_churn_ewma: float
+
+class ActivityHeatmap(BaseModel):
+    address: str
+    chain: str
+    transactions: int
+    counts: List[List[int]]    # [day of week (Mon=0)][hour of day], UTC
+    value_sums: List[List[float]] # Native value per cell, UTC
+    inferred_utc_offset: Optional[int] # Hours; the offset that best aligns activity with a human day
+    timezone_confidence: float # 0-1; near 0 for round-the-clock activity
+
+class WatchlistAddRequest(BaseModel):
+    addresses: List[str]
+    chain: str = "eth"
+    priority: int = 0          # Initial risk priority (0-100); higher is polled more often
+
+class WatchlistEntry(BaseModel):
+    address: str
+    chain: str
+    risk_score: int            # Max of the initial priority and the riskiest alert so far
+    activity: float            # Smoothed count of new transactions per poll
+    last_block: Optional[int]  # Incremental cursor; None until the first (baseline) poll
+    last_polled: Optional[str]
+    next_poll: str
+    alert_count: int
+
+class WatchlistAlert(BaseModel):
+    id: int
+    created_at: str
+    address: str
+    chain: str
+    tx_hash: str
+    block_number: Optional[int]
+    risk_score: int
+    flags: List[str]
+    flag_codes: List[str]
+    delivered: bool            # Webhook delivery succeeded (always False without a webhook)
+
+class BlockScanRequest(BaseModel):
+    chain: str = "eth"
+    from_block: int
+    to_block: int              # Inclusive
+
+class BlockScanHit(BaseModel):
+    block_number: int
+    tx_hash: str
+    log_index: Optional[int]   # None for transaction-level hits
+    address: str
+    role: str                  # "from", "to", "log_emitter", "log_topic" or "log_param"
+    category: str              # "sanctioned" or "mixer"
+    reason: str
+
+class BlockScanStatus(BaseModel):
+    scan_id: int
+    chain: str
+    from_block: int
+    to_block: int
+    status: str                # "running", "paused", "completed" or "failed"
+    blocks_total: int
+    blocks_done: int           # Checkpointed blocks; a resumed scan continues after these
+    transactions_screened: int
+    hits_count: int
+    elapsed_seconds: float
+    blocks_per_second: float
+    error: Optional[str]
+    hits: List[BlockScanHit]
+
+class WatchlistStatus(BaseModel):
+    running: bool
+    addresses: int
+    due: int
+    requests_per_hour: int     # Upstream budget
+    polls: int                 # Since startup
+    alerts: int                # Since startup
+    errors: int                # Since startup
+
+# Metrics
+# Latency buckets in seconds, shared by every histogram
+METRICS_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+# How often the event loop is sampled for scheduling lag
+METRICS_LOOP_LAG_INTERVAL = float(os.getenv("METRICS_LOOP_LAG_INTERVAL", "0.5"))
+
+def escape_label(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def format_labels(names: tuple, values: tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{escape_label(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+class Metric:
+    """A labelled counter or gauge in Prometheus text exposition format"""
+
+    def __init__(self, name: str, help_text: str, kind: str = "counter", labels: tuple = ()):
+        self.name = name
+        self.help_text = help_text
+        self.kind = kind
+        self.labels = labels
+        self.values: Dict[tuple, float] = defaultdict(float)
+        self.lock = threading.Lock()
+
+    def inc(self, *label_values, amount: float = 1.0):
+        with self.lock:
+            self.values[label_values] += amount
+
+    def set(self, *label_values, value: float):
+        with self.lock:
+            self.values[label_values] = value
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.kind}"]
+        with self.lock:
+            items = list(self.values.items())
+        lines.extend(f"{self.name}{format_labels(self.labels, key)} {value:g}" for key, value in items)
+        return lines
+
+class Histogram(Metric):
+    """Labelled histogram; one bisect and three additions per observation"""
+
+    def __init__(self, name: str, help_text: str, labels: tuple = (), buckets: tuple = METRICS_LATENCY_BUCKETS):
+        super().__init__(name, help_text, "histogram", labels)
+        self.buckets = buckets
+        self.series: Dict[tuple, list] = {}  # labels -> [bucket counts, sum, count]
+
+    def observe(self, *label_values, value: float):
+        index = bisect_left(self.buckets, value)
+        with self.lock:
+            series = self.series.get(label_values)
+            if series is None:
+                series = self.series[label_values] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self.lock:
+            items = [(key, list(counts), total, count) for key, (counts, total, count) in self.series.items()]
+        for key, counts, total, count in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                le = 'le="+Inf"' if bound == float("inf") else f'le="{bound:g}"'
+                lines.append(f"{self.name}_bucket{format_labels(self.labels, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{format_labels(self.labels, key)} {total:g}")
+            lines.append(f"{self.name}_count{format_labels(self.labels, key)} {count}")
+        return lines
+
+http_requests_total = Metric("http_requests_total", "HTTP requests by route template and status", labels=("method", "route", "status"))
+http_request_seconds = Histogram("http_request_duration_seconds", "HTTP request latency by route template", labels=("method", "route"))
+http_in_flight = Metric("http_requests_in_flight", "HTTP requests currently being served", kind="gauge")
+moralis_requests_total = Metric("moralis_requests_total", "Upstream Moralis calls by endpoint template and status", labels=("endpoint", "status"))
+moralis_request_seconds = Histogram("moralis_request_duration_seconds", "Upstream Moralis latency by endpoint template", labels=("endpoint",))
+event_loop_lag_seconds = Histogram(
+    "event_loop_lag_seconds", "Delay between a scheduled event-loop wakeup and when it ran",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+)
+cache_hits_total = Metric("cache_hits_total", "Cache hits by cache", labels=("cache",))
+cache_misses_total = Metric("cache_misses_total", "Cache misses by cache", labels=("cache",))
+cache_entries = Metric("cache_entries", "Current entries by cache", kind="gauge", labels=("cache",))
+moralis_compute_units_total = Metric(
+    "moralis_compute_units_total", "Moralis compute units spent, by API client and route template", labels=("client", "route")
+)
+analysis_stage_seconds = Histogram("analysis_stage_duration_seconds", "Time spent per analysis stage", labels=("analysis", "stage"))
+
+METRICS = [
+    http_requests_total, http_request_seconds, http_in_flight,
+    moralis_requests_total, moralis_request_seconds, event_loop_lag_seconds,
+    cache_hits_total, cache_misses_total, cache_entries, analysis_stage_seconds, moralis_compute_units_total
+]
+
+# Requests slower than this are candidates for a stage-breakdown log line
+SLOW_REQUEST_SECONDS = float(os.getenv("SLOW_REQUEST_SECONDS", "2"))
+# Fraction of slow requests actually logged
+SLOW_REQUEST_SAMPLE_RATE = float(os.getenv("SLOW_REQUEST_SAMPLE_RATE", "0.1"))
+
+logger = logging.getLogger("forensics")
+
+class StageTimer:
+    """Lap timer for one request: each mark charges the time since the previous mark to a stage"""
+    __slots__ = ("started", "last", "stages")
+
+    def __init__(self):
+        self.started = self.last = time.perf_counter()
+        self.stages: Dict[str, float] = {}
+
+    def mark(self, stage: str):
+        now = time.perf_counter()
+        self.stages[stage] = self.stages.get(stage, 0.0) + now - self.last
+        self.last = now
+
+    def server_timing(self) -> str:
+        entries = [f"{stage};dur={seconds * 1000:.1f}" for stage, seconds in self.stages.items()]
+        entries.append(f"total;dur={(self.last - self.started) * 1000:.1f}")
+        return ", ".join(entries)
+
+    def finish(self, analysis: str, subject: str):
+        """Fold the stages into the metrics and log a sample of slow requests with their breakdown"""
+        for stage, seconds in self.stages.items():
+            analysis_stage_seconds.observe(analysis, stage, value=seconds)
+        total = time.perf_counter() - self.started
+        if total >= SLOW_REQUEST_SECONDS and random.random() < SLOW_REQUEST_SAMPLE_RATE:
+            breakdown = " ".join(f"{stage}={seconds * 1000:.0f}ms" for stage, seconds in self.stages.items())
+            logger.warning("slow %s analysis of %s: %.0fms (%s)", analysis, subject, total * 1000, breakdown)
+
+_stage_timer: contextvars.ContextVar[Optional[StageTimer]] = contextvars.ContextVar("stage_timer", default=None)
+
+def mark_stage(stage: str):
+    """Charge the time since the previous mark to `stage`; a no-op outside an instrumented request"""
+    timer = _stage_timer.get()
+    if timer is not None:
+        timer.mark(stage)
+
+# Compute units per upstream endpoint template, used when a response does not report its own weight
+MORALIS_COMPUTE_UNITS = {
+    "/transaction/{hash}/verbose": 10,
+    "/{address}/verbose": 10,
+    "/{address}": 10,
+    "/block/{number}": 10,
+    "/block/latest": 10,
+}
+MORALIS_COMPUTE_UNITS.update(json.loads(os.getenv("MORALIS_COMPUTE_UNITS", "{}")))
+MORALIS_DEFAULT_COMPUTE_UNITS = int(os.getenv("MORALIS_DEFAULT_COMPUTE_UNITS", "10"))
+# Distinct X-Client-Id values tracked before further clients are folded into "other"
+COMPUTE_UNIT_MAX_CLIENTS = int(os.getenv("COMPUTE_UNIT_MAX_CLIENTS", "1000"))
+
+class ComputeUnitMeter:
+    """Compute units spent by one API request; shared by its executor threads and fan-out tasks"""
+    __slots__ = ("units", "lock")
+
+    def __init__(self):
+        self.units = 0
+        self.lock = threading.Lock()
+
+    def add(self, units: int):
+        with self.lock:
+            self.units += units
+
+_compute_meter: contextvars.ContextVar[Optional[ComputeUnitMeter]] = contextvars.ContextVar("compute_meter", default=None)
+_known_clients: set = set()
+
+def charge_compute_units(template: str, response) -> int:
+    """Charge one upstream response to the current request, or to background work outside a request"""
+    weight = response.headers.get("x-request-weight")
+    if weight and weight.isdigit():
+        units = int(weight)
+    elif response.status_code < 400:
+        units = MORALIS_COMPUTE_UNITS.get(template, MORALIS_DEFAULT_COMPUTE_UNITS)
+    else:
+        units = 0
+    meter = _compute_meter.get()
+    if meter is not None:
+        meter.add(units)
+    elif units:
+        moralis_compute_units_total.inc("system", "background", amount=units)
+    return units
+
+def start_background_task(coro) -> asyncio.Task:
+    """Schedule long-lived work in an empty context, so it never inherits the meter and stage timer
+    of the request that started it and its upstream spend is charged to "system"."""
+    return asyncio.get_running_loop().create_task(coro, context=contextvars.Context())
+
+def client_label(scope) -> str:
+    """API client from the X-Client-Id header, bounded so metrics keep a fixed cardinality"""
+    for name, value in scope.get("headers", ()):
+        if name == b"x-client-id":
+            client = value.decode("latin-1")[:64] or "anonymous"
+            break
+    else:
+        return "anonymous"
+    if client not in _known_clients:
+        if len(_known_clients) >= COMPUTE_UNIT_MAX_CLIENTS:
+            return "other"
+        _known_clients.add(client)
+    return client
+
+def moralis_endpoint_template(endpoint: str) -> str:
+    """Collapse addresses, hashes and block numbers so upstream metrics stay low-cardinality"""
+    parts = []
+    for part in endpoint.split("/"):
+        if part.startswith("0x"):
+            part = "{address}" if len(part) == 42 else "{hash}"
+        elif part.isdigit():
+            part = "{number}"
+        parts.append(part)
+    return "/".join(parts)
+
+class RequestMetricsMiddleware:
+    """ASGI middleware counting requests and upstream compute units per route template"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        status = [500]
+        meter = ComputeUnitMeter()
+
+        async def send_with_status(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+                message["headers"] = list(message.get("headers", [])) + [
+                    (b"x-upstream-compute-units", str(meter.units).encode())
+                ]
+            await send(message)
+
+        start = time.perf_counter()
+        http_in_flight.inc(amount=1)
+        token = _compute_meter.set(meter)
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            _compute_meter.reset(token)
+            http_in_flight.inc(amount=-1)
+            route = scope.get("route")
+            # Unmatched paths share one series so scanners cannot blow up cardinality
+            template = getattr(route, "path", None) or "unmatched"
+            method = scope["method"]
+            http_requests_total.inc(method, template, str(status[0]))
+            http_request_seconds.observe(method, template, value=time.perf_counter() - start)
+            if meter.units:
+                moralis_compute_units_total.inc(client_label(scope), template, amount=meter.units)
+
+app.add_middleware(RequestMetricsMiddleware)
+
+async def monitor_event_loop_lag():
+    loop = asyncio.get_running_loop()
+    while True:
+        expected = loop.time() + METRICS_LOOP_LAG_INTERVAL
+        await asyncio.sleep(METRICS_LOOP_LAG_INTERVAL)
+        event_loop_lag_seconds.observe(value=max(0.0, loop.time() - expected))
 
 # Helper Functions
 def moralis_request(endpoint: str, params: Dict = None) -> Dict:
@@ -153,9 +743,19 @@ def moralis_request(endpoint: str, params: Dict = None) -> Dict:
         "accept": "application/json"
     }
     url = f"{MORALIS_BASE_URL}{endpoint}"
+    template = moralis_endpoint_template(endpoint)
+    start = time.perf_counter()
     
     try:
-        response = requests.get(url, headers=headers, params=params, timeout=15)
+        try:
+            response = moralis_session.get(url, headers=headers, params=params, timeout=15)
+        except requests.exceptions.RequestException:
+            moralis_requests_total.inc(template, "error")
+            raise
+        finally:
+            moralis_request_seconds.observe(template, value=time.perf_counter() - start)
+        moralis_requests_total.inc(template, str(response.status_code))
+        charge_compute_units(template, response)
         if response.status_code == 404:
             raise HTTPException(status_code=404, detail="Resource not found on the specified chain")
         response.raise_for_status()
@@ -167,6 +767,258 @@ def moralis_request(endpoint: str, params: Dict = None) -> Dict:
     except requests.exceptions.RequestException as e:
         raise HTTPException(status_code=500, detail=f"Moralis API error: {str(e)}")
 
+async def moralis_request_async(endpoint: str, params: Dict = None) -> Dict:
+    """Run moralis_request on the shared upstream pool without blocking the event loop"""
+    loop = asyncio.get_running_loop()
+    # Carry the caller's context into the worker so upstream costs are charged to the right request
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(
+        moralis_executor, functools.partial(context.run, moralis_request, endpoint, params)
+    )
+
+def json_response(model: BaseModel, include: Optional[Dict] = None) -> Response:
+    """Serialize a trusted model straight to JSON bytes, skipping FastAPI's response_model re-validation"""
+    return Response(content=to_json(model, include=include), media_type="application/json")
+
+async def timed_analysis(analysis: str, subject: str, handler) -> Response:
+    """Run `handler()` under a fresh StageTimer and report its stages in a Server-Timing header"""
+    timer = StageTimer()
+    token = _stage_timer.set(timer)
+    try:
+        response = await handler()
+        timer.mark("serialize")
+        response.headers["Server-Timing"] = timer.server_timing()
+        # The dashboard is served from another origin; without this its devtools hide the breakdown
+        response.headers["Timing-Allow-Origin"] = "*"
+        return response
+    finally:
+        _stage_timer.reset(token)
+        timer.finish(analysis, subject)
+
+def parse_fields(fields: Optional[str], model: type) -> Optional[Dict]:
+    """Turn `fields=a,b,c.d` into a serializer include spec; None means every field.
+
+    A dotted name selects sub-fields of a nested model or of every item of a list of models.
+    """
+    if not fields:
+        return None
+    include: Dict[str, Any] = {}
+    for path in (p.strip() for p in fields.split(",")):
+        if not path:
+            continue
+        name, _, child = path.partition(".")
+        field = model.model_fields.get(name)
+        if field is None:
+            raise HTTPException(status_code=400, detail=f"Unknown field: {name}")
+        if not child:
+            include[name] = True
+            continue
+        if include.get(name) is True:
+            continue
+        annotation = field.annotation
+        is_list = getattr(annotation, "__origin__", None) is list
+        nested = annotation.__args__[0] if is_list else annotation
+        nested = next((a for a in getattr(nested, "__args__", ()) if isinstance(a, type)), nested)  # Optional[X]
+        if isinstance(nested, type) and issubclass(nested, BaseModel) and child not in nested.model_fields:
+            raise HTTPException(status_code=400, detail=f"Unknown field: {path}")
+        if is_list:
+            include.setdefault(name, {"__all__": set()})["__all__"].add(child)
+        else:
+            include.setdefault(name, set()).add(child)
+    return include
+
+class ResponseCache:
+    """Bounded LRU of serialized responses (or tuples holding them)"""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self.entries: OrderedDict = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self.lock:
+            value = self.entries.get(key)
+            if value is not None:
+                self.entries.move_to_end(key)
+                self.hits += 1
+            else:
+                self.misses += 1
+            return value
+
+    def put(self, key, value):
+        with self.lock:
+            self.entries[key] = value
+            self.entries.move_to_end(key)
+            if len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+TX_RESPONSE_CACHE_SIZE = int(os.getenv("TX_RESPONSE_CACHE_SIZE", "2048"))
+tx_response_cache = ResponseCache(TX_RESPONSE_CACHE_SIZE)
+# How long browsers and shared caches may reuse a mined transaction's analysis before revalidating
+TX_RESPONSE_MAX_AGE = int(os.getenv("TX_RESPONSE_MAX_AGE", "300"))
+# Build identifier folded into response ETags, so a deploy never revalidates bodies built by older code
+with open(__file__, "rb") as _source:
+    APP_VERSION = os.getenv("APP_VERSION") or hashlib.sha256(_source.read()).hexdigest()[:12]
+
+def analysis_etag(*parts) -> str:
+    """Strong ETag over everything that determines an analysis body"""
+    return '"' + hashlib.sha256("|".join(str(p) for p in parts).encode()).hexdigest()[:32] + '"'
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    # If-None-Match uses weak comparison, so a W/-prefixed copy of our tag still matches
+    return if_none_match.strip() == "*" or etag in (tag.strip().removeprefix("W/") for tag in if_none_match.split(","))
+
+_db_lock = threading.RLock()
+_db_connection: Optional[sqlite3.Connection] = None
+
+def get_db() -> sqlite3.Connection:
+    """Return the shared SQLite connection, opening it on first use.
+
+    All access goes through `_db_lock`, so the single connection is safe to share between threads.
+    Async code never touches it directly; it hands store calls to `run_db`.
+    """
+    global _db_connection
+    with _db_lock:
+        if _db_connection is None:
+            conn = sqlite3.connect(FORENSICS_DB_PATH, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            _db_connection = conn
+        return _db_connection
+
+# One worker: the shared connection serializes statements anyway, and a single thread keeps writes ordered
+db_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="sqlite")
+
+async def run_db(fn, *args, **kwargs):
+    """Run blocking SQLite work on the database thread so queries and commits never stall the event loop"""
+    loop = asyncio.get_running_loop()
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(db_executor, functools.partial(context.run, fn, *args, **kwargs))
+
+class PriceSeries:
+    """Price history of one asset as two parallel, time-sorted compact arrays"""
+    __slots__ = ("timestamps", "prices")
+
+    def __init__(self, points: List[tuple[int, float]]):
+        points = sorted(points)
+        self.timestamps = array("q", (ts for ts, _ in points))
+        self.prices = array("d", (price for _, price in points))
+
+    def price_at(self, timestamp: int) -> Optional[float]:
+        """Last known price at or before `timestamp` (binary search); None before the series starts"""
+        i = bisect_right(self.timestamps, timestamp) - 1
+        return self.prices[i] if i >= 0 else None
+
+    def prices_at(self, timestamps: List[Optional[int]]) -> List[Optional[float]]:
+        """Price for every timestamp in one merge walk: sort the queries once, advance through the series"""
+        result: List[Optional[float]] = [None] * len(timestamps)
+        order = sorted((ts, i) for i, ts in enumerate(timestamps) if ts is not None)
+        series_ts, series_prices = self.timestamps, self.prices
+        j, n = -1, len(series_ts)
+        for ts, i in order:
+            while j + 1 < n and series_ts[j + 1] <= ts:
+                j += 1
+            if j >= 0:
+                result[i] = series_prices[j]
+        return result
+
+class PriceTable:
+    """USD price series per asset, loaded from CSV files without any network access"""
+
+    def __init__(self, fallback: Dict[str, float] = None):
+        self.series: Dict[str, PriceSeries] = {}
+        self.fallback = {asset.upper(): float(price) for asset, price in (fallback or {}).items()}
+        self.version = self.fingerprint()
+
+    def fingerprint(self) -> str:
+        """Digest of every loaded series and fallback price; changes whenever a USD value could"""
+        digest = hashlib.sha256(json.dumps(sorted(self.fallback.items())).encode())
+        for asset in sorted(self.series):
+            digest.update(asset.encode())
+            digest.update(self.series[asset].timestamps.tobytes())
+            digest.update(self.series[asset].prices.tobytes())
+        return digest.hexdigest()[:16]
+
+    def load_csv(self, asset: str, path: str):
+        """Load `timestamp,price` rows; timestamps may be unix seconds or ISO-8601 dates"""
+        points = []
+        with open(path, newline="", encoding="utf-8") as f:
+            for row in csv.reader(f):
+                if not row or not row[0].strip() or row[0].strip().lower() in ("timestamp", "date", "time"):
+                    continue
+                stamp, price = row[0].strip(), row[1].strip()
+                if stamp.isdigit():
+                    ts = int(stamp)
+                    if ts > 10**11:  # milliseconds
+                        ts //= 1000
+                else:
+                    dt = datetime.fromisoformat(stamp.replace("Z", "+00:00"))
+                    if dt.tzinfo is None:
+                        dt = dt.replace(tzinfo=timezone.utc)
+                    ts = int(dt.timestamp())
+                points.append((ts, float(price)))
+        self.series[asset.upper()] = PriceSeries(points)
+        self.version = self.fingerprint()
+
+    def load_directory(self, directory: str):
+        """Load every <ASSET>.csv in a directory (missing directory means no series)"""
+        if not os.path.isdir(directory):
+            return
+        for name in os.listdir(directory):
+            if name.lower().endswith(".csv"):
+                self.load_csv(os.path.splitext(name)[0], os.path.join(directory, name))
+
+    def usd_price(self, asset: str, timestamp: Optional[int]) -> Optional[float]:
+        series = self.series.get(asset)
+        price = series.price_at(timestamp) if series is not None and timestamp is not None else None
+        return price if price is not None else self.fallback.get(asset)
+
+    def usd_prices(self, asset: str, timestamps: List[Optional[int]]) -> List[Optional[float]]:
+        """Vectorized lookup for a whole history"""
+        series = self.series.get(asset)
+        fallback = self.fallback.get(asset)
+        if series is None:
+            return [fallback] * len(timestamps)
+        return [fallback if p is None else p for p in series.prices_at(timestamps)]
+
+price_table = PriceTable(FALLBACK_USD_PRICES)
+price_table.load_directory(PRICE_DATA_DIR)
+
+def native_asset(chain: str) -> str:
+    return CHAIN_NATIVE_ASSETS.get(chain.lower(), chain.upper())
+
+def to_unix_timestamp(timestamp_str: str) -> Optional[int]:
+    try:
+        return int(datetime.fromisoformat(timestamp_str.replace("Z", "+00:00")).timestamp())
+    except (AttributeError, ValueError):
+        return None
+
+WEI_PER_NATIVE = 10**18
+
+def wei_to_native(wei: int) -> float:
+    """Float view of a wei amount for thresholds and statistics; sums stay in integer wei"""
+    return wei / WEI_PER_NATIVE
+
+def format_units(amount: int, decimals: int = 18, places: int = 4) -> str:
+    """Exact decimal rendering of an integer base-unit amount, rounded half-up to `places`"""
+    sign = "-" if amount < 0 else ""
+    scaled = (abs(amount) * 10**places * 2 + 10**decimals) // (2 * 10**decimals)
+    whole, fraction = divmod(scaled, 10**places)
+    return f"{sign}{whole}.{fraction:0{places}d}" if places else f"{sign}{whole}"
+
+def value_tier(value_native: float, value_usd: Optional[float], native_thresholds: tuple, usd_thresholds: tuple) -> int:
+    """0 = normal, 1 = large, 2 = very large; USD thresholds apply whenever the value could be priced"""
+    value, (large, very_large) = (value_usd, usd_thresholds) if value_usd is not None else (value_native, native_thresholds)
+    if value > very_large:
+        return 2
+    if value > large:
+        return 1
+    return 0
+
 def check_sanctions(address: str) -> tuple[bool, Optional[str]]:
     """Check if address is on OFAC sanctions list"""
     # Normalize address to lowercase for comparison
@@ -176,6 +1028,97 @@ def check_sanctions(address: str) -> tuple[bool, Optional[str]]:
         return True, SANCTIONS_LIST[addr_lower]
     return False, None
 
+# Counterparty verdict cache
+COUNTERPARTY_CACHE_SIZE = int(os.getenv("COUNTERPARTY_CACHE_SIZE", "100000"))
+COUNTERPARTY_CACHE_TTL_SECONDS = float(os.getenv("COUNTERPARTY_CACHE_TTL_SECONDS", "3600"))
+LABEL_SET_RECHECK_SECONDS = float(os.getenv("LABEL_SET_RECHECK_SECONDS", "1"))
+
+def label_set_fingerprint() -> str:
+    """Short hash of every list a verdict depends on (sanctions, mixer addresses, mixer keywords)"""
+    payload = json.dumps(
+        [sorted(SANCTIONS_LIST.items()), sorted(MIXER_ADDRESSES.items()), MIXER_KEYWORDS],
+        separators=(",", ":")
+    )
+    return hashlib.sha256(payload.encode()).hexdigest()[:12]
+
+def classify_counterparty(address: str, label: Optional[str], entity: Optional[str]) -> tuple:
+    """Uncached verdict: (sanction reason, static mixer name, mixer keyword match as (field, name))"""
+    addr_lower = address.lower()
+    keyword_hit = None
+    if label and any(kw in label.lower() for kw in MIXER_KEYWORDS):
+        keyword_hit = ("label", label)
+    elif entity and any(kw in entity.lower() for kw in MIXER_KEYWORDS):
+        keyword_hit = ("entity", entity)
+    return SANCTIONS_LIST.get(addr_lower), MIXER_ADDRESSES.get(addr_lower), keyword_hit
+
+class CounterpartyVerdictCache:
+    """Process-wide LRU of counterparty verdicts with a TTL.
+
+    Keys include the Moralis label and entity seen with the address, so a relabelled address is
+    classified afresh. The sanctions/mixer lists are fingerprinted at most every
+    LABEL_SET_RECHECK_SECONDS; when they change, every cached verdict is dropped.
+    """
+
+    def __init__(self, max_size: int, ttl_seconds: float):
+        self.max_size = max_size
+        self.ttl = ttl_seconds
+        self.entries: OrderedDict = OrderedDict()
+        self.lock = threading.Lock()
+        self.version = label_set_fingerprint()
+        self.checked = time.monotonic()
+        self.hits = 0
+        self.misses = 0
+
+    def maybe_invalidate(self, now: float):
+        if now - self.checked < LABEL_SET_RECHECK_SECONDS:
+            return
+        self.checked = now
+        version = label_set_fingerprint()
+        if version != self.version:
+            self.version = version
+            self.entries.clear()
+
+    def verdict(self, address: str, label: Optional[str] = None, entity: Optional[str] = None) -> tuple:
+        key = (address.lower(), label, entity)
+        now = time.monotonic()
+        with self.lock:
+            self.maybe_invalidate(now)
+            entry = self.entries.get(key)
+            if entry is not None and entry[0] > now:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+            verdict = classify_counterparty(address, label, entity)
+            self.entries[key] = (now + self.ttl, verdict)
+            self.entries.move_to_end(key)
+            if len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+            return verdict
+
+    def current_version(self) -> str:
+        """Fingerprint of the label sets in effect, dropping stale verdicts if they changed"""
+        with self.lock:
+            self.maybe_invalidate(time.monotonic())
+            return self.version
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+counterparty_verdicts = CounterpartyVerdictCache(COUNTERPARTY_CACHE_SIZE, COUNTERPARTY_CACHE_TTL_SECONDS)
+
+def screen_counterparty(address: str, label: Optional[str] = None, entity: Optional[str] = None) -> Optional[tuple[str, str]]:
+    """Classify an address as a sanctioned or mixer node using static lists and Moralis labels"""
+    sanction_reason, mixer_name, keyword_hit = counterparty_verdicts.verdict(address, label, entity)
+    if sanction_reason:
+        return "sanctioned", sanction_reason
+    if mixer_name:
+        return "mixer", mixer_name
+    if keyword_hit:
+        return "mixer", keyword_hit[1]
+    return None
+
 def extract_moralis_labels(tx_data: Dict) -> tuple[List[str], bool, bool]:
     """Extract entity labels from Moralis response + static lists (layered approach)"""
     labels = []
@@ -234,94 +1177,734 @@ def extract_moralis_labels(tx_data: Dict) -> tuple[List[str], bool, bool]:
     
     return labels, is_mixer, is_exchange
 
-def analyze_events(logs: List[Dict]) -> tuple[List[EventAnalysis], List[str]]:
-    """Deep analysis of all transaction events (logs)"""
-    event_counts = defaultdict(list)
-    flags = []
+# Local event decoding for logs Moralis could not decode (unverified contracts)
+EVENT_SIGNATURES_PATH = os.getenv(
+    "EVENT_SIGNATURES_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "event_signatures.json")
+)
+EVENT_DECODER_CACHE_SIZE = int(os.getenv("EVENT_DECODER_CACHE_SIZE", "1024"))
+
+def load_event_signatures(path: str) -> Dict[str, Dict]:
+    """Load the bundled topic0 -> event ABI table"""
+    with open(path, encoding="utf-8") as f:
+        return {topic.lower(): spec for topic, spec in json.load(f).items()}
+
+EVENT_SIGNATURES = load_event_signatures(EVENT_SIGNATURES_PATH)
+
+# Event names by topic0, used to classify logs that cannot be decoded at all
+EVENT_TOPICS = {topic: spec["name"] for topic, spec in EVENT_SIGNATURES.items()}
+
+TOPIC_TRANSFER = "0xddf252ad1be2c89b69c2b068fc378daa952ba7f163c4a11628f55a4df523b3ef"
+TOPIC_APPROVAL = "0x8c5be1e5ebec7d5bd14f71427d1e84f3dd0314c0f7b2291e5b200ac8c7c3b925"
+# WETH9 Deposit(address indexed dst, uint256 wad) / Withdrawal(address indexed src, uint256 wad)
+WETH_WRAP_TOPICS = {
+    "Deposit": "0xe1fffcc4923d04b559f4d29a8bfc6cda04eb5b0d3c460751c2402c5c5cc9109c",
+    "Withdrawal": "0x7fcf532c15f0a6db0bd6d0e038bea71d30d808c7d98cb3bf7268a95bf5081b65",
+}
+WETH_WRAP_PARAMS = {"Deposit": ("dst", "wad"), "Withdrawal": ("src", "wad")}
+
+def log_topics(log: Dict) -> List[str]:
+    """Topics of a log, from either a `topics` list or Moralis-style topic0..topic3 keys"""
+    topics = log.get("topics")
+    if topics:
+        return [t.lower() for t in topics if t]
+    result = []
+    for key in ("topic0", "topic1", "topic2", "topic3"):
+        topic = log.get(key)
+        if not topic:
+            break
+        result.append(topic.lower())
+    return result
+
+def abi_word_to_value(word: str, abi_type: str) -> str:
+    """Decode one 32-byte ABI word (64 hex chars) of a static type"""
+    if abi_type == "address":
+        return "0x" + word[-40:]
+    if abi_type == "bool":
+        return "true" if int(word, 16) else "false"
+    if abi_type.startswith("uint"):
+        return str(int(word, 16))
+    if abi_type.startswith("int"):
+        # Signed types are sign-extended to 256 bits
+        value = int(word, 16)
+        return str(value - (1 << 256) if value >= 1 << 255 else value)
+    return "0x" + word  # bytes32 and other fixed-size values
+
+def is_dynamic_abi_type(abi_type: str) -> bool:
+    return abi_type in ("bytes", "string") or abi_type.endswith("[]")
+
+def decode_dynamic_value(data: str, offset: int, abi_type: str):
+    """Decode a dynamic value whose head word holds a byte offset into the data"""
+    pos = offset * 2
+    length = int(data[pos:pos + 64], 16)
+    body = pos + 64
+    if abi_type.endswith("[]"):
+        element_type = abi_type[:-2]
+        return [
+            abi_word_to_value(data[body + i * 64:body + (i + 1) * 64], element_type)
+            for i in range(length)
+        ]
+    raw = data[body:body + length * 2]
+    if abi_type == "string":
+        return bytes.fromhex(raw).decode("utf-8", errors="replace")
+    return "0x" + raw
+
+@functools.lru_cache(maxsize=EVENT_DECODER_CACHE_SIZE)
+def get_event_decoder(topic0: str, topic_count: int):
+    """Build (and cache) a decoder for an event signature and indexed-topic count; None if unknown"""
+    spec = EVENT_SIGNATURES.get(topic0)
+    if spec is None:
+        return None
+
+    inputs = spec["inputs"]
+    layout = [(i["name"], i["type"], i["indexed"]) for i in inputs]
+    if sum(1 for _, _, indexed in layout if indexed) != topic_count - 1:
+        # ERC-721 reuses the ERC-20 Transfer/Approval signature with every argument indexed
+        if topic_count - 1 != len(layout):
+            return None
+        layout = [(name, abi_type, True) for name, abi_type, _ in layout]
+        if spec["name"] in ("Transfer", "Approval"):
+            layout[-1] = ("tokenId", layout[-1][1], True)
+
+    label = spec["name"]
+    signature = spec["signature"]
+
+    def decode(topics: List[str], data: str) -> Dict:
+        params = []
+        topic_index = 1
+        word_index = 0
+        for name, abi_type, indexed in layout:
+            if indexed:
+                topic = topics[topic_index][2:]
+                topic_index += 1
+                # Indexed dynamic values are stored as their keccak hash
+                value = "0x" + topic if is_dynamic_abi_type(abi_type) else abi_word_to_value(topic, abi_type)
+            else:
+                head = data[word_index * 64:(word_index + 1) * 64]
+                word_index += 1
+                if is_dynamic_abi_type(abi_type):
+                    value = decode_dynamic_value(data, int(head, 16), abi_type)
+                else:
+                    value = abi_word_to_value(head, abi_type)
+            params.append({"name": name, "value": value, "type": abi_type})
+        return {"label": label, "signature": signature, "type": "event", "params": params, "decoded_by": "local"}
+
+    return decode
+
+def decode_token_event(topic0: str, topics: List[str], data: str) -> Optional[Dict]:
+    """Fast path for ERC-20/721 Transfer and Approval, which dominate most transactions"""
+    is_transfer = topic0 == TOPIC_TRANSFER
+    if len(topics) == 3:
+        amount_name, amount = "value", str(int(data[:64], 16))
+    elif len(topics) == 4:
+        amount_name, amount = "tokenId", str(int(topics[3], 16))
+    else:
+        return None
+    return {
+        "label": "Transfer" if is_transfer else "Approval",
+        "signature": "Transfer(address,address,uint256)" if is_transfer else "Approval(address,address,uint256)",
+        "type": "event",
+        "params": [
+            {"name": "from" if is_transfer else "owner", "value": "0x" + topics[1][-40:], "type": "address"},
+            {"name": "to" if is_transfer else "spender", "value": "0x" + topics[2][-40:], "type": "address"},
+            {"name": amount_name, "value": amount, "type": "uint256"}
+        ],
+        "decoded_by": "local"
+    }
+
+def decode_log(log: Dict) -> Optional[Dict]:
+    """Decode a raw log (topics + data) in-process; returns a Moralis-shaped decoded_event or None"""
+    topics = log_topics(log)
+    if not topics:
+        return None
+    data = log.get("data") or ""
+    data = data[2:] if data.startswith("0x") else data
+    topic0 = topics[0]
+    try:
+        if topic0 == TOPIC_TRANSFER or topic0 == TOPIC_APPROVAL:
+            return decode_token_event(topic0, topics, data)
+        decoder = get_event_decoder(topic0, len(topics))
+        return decoder(topics, data) if decoder else None
+    except (ValueError, IndexError):
+        # Truncated or malformed log data
+        return None
+
+def decode_missing_events(logs: List[Dict]) -> int:
+    """Fill in `decoded_event` for logs Moralis left undecoded; returns how many were decoded locally"""
+    decoded_count = 0
+    for log in logs:
+        if not log.get("decoded_event"):
+            decoded = decode_log(log)
+            if decoded:
+                log["decoded_event"] = decoded
+                decoded_count += 1
+    return decoded_count
+
+# Exact integer thresholds (raw token units); uint256 values never pass through float
+UNLIMITED_APPROVAL_THRESHOLD = 10**50
+LARGE_WRAP_THRESHOLD = 10**20  # > 100 ETH/WETH
+
+APPROVAL_AMOUNT_PARAMS = ("amount", "value", "wad", "_value")
+APPROVAL_SPENDER_PARAMS = ("spender", "guy", "_spender", "operator")
+NFT_ID_PARAMS = ("tokenId", "_tokenId", "id")
+ERC1155_OPERATOR_PARAMS = ("operator", "_operator")
+
+class EventGroup:
+    """Accumulator for one event type during a single pass over the logs"""
+    __slots__ = ("count", "details", "token_counts", "token_amounts", "addresses", "counters")
+
+    def __init__(self):
+        self.count = 0
+        self.details = []
+        self.token_counts = defaultdict(int)   # emitting contract -> occurrences
+        self.token_amounts = defaultdict(int)  # emitting contract -> exact summed amount
+        self.addresses = defaultdict(int)      # participant -> occurrences
+        self.counters = defaultdict(int)       # handler-specific tallies
+
+def int_param(params: List[Dict], names: tuple) -> Optional[int]:
+    """Exact integer value of the first matching decoded param (None if absent or non-numeric)"""
+    value = find_param(params, names)
+    if value is None:
+        return None
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+def count_participants(group: EventGroup, params: List[Dict], *name_sets: tuple):
+    for names in name_sets:
+        value = find_param(params, names)
+        if value:
+            group.addresses[value.lower()] += 1
+
+def on_transfer(group: EventGroup, token: str, params: List[Dict], log: Dict):
+    count_participants(group, params, FLOW_SOURCE_PARAMS, FLOW_TARGET_PARAMS)
+    # ERC-721 Transfer carries a tokenId (indexed, so undecoded logs have a 4th topic)
+    if find_param(params, NFT_ID_PARAMS) is not None or log.get("topic3"):
+        group.counters["nft"] += 1
+        return
+    amount = int_param(params, FLOW_AMOUNT_PARAMS)
+    if amount is not None:
+        group.token_amounts[token] += amount
+
+def on_approval(group: EventGroup, token: str, params: List[Dict], log: Dict):
+    count_participants(group, params, APPROVAL_SPENDER_PARAMS)
+    amount = int_param(params, APPROVAL_AMOUNT_PARAMS)
+    if amount is not None and amount > UNLIMITED_APPROVAL_THRESHOLD:
+        group.counters["unlimited"] += 1
+
+def on_approval_for_all(group: EventGroup, token: str, params: List[Dict], log: Dict):
+    count_participants(group, params, APPROVAL_SPENDER_PARAMS)
+    approved = find_param(params, ("approved", "_approved"))
+    if approved in (True, "true", "True", "1"):
+        group.counters["granted"] += 1
+
+def on_erc1155_transfer(group: EventGroup, token: str, params: List[Dict], log: Dict):
+    count_participants(group, params, FLOW_SOURCE_PARAMS, FLOW_TARGET_PARAMS)
+    group.counters["nft"] += 1
+
+def is_weth_wrap(label: str, params: List[Dict], log: Dict) -> bool:
+    """Deposit/Withdrawal is a native-coin wrap only with WETH9's exact signature.
+
+    Staking pools, vaults and MasterChef reuse the names (e.g. `Deposit(user, pid, amount)`) for
+    token deposits that move no native coin.
+    """
+    topics = log_topics(log)
+    if topics:
+        return topics[0] == WETH_WRAP_TOPICS[label]
+    return tuple(p.get("name") for p in params) == WETH_WRAP_PARAMS[label]
+
+def on_wrap(label: str, group: EventGroup, token: str, params: List[Dict], log: Dict):
+    count_participants(group, params, ("dst", "src", "to", "from", "account", "user"))
+    if not is_weth_wrap(label, params, log):
+        return  # Same event name from another protocol: counted, but no wrapped amount
+    amount = int_param(params, ("wad",))
+    if amount is not None:
+        group.token_amounts[token] += amount
+        if amount > LARGE_WRAP_THRESHOLD:
+            group.counters["large"] += 1
+
+def on_swap(group: EventGroup, token: str, params: List[Dict], log: Dict):
+    count_participants(group, params, ("sender", "recipient", "to"))
+
+def on_sync(group: EventGroup, token: str, params: List[Dict], log: Dict):
+    pass  # Pool reserve updates: occurrences per pool are all we track
+
+def on_flash_loan(group: EventGroup, token: str, params: List[Dict], log: Dict):
+    count_participants(group, params, ("target", "receiver", "recipient", "initiator"))
+    asset = find_param(params, ("asset", "token", "reserve"))
+    amount = int_param(params, ("amount", "amount0", "amount1"))
+    if asset and amount is not None:
+        group.token_amounts[asset.lower()] += amount
+
+def on_bridge(group: EventGroup, token: str, params: List[Dict], log: Dict):
+    count_participants(group, params, FLOW_SOURCE_PARAMS, FLOW_TARGET_PARAMS, ("depositor", "sender"))
+
+def on_unknown(group: EventGroup, token: str, params: List[Dict], log: Dict):
+    pass
+
+def finish_transfer(event_type: str, group: EventGroup) -> tuple[List[str], List[RiskFlag]]:
+    event_flags, flags = [], []
+    # Count how many distinct tokens were moved
+    unique_tokens = len(group.token_counts)
+    if unique_tokens > 5:
+        event_flags.append(f"Multiple tokens: {unique_tokens}")
+        flags.append(make_flag(
+            "COMPLEX_TOKEN_FLOW",
+            f"🔄 Complex flow: {unique_tokens} different tokens",
+            token_count=unique_tokens
+        ))
+    if group.counters["nft"]:
+        event_flags.append(f"{group.counters['nft']} NFT transfer(s)")
+    return event_flags, flags
+
+def finish_approval(event_type: str, group: EventGroup) -> tuple[List[str], List[RiskFlag]]:
+    unlimited = group.counters["unlimited"]
+    if not unlimited:
+        return [], []
+    return [f"{unlimited} unlimited approval(s)"], [make_flag(
+        "UNLIMITED_APPROVAL",
+        f"⚠️ {unlimited} unlimited token approval(s) detected",
+        count=unlimited
+    )]
+
+def finish_approval_for_all(event_type: str, group: EventGroup) -> tuple[List[str], List[RiskFlag]]:
+    granted = group.counters["granted"]
+    if not granted:
+        return [], []
+    return [f"{granted} collection-wide approval(s)"], [make_flag(
+        "NFT_APPROVAL_FOR_ALL",
+        f"⚠️ {granted} NFT collection-wide approval(s) granted",
+        count=granted
+    )]
+
+def finish_nft_transfer(event_type: str, group: EventGroup) -> tuple[List[str], List[RiskFlag]]:
+    return [f"{group.count} multi-token (ERC-1155) transfer(s)"], []
+
+def finish_wrap(event_type: str, group: EventGroup) -> tuple[List[str], List[RiskFlag]]:
+    large = group.counters["large"]
+    if not large:
+        return [], []
+    return [f"{large} large {event_type.lower()}(s)"], []
+
+def finish_swap(event_type: str, group: EventGroup) -> tuple[List[str], List[RiskFlag]]:
+    # Many swaps in one tx indicate multi-hop routing
+    if group.count <= 3:
+        return [], []
+    return [f"Multi-hop swap: {group.count} swaps"], [make_flag(
+        "MULTI_HOP_SWAP",
+        f"🔄 Complex DEX routing: {group.count} swap hops",
+        swap_count=group.count
+    )]
+
+def finish_sync(event_type: str, group: EventGroup) -> tuple[List[str], List[RiskFlag]]:
+    return [f"Reserves updated in {len(group.token_counts)} pool(s)"], []
+
+def finish_flash_loan(event_type: str, group: EventGroup) -> tuple[List[str], List[RiskFlag]]:
+    return [f"{group.count} flash loan(s)"], [make_flag(
+        "FLASH_LOAN",
+        f"⚡ Flash loan: {group.count} loan(s) from {len(group.token_counts)} pool(s)",
+        count=group.count
+    )]
+
+def finish_bridge(event_type: str, group: EventGroup) -> tuple[List[str], List[RiskFlag]]:
+    return [f"Cross-chain transfer ({event_type})"], [make_flag(
+        "BRIDGE_TRANSFER",
+        f"🌉 Cross-chain bridge activity: {event_type}",
+        event=event_type,
+        count=group.count
+    )]
+
+def finish_unknown(event_type: str, group: EventGroup) -> tuple[List[str], List[RiskFlag]]:
+    return [f"{group.count} undecoded log(s) from {len(group.token_counts)} contract(s)"], []
+
+# Dispatch table: event name -> (per-log handler, per-type finalizer)
+EVENT_HANDLERS = {
+    "Transfer": (on_transfer, finish_transfer),
+    "Approval": (on_approval, finish_approval),
+    "ApprovalForAll": (on_approval_for_all, finish_approval_for_all),
+    "TransferSingle": (on_erc1155_transfer, finish_nft_transfer),
+    "TransferBatch": (on_erc1155_transfer, finish_nft_transfer),
+    "Deposit": (functools.partial(on_wrap, "Deposit"), finish_wrap),
+    "Withdrawal": (functools.partial(on_wrap, "Withdrawal"), finish_wrap),
+    "Swap": (on_swap, finish_swap),
+    "Swapped": (on_swap, finish_swap),
+    "Sync": (on_sync, finish_sync),
+    "FlashLoan": (on_flash_loan, finish_flash_loan),
+    "Flash": (on_flash_loan, finish_flash_loan),
+    "TokensBridged": (on_bridge, finish_bridge),
+    "DepositInitiated": (on_bridge, finish_bridge),
+    "ERC20DepositInitiated": (on_bridge, finish_bridge),
+    "WithdrawalInitiated": (on_bridge, finish_bridge),
+    "TransferSentToL2": (on_bridge, finish_bridge),
+    "LogMessagePublished": (on_bridge, finish_bridge),
+    "V3FundsDeposited": (on_bridge, finish_bridge),
+    "OFTSent": (on_bridge, finish_bridge),
+    "SendToChain": (on_bridge, finish_bridge)
+}
+DEFAULT_EVENT_HANDLER = (on_unknown, None)
+UNDECODED_EVENT_TYPE = "Unknown"
+
+def analyze_events(logs: List[Dict]) -> tuple[List[EventAnalysis], List[RiskFlag]]:
+    """Deep analysis of all transaction events (logs) in a single pass.
+
+    Each log is dispatched by its decoded label, or by topic0 when Moralis could not decode it,
+    to a handler that updates its event type's running aggregates in place. Finalizers then turn
+    each type's aggregates into event-level and transaction-level flags.
+    """
+    groups: Dict[str, EventGroup] = {}
     
-    # Iterate through all event logs
     for log in logs:
         decoded = log.get("decoded_event")
-        # Skip if event wasn't decoded (unknown signature)
-        if not decoded:
-            continue
+        if decoded:
+            event_type = decoded.get("label") or UNDECODED_EVENT_TYPE
+            params = decoded.get("params") or []
+        else:
+            topics = log_topics(log)
+            event_type = EVENT_TOPICS.get(topics[0], UNDECODED_EVENT_TYPE) if topics else UNDECODED_EVENT_TYPE
+            params = []
         
-        # Get event name (e.g., Transfer, Approval)
-        event_type = decoded.get("label", "Unknown")
-        # Extract parameters into a dictionary
-        params = {p["name"]: p["value"] for p in decoded.get("params", [])}
+        group = groups.get(event_type)
+        if group is None:
+            group = groups[event_type] = EventGroup()
+        token = (log.get("address") or "").lower()
+        group.count += 1
+        group.token_counts[token] += 1
+        EVENT_HANDLERS.get(event_type, DEFAULT_EVENT_HANDLER)[0](group, token, params, log)
         
-        # Group events by type
-        event_counts[event_type].append({
-            "address": log.get("address"),
-            "params": params,
-            "log_index": log.get("log_index")
-        })
+        # Only the first few occurrences are returned, so only they are materialized
+        if len(group.details) < 3:
+            group.details.append({
+                "address": log.get("address"),
+                "params": {p.get("name"): p.get("value") for p in params},
+                "log_index": log.get("log_index")
+            })
     
     # Analyze each event type group
     analyses = []
-    
-    for event_type, occurrences in event_counts.items():
-        event_flags = []
-        
-        # Check for dangerous Approvals (infinite allowance)
-        if event_type == "Approval":
-            # Check for very large amounts (near uint256 max)
-            unlimited = sum(1 for e in occurrences 
-                          if int(e["params"].get("amount", 0)) > 1e50)
-            if unlimited > 0:
-                event_flags.append(f"{unlimited} unlimited approval(s)")
-                flags.append(f"⚠️ {unlimited} unlimited token approval(s) detected")
-        
-        # Check for complex Transfer patterns
-        elif event_type == "Transfer":
-            # Count how many distinct tokens were moved
-            unique_tokens = len(set(e["address"] for e in occurrences))
-            if unique_tokens > 5:
-                event_flags.append(f"Multiple tokens: {unique_tokens}")
-                flags.append(f"🔄 Complex flow: {unique_tokens} different tokens")
-        
-        # Check for Swaps (DEX interactions)
-        elif event_type in ["Swap", "Swapped"]:
-            # Check if there are many swaps in one tx (routing?)
-            if len(occurrences) > 3:
-                event_flags.append(f"Multi-hop swap: {len(occurrences)} swaps")
-                flags.append(f"🔄 Complex DEX routing: {len(occurrences)} swap hops")
-        
-        # Check for large Withdrawals
-        elif event_type == "Withdrawal":
-            # Identify large outbound native token moves
-            large_withdrawals = sum(1 for e in occurrences 
-                                   if int(e["params"].get("wad", 0)) > 1e20) # > 100 ETH
-            if large_withdrawals > 0:
-                event_flags.append(f"{large_withdrawals} large withdrawal(s)")
-        
-        # Append analysis for this event type
+    flags = []
+    for event_type, group in groups.items():
+        finisher = EVENT_HANDLERS.get(event_type, DEFAULT_EVENT_HANDLER)[1]
+        if finisher is None:
+            finisher = finish_unknown if event_type == UNDECODED_EVENT_TYPE else None
+        event_flags, type_flags = finisher(event_type, group) if finisher else ([], [])
+        flags.extend(type_flags)
+        
+        top_addresses = sorted(group.addresses.items(), key=lambda x: x[1], reverse=True)[:5]
         analyses.append(EventAnalysis(
             event_type=event_type,
-            count=len(occurrences),
+            count=group.count,
             risk_flags=event_flags,
-            details=occurrences[:3]  # Return details for First 3 occurrences only
+            details=group.details,
+            token_totals={token: str(amount) for token, amount in group.token_amounts.items()},
+            top_addresses=dict(top_addresses)
         ))
     
     return analyses, flags
 
-def analyze_timing(timestamp_str: str) -> List[str]:
-    """Analyze transaction timing for suspicious patterns (e.g., late night hours)"""
-    flags = []
-    
-    try:
-        # standardizing timestamp format
-        dt = datetime.fromisoformat(timestamp_str.replace("Z", "+00:00"))
-        hour = dt.hour
-        
-        # Check for Late night activity (2 AM - 5 AM UTC) - often correlates with hack timing
-        if 2 <= hour <= 5:
-            flags.append(f"🌙 Late-night activity ({hour:02d}:00 UTC)")
-        
-        # Check for Weekend activity (banks closed, less monitoring)
-        if dt.weekday() >= 5:
-            flags.append("📅 Weekend transaction")
+# Parameter names used for the same role across token contracts (ERC-20, WETH9, ERC-721, ERC-1155)
+FLOW_SOURCE_PARAMS = ("from", "src", "_from", "sender")
+FLOW_TARGET_PARAMS = ("to", "dst", "_to", "recipient")
+# Token IDs are identifiers, not quantities, so they are never read as an amount
+FLOW_AMOUNT_PARAMS = ("value", "wad", "amount", "_value")
+ERC1155_ID_PARAMS = ("ids", "_ids")
+ERC1155_VALUE_PARAMS = ("values", "_values", "amounts")
+NATIVE_TOKEN = "native"
+
+def find_param(params: List[Dict], names: tuple) -> Optional[str]:
+    """Return the value of the first decoded param whose name is in `names`"""
+    for param in params:
+        if param.get("name") in names:
+            return param.get("value")
+    return None
+
+def list_param(params: List[Dict], names: tuple) -> Optional[List[str]]:
+    """Array param as a list of strings; decoders render arrays as lists, JSON or comma-separated text"""
+    value = find_param(params, names)
+    if value is None:
+        return None
+    if isinstance(value, str):
+        value = json.loads(value) if value.startswith("[") else [v for v in value.split(",") if v.strip()]
+    return [str(v).strip() for v in value]
+
+def build_token_flow_graph(tx_data: Dict) -> tuple[Dict, Dict, Dict, int]:
+    """Aggregate every value movement in a transaction into a directed multi-token graph.
+
+    One pass over the logs: each Transfer/Deposit/Withdrawal adds to its (source, target, token)
+    edge and to both endpoints' per-token in/out totals; Swap events are counted per pool.
+    Returns (edges, balances, swap_counts, transfer_count) with exact integer amounts.
+    """
+    # (source, target, token) -> [amount, count, first_log_index, kind, token_ids]
+    edges: Dict[tuple, list] = {}
+    # address -> token -> [inflow, outflow]
+    balances: Dict[str, Dict[str, list]] = defaultdict(dict)
+    swap_counts: Dict[str, int] = defaultdict(int)
+    transfer_count = 0
+
+    def add(source, target, token, amount, log_index, kind, token_ids=()):
+        key = (source, target, token)
+        edge = edges.get(key)
+        if edge is None:
+            edges[key] = [amount, 1, log_index, kind, list(token_ids)]
+        else:
+            edge[0] += amount
+            edge[1] += 1
+            edge[4].extend(token_ids)
+        out_totals = balances[source].setdefault(token, [0, 0])
+        out_totals[1] += amount
+        in_totals = balances[target].setdefault(token, [0, 0])
+        in_totals[0] += amount
+
+    from_addr = (tx_data.get("from_address") or "").lower()
+    to_addr = (tx_data.get("to_address") or "").lower()
+    native_value = int(tx_data.get("value", 0) or 0)
+    if native_value > 0 and to_addr:
+        add(from_addr, to_addr, NATIVE_TOKEN, native_value, None, "native")
+        transfer_count += 1
+
+    for log in tx_data.get("logs", []):
+        decoded = log.get("decoded_event")
+        if not decoded:
+            continue
+        label = decoded.get("label")
+        params = decoded.get("params", [])
+        token = (log.get("address") or "").lower()
+        log_index = log.get("log_index")
+
+        try:
+            if label == "Transfer":
+                source = find_param(params, FLOW_SOURCE_PARAMS)
+                target = find_param(params, FLOW_TARGET_PARAMS)
+                if source is None or target is None:
+                    continue
+                # ERC-721 Transfer carries a tokenId (indexed, so undecoded logs have a 4th topic)
+                token_id = find_param(params, NFT_ID_PARAMS)
+                if token_id is None and log.get("topic3"):
+                    token_id = str(int(log["topic3"], 16))
+                if token_id is not None:
+                    add(source.lower(), target.lower(), token, 1, log_index, "nft", [str(token_id)])
+                else:
+                    amount = find_param(params, FLOW_AMOUNT_PARAMS)
+                    if amount is None:
+                        continue
+                    add(source.lower(), target.lower(), token, int(amount), log_index, "transfer")
+                transfer_count += 1
+            elif label in ("TransferSingle", "TransferBatch"):
+                source = find_param(params, FLOW_SOURCE_PARAMS)
+                target = find_param(params, FLOW_TARGET_PARAMS)
+                if label == "TransferSingle":
+                    ids, values = [find_param(params, NFT_ID_PARAMS)], [find_param(params, FLOW_AMOUNT_PARAMS)]
+                else:
+                    ids, values = list_param(params, ERC1155_ID_PARAMS), list_param(params, ERC1155_VALUE_PARAMS)
+                if source is None or target is None or not ids or not values or len(ids) != len(values) or None in ids + values:
+                    continue
+                add(
+                    source.lower(), target.lower(), token, sum(int(v) for v in values), log_index, "nft",
+                    [str(i) for i in ids]
+                )
+                transfer_count += 1
+            elif label == "Deposit" and is_weth_wrap(label, params, log):
+                # WETH wrap: native coin in, wrapped token out
+                holder = find_param(params, ("dst",))
+                amount = find_param(params, ("wad",))
+                if holder is None or amount is None:
+                    continue
+                add(holder.lower(), token, NATIVE_TOKEN, int(amount), log_index, "wrap")
+                add(token, holder.lower(), token, int(amount), log_index, "wrap")
+                transfer_count += 2
+            elif label == "Withdrawal" and is_weth_wrap(label, params, log):
+                # WETH unwrap: wrapped token in, native coin out
+                holder = find_param(params, ("src",))
+                amount = find_param(params, ("wad",))
+                if holder is None or amount is None:
+                    continue
+                add(holder.lower(), token, token, int(amount), log_index, "unwrap")
+                add(token, holder.lower(), NATIVE_TOKEN, int(amount), log_index, "unwrap")
+                transfer_count += 2
+            elif label in ("Swap", "Swapped"):
+                swap_counts[token] += 1
+        except (TypeError, ValueError):
+            # Non-numeric amounts come from non-standard events that reuse a known label
+            continue
+
+    return edges, balances, swap_counts, transfer_count
+
+# Circular flow detection
+CIRCULAR_FLOW_WINDOW_HOURS = float(os.getenv("CIRCULAR_FLOW_WINDOW_HOURS", "72"))
+CIRCULAR_FLOW_MAX_FINDINGS = 20
+
+def strongly_connected_components(adjacency: Dict[str, List[str]]) -> List[List[str]]:
+    """Tarjan's algorithm (iterative, so deep graphs cannot hit the recursion limit); O(V + E)"""
+    index: Dict[str, int] = {}
+    low: Dict[str, int] = {}
+    on_stack = set()
+    stack = []
+    components = []
+    counter = 0
+
+    for start in adjacency:
+        if start in index:
+            continue
+        index[start] = low[start] = counter
+        counter += 1
+        stack.append(start)
+        on_stack.add(start)
+        work = [(start, iter(adjacency.get(start, ())))]
+
+        while work:
+            node, successors = work[-1]
+            descended = False
+            for nxt in successors:
+                if nxt not in index:
+                    index[nxt] = low[nxt] = counter
+                    counter += 1
+                    stack.append(nxt)
+                    on_stack.add(nxt)
+                    work.append((nxt, iter(adjacency.get(nxt, ()))))
+                    descended = True
+                    break
+                if nxt in on_stack:
+                    low[node] = min(low[node], index[nxt])
+            if descended:
+                continue
+
+            work.pop()
+            if work:
+                parent = work[-1][0]
+                low[parent] = min(low[parent], low[node])
+            if low[node] == index[node]:
+                component = []
+                while True:
+                    member = stack.pop()
+                    on_stack.discard(member)
+                    component.append(member)
+                    if member == node:
+                        break
+                components.append(component)
+
+    return components
+
+def find_cycle_in_component(start: str, adjacency: Dict[str, List[str]], members: set) -> List[str]:
+    """Shortest cycle through `start` that stays inside its component (BFS back to start)"""
+    parents = {start: None}
+    queue = [start]
+    for node in queue:
+        for nxt in adjacency.get(node, ()):
+            if nxt == start:
+                path = [start]
+                while node is not None:
+                    path.append(node)
+                    node = parents[node]
+                path.reverse()
+                return path
+            if nxt in members and nxt not in parents:
+                parents[nxt] = node
+                queue.append(nxt)
+    return []
+
+def detect_transaction_cycles(edges: Dict[tuple, list]) -> List[CircularFlowFinding]:
+    """Find same-token cycles in a transaction flow graph (see build_token_flow_graph).
+
+    Cycles are computed per token, so ordinary swaps (token A in, token B out) and wraps are not
+    reported; a token that leaves an address and comes back to it within the transaction is.
+    """
+    by_token: Dict[str, Dict[str, List[str]]] = defaultdict(lambda: defaultdict(list))
+    for (source, target, token) in edges:
+        if source != target:
+            by_token[token][source].append(target)
+
+    findings = []
+    for token, adjacency in by_token.items():
+        for component in strongly_connected_components(adjacency):
+            if len(component) < 2:
+                continue
+            members = set(component)
+            cycle = find_cycle_in_component(min(component), adjacency, members)
+            if not cycle:
+                continue
+            bottleneck = min(edges[(a, b, token)][0] for a, b in zip(cycle, cycle[1:]))
+            findings.append(CircularFlowFinding(
+                scope="transaction",
+                token=token,
+                path=cycle,
+                value=str(bottleneck),
+                component_size=len(component),
+                tx_hashes=[],
+                duration_seconds=None
+            ))
+            if len(findings) >= CIRCULAR_FLOW_MAX_FINDINGS:
+                return findings
+    return findings
+
+def detect_round_trips(address: str, transactions: List[Dict], window_hours: float = CIRCULAR_FLOW_WINDOW_HOURS) -> List[CircularFlowFinding]:
+    """Find funds that leave an address and come back from the same counterparty within the window.
+
+    Native value and decoded token transfers are replayed in block-time order; each outgoing edge
+    records (time, tx, amount) per (counterparty, token) and each incoming edge checks that record,
+    so the scan is linear in the number of transfer edges.
+    """
+    addr_lower = address.lower()
+    window = window_hours * 3600
+    timeline = []  # (datetime, tx_hash, source, target, token, amount)
+
+    for tx in transactions:
+        try:
+            dt = datetime.fromisoformat(tx.get("block_timestamp", "").replace("Z", "+00:00"))
+        except:
+            continue
+        edges, _, _, _ = build_token_flow_graph(tx)
+        for (source, target, token), (amount, _, _, _, _) in edges.items():
+            if addr_lower in (source, target) and source != target:
+                timeline.append((dt, tx.get("hash", ""), source, target, token, amount))
+
+    timeline.sort(key=lambda item: item[0])
+
+    last_outgoing: Dict[tuple, tuple] = {}
+    findings = []
+    reported = set()
+    for dt, tx_hash, source, target, token, amount in timeline:
+        if source == addr_lower:
+            # Exchanges legitimately take deposits and pay out withdrawals
+            if target not in KNOWN_EXCHANGES:
+                last_outgoing[(target, token)] = (dt, tx_hash, amount)
+            continue
+
+        key = (source, token)
+        sent = last_outgoing.get(key)
+        if not sent or key in reported:
+            continue
+        elapsed = (dt - sent[0]).total_seconds()
+        if 0 <= elapsed <= window:
+            reported.add(key)
+            findings.append(CircularFlowFinding(
+                scope="address_history",
+                token=token,
+                path=[addr_lower, source, addr_lower],
+                value=str(min(sent[2], amount)),
+                component_size=2,
+                tx_hashes=[sent[1], tx_hash],
+                duration_seconds=int(elapsed)
+            ))
+            if len(findings) >= CIRCULAR_FLOW_MAX_FINDINGS:
+                break
+    return findings
+
+def analyze_timing(timestamp_str: str) -> List[RiskFlag]:
+    """Analyze transaction timing for suspicious patterns (e.g., late night hours)"""
+    flags = []
+    
+    try:
+        # standardizing timestamp format
+        dt = datetime.fromisoformat(timestamp_str.replace("Z", "+00:00"))
+        hour = dt.hour
+        
+        # Check for Late night activity (2 AM - 5 AM UTC) - often correlates with hack timing
+        if 2 <= hour <= 5:
+            flags.append(make_flag("LATE_NIGHT", f"🌙 Late-night activity ({hour:02d}:00 UTC)", hour=hour))
+        
+        # Check for Weekend activity (banks closed, less monitoring)
+        if dt.weekday() >= 5:
+            flags.append(make_flag("WEEKEND", "📅 Weekend transaction", weekday=dt.weekday()))
     except:
         pass
     
@@ -337,85 +1920,2166 @@ def calculate_complexity_score(event_count: int) -> int:
     # Cap score at 100
     return min(score, 100)
 
+def risk_level_for_score(risk_score: int) -> str:
+    """Map a 0-100 risk score to its categorical level"""
+    if risk_score >= 70:
+        return "CRITICAL"
+    if risk_score >= 50:
+        return "HIGH"
+    if risk_score >= 30:
+        return "MEDIUM"
+    return "LOW"
+
+class RiskRuleEngine:
+    """Loads scoring rules from a JSON file and compiles them into a flat evaluator.
+
+    Each flag code is assigned a bit, so a rule's `any_code` condition compiles to one integer mask
+    and a set of flags to one integer; evaluating a rule is a single AND plus an optional metric
+    comparison. The file is re-checked at most every RISK_RULES_RELOAD_SECONDS and recompiled when
+    it changes; a broken edit keeps the previously compiled rules in service.
+    """
+
+    OPERATORS = {
+        ">": operator.gt,
+        ">=": operator.ge,
+        "<": operator.lt,
+        "<=": operator.le,
+        "==": operator.eq,
+        "!=": operator.ne
+    }
+
+    def __init__(self, path: str):
+        self.path = path
+        self.code_bits: Dict[str, int] = {}
+        self.rulesets: Dict[str, list] = {}
+        self.version = ""
+        self.mtime = None
+        self.checked_at = 0.0
+        self.lock = threading.Lock()
+        self.reload()
+
+    def code_bit(self, code: str) -> int:
+        bit = self.code_bits.get(code)
+        if bit is None:
+            bit = self.code_bits[code] = 1 << len(self.code_bits)
+        return bit
+
+    def codes_mask(self, flags: List[RiskFlag]) -> int:
+        mask = 0
+        bits = self.code_bits
+        for flag in flags:
+            # Codes no rule mentions have no bit and cannot match anything
+            mask |= bits.get(flag.code, 0)
+        return mask
+
+    def compile(self, spec: Dict) -> Dict[str, list]:
+        rulesets = {}
+        for name, rules in spec["rulesets"].items():
+            compiled = []
+            for rule in rules:
+                when = rule.get("when", {})
+                mask = 0
+                for code in when.get("any_code", []):
+                    mask |= self.code_bit(code)
+                metric = when.get("metric")
+                if metric is not None and when.get("op") not in self.OPERATORS:
+                    raise ValueError(f"Rule {rule.get('id')}: unknown operator {when.get('op')!r}")
+                compiled.append((
+                    mask,
+                    metric,
+                    self.OPERATORS.get(when.get("op")),
+                    when.get("value"),
+                    int(rule["score"]),
+                    rule.get("factor")
+                ))
+            rulesets[name] = compiled
+        return rulesets
+
+    def reload(self):
+        """Recompile the rules if the file changed since the last load"""
+        mtime = os.stat(self.path).st_mtime
+        if mtime == self.mtime:
+            return
+        with open(self.path, "rb") as f:
+            raw = f.read()
+        rulesets = self.compile(json.loads(raw))
+        self.rulesets = rulesets
+        self.version = hashlib.sha256(raw).hexdigest()[:12]
+        self.mtime = mtime
+
+    def maybe_reload(self):
+        now = time.monotonic()
+        if now - self.checked_at < RISK_RULES_RELOAD_SECONDS:
+            return
+        with self.lock:
+            if now - self.checked_at < RISK_RULES_RELOAD_SECONDS:
+                return
+            self.checked_at = now
+            try:
+                self.reload()
+            except (OSError, ValueError, KeyError, TypeError):
+                pass
+
+    def current_version(self) -> str:
+        """Version of the rules in effect, after picking up any pending file change"""
+        self.maybe_reload()
+        return self.version
+
+    def evaluate(self, ruleset: str, flags: List[RiskFlag], metrics: Dict[str, Any] = None) -> tuple[int, List[str]]:
+        """Score a set of flags (and numeric metrics) against a ruleset; returns (0-100 score, factors)"""
+        self.maybe_reload()
+        return self.evaluate_mask(ruleset, self.codes_mask(flags), metrics or {})
+
+    def evaluate_mask(self, ruleset: str, mask: int, metrics: Dict[str, Any]) -> tuple[int, List[str]]:
+        score = 0
+        factors = []
+        for rule_mask, metric, compare, threshold, points, factor in self.rulesets.get(ruleset, ()):
+            if rule_mask and not mask & rule_mask:
+                continue
+            if metric is not None and not compare(metrics.get(metric, 0), threshold):
+                continue
+            score += points
+            if factor:
+                factors.append(factor.format_map(metrics) if "{" in factor else factor)
+        return max(0, min(100, score)), factors
+
+risk_rules = RiskRuleEngine(RISK_RULES_PATH)
+
+def make_flag(code: str, message: str, **params) -> RiskFlag:
+    """Build a structured flag; `message` is the text shown to users"""
+    return RiskFlag(code=code, params=params, message=message)
+
 def calculate_advanced_risk_score(
-    sanctions_hit: bool,
-    mixer_hit: bool,
-    flags: List[str],
+    flags: List[RiskFlag],
     entity_labels: List[str],
-    complexity: int,
-    timing_flags: List[str]
+    complexity: int
 ) -> tuple[int, List[str]]:
-    """Determine final risk score based on weighted factors"""
-    score = 0
-    factors = []
-    
-    # CRITICAL RISK FACTORS
-    if sanctions_hit:
-        score += 70
-        factors.append("🚨 CRITICAL: Sanctioned entity")
-    
-    # HIGH RISK FACTORS
-    if mixer_hit:
-        score += 40
-        factors.append("🔄 Mixer/privacy service interaction")
-    
-    if any("unlimited approval" in f.lower() for f in flags):
-        score += 30
-        factors.append("⚠️ Unlimited token approvals")
-    
-    if any("circular" in f.lower() for f in flags):
-        score += 25
-        factors.append("⚠️ Circular flow pattern")
+    """Determine final risk score by evaluating the `risk` ruleset against flag codes"""
+    metrics = {
+        "complexity": complexity,
+        # Mitigating factor: interactions with known exchanges
+        "exchange_labels": sum(1 for label in entity_labels if "exchange" in label.lower())
+    }
+    return risk_rules.evaluate("risk", flags, metrics)
+
+def screen_address_transaction(
+    address: str,
+    tx: Dict,
+    value: float,
+    value_usd: Optional[float],
+    symbol: str
+) -> List[RiskFlag]:
+    """Per-transaction flags from the watched address's point of view (counterparty and value checks)"""
+    is_outgoing = (tx.get("from_address") or "").lower() == address.lower()
+    side = "to" if is_outgoing else "from"
+    counterparty = tx.get(f"{side}_address") or ""
+    cp_label = tx.get(f"{side}_address_label")
+    cp_entity = tx.get(f"{side}_address_entity")
     
-    # MEDIUM RISK FACTORS
-    if complexity > 50:
-        score += 20
-        factors.append(f"📊 High complexity ({complexity}/100)")
+    flags = []
+    cp_reason, _, keyword_hit = counterparty_verdicts.verdict(counterparty, cp_label, cp_entity)
     
-    # Large value transfer check
-    if any("large" in f.lower() or "high value" in f.lower() for f in flags):
-        score += 15
-        factors.append("💰 Large value transfer")
+    # Counterparty Sanctions Check
+    if cp_reason:
+        flags.append(make_flag(
+            "SANCTIONED_COUNTERPARTY",
+            f"Sanctioned: {cp_reason}",
+            address=counterparty,
+            reason=cp_reason
+        ))
     
-    # Timing risks
-    if len(timing_flags) > 0:
-        score += 10
-        factors.append("🕐 Suspicious timing")
+    # Counterparty Mixer Check (label keywords first, then entity keywords)
+    if keyword_hit:
+        field, name = keyword_hit
+        flags.append(make_flag("MIXER_COUNTERPARTY", "Mixer interaction", **{field: name}))
     
-    # POSITIVE FACTORS (Mitigating factors)
-    # Reduce risk if interacting with known safe exchanges
-    if any("exchange" in label.lower() for label in entity_labels):
-        score = max(0, score - 15)
-        factors.append("✅ Known exchange interaction")
+    # Transaction Value Check
+    tier = value_tier(
+        value, value_usd,
+        (LARGE_TX_NATIVE, VERY_LARGE_TX_NATIVE), (LARGE_TX_USD, VERY_LARGE_TX_USD)
+    )
+    if tier == 2:
+        flags.append(make_flag(
+            "VERY_LARGE_TX", f"Very large: {value:.2f} {symbol}",
+            value=value, symbol=symbol, value_usd=value_usd
+        ))
+    elif tier == 1:
+        flags.append(make_flag(
+            "LARGE_TX", f"Large: {value:.2f} {symbol}",
+            value=value, symbol=symbol, value_usd=value_usd
+        ))
     
-    return min(100, score), factors
+    return flags
 
-# API Endpoints
+# Multi-hop taint tracing
+TRACE_MAX_HOPS = 5
+TRACE_DEFAULT_BUDGET = int(os.getenv("TRACE_REQUEST_BUDGET", "60"))
+# Ceiling on a caller-supplied budget, so one trace cannot spend the whole upstream quota
+TRACE_MAX_BUDGET = max(TRACE_DEFAULT_BUDGET, int(os.getenv("TRACE_MAX_REQUEST_BUDGET", "500")))
 
-@app.get("/api/analyze-transaction/{tx_hash}", response_model=AnalysisResult)
-async def analyze_transaction(tx_hash: str, chain: str = "eth"):
+async def trace_counterparty_graph(
+    address: str,
+    chain: str = "eth",
+    max_hops: int = 3,
+    direction: str = "both",
+    min_value_eth: float = 0.0,
+    max_age_days: Optional[int] = None,
+    max_requests: int = TRACE_DEFAULT_BUDGET,
+    per_address_limit: int = 50
+) -> TraceResult:
+    """Breadth-first walk of the counterparty graph that returns the shortest path to every sanctioned/mixer node.
+
+    Each hop fetches the histories of the whole frontier concurrently (bounded by the shared upstream
+    pool) and stops once `max_requests` history fetches have been spent. Visited nodes are never
+    expanded twice, edges below `min_value_eth` or older than `max_age_days` are pruned, and known
+    exchanges and risky targets are recorded but not expanded further.
     """
-    Enhanced transaction analysis with deep event parsing and pattern detection
-    
-    - **tx_hash**: Transaction hash
-    - **chain**: Blockchain network (default: eth)
-    
-    Returns comprehensive risk analysis including:
-    - Event-level analysis (approvals, swaps, transfers)
-    - Entity recognition via Moralis labels
-    - Timing and complexity analysis
-    - Multi-factor risk scoring
+    started = time.perf_counter()
+    root = address.lower()
+    min_value_wei = int(min_value_eth * WEI_PER_NATIVE)
+    symbol = native_asset(chain)
+    cutoff = datetime.utcnow() - timedelta(days=max_age_days) if max_age_days else None
+
+    # parents[node] holds the hop that first reached it, which makes every recorded path a shortest path
+    parents: Dict[str, Optional[TraceHop]] = {root: None}
+    paths: Dict[str, TracePath] = {}
+    frontier = [root]
+    requests_used = 0
+    budget_exhausted = False
+
+    async def fetch_history(node: str) -> List[Dict]:
+        data = await moralis_request_async(
+            f"/{node}",
+            params={"chain": chain, "limit": per_address_limit, "order": "DESC"}
+        )
+        return data.get("result", [])
+
+    def path_to(node: str) -> List[TraceHop]:
+        hops = []
+        while parents[node] is not None:
+            hop = parents[node]
+            hops.append(hop)
+            node = hop.from_address.lower() if hop.to_address.lower() == node else hop.to_address.lower()
+        return list(reversed(hops))
+
+    for hop_number in range(1, max_hops + 1):
+        if not frontier:
+            break
+
+        # Spend the remaining budget on the frontier (already ordered by edge value, largest first)
+        remaining = max_requests - requests_used
+        if remaining < len(frontier):
+            budget_exhausted = True
+            frontier = frontier[:max(0, remaining)]
+            if not frontier:
+                break
+        requests_used += len(frontier)
+
+        histories = await asyncio.gather(
+            *(fetch_history(node) for node in frontier),
+            return_exceptions=True
+        )
+
+        next_frontier = []  # (edge value in wei, address)
+        for node, history in zip(frontier, histories):
+            # A failed fetch only loses that branch, not the whole trace
+            if isinstance(history, Exception):
+                continue
+
+            for tx in history:
+                from_addr = (tx.get("from_address") or "").lower()
+                to_addr = (tx.get("to_address") or "").lower()
+                is_outgoing = from_addr == node
+                if is_outgoing and direction == "incoming":
+                    continue
+                if not is_outgoing and direction == "outgoing":
+                    continue
+
+                counterparty = to_addr if is_outgoing else from_addr
+                if not counterparty or counterparty in parents:
+                    continue
+
+                # Prune by value and recency
+                value_wei = int(tx.get("value", 0) or 0)
+                if value_wei < min_value_wei:
+                    continue
+                timestamp = tx.get("block_timestamp", "")
+                if cutoff:
+                    try:
+                        dt = datetime.fromisoformat(timestamp.replace("Z", "+00:00"))
+                        if dt.replace(tzinfo=None) < cutoff:
+                            continue
+                    except:
+                        pass
+
+                parents[counterparty] = TraceHop(
+                    from_address=from_addr,
+                    to_address=to_addr,
+                    tx_hash=tx.get("hash", ""),
+                    value=f"{format_units(value_wei)} {symbol}",
+                    value_wei=str(value_wei),
+                    block_timestamp=timestamp
+                )
+
+                if is_outgoing:
+                    cp_label, cp_entity = tx.get("to_address_label"), tx.get("to_address_entity")
+                else:
+                    cp_label, cp_entity = tx.get("from_address_label"), tx.get("from_address_entity")
+
+                hit = screen_counterparty(counterparty, cp_label, cp_entity)
+                if hit:
+                    category, target_label = hit
+                    paths[counterparty] = TracePath(
+                        target=counterparty,
+                        target_label=target_label,
+                        category=category,
+                        hops=hop_number,
+                        path=path_to(counterparty)
+                    )
+                    continue
+
+                # Exchanges are hubs with unbounded fan-out; tracing through them is noise
+                if counterparty in KNOWN_EXCHANGES:
+                    continue
+                next_frontier.append((value_wei, counterparty))
+
+        next_frontier.sort(key=lambda item: item[0], reverse=True)
+        frontier = [addr for _, addr in next_frontier]
+
+    return TraceResult(
+        address=address,
+        chain=chain,
+        direction=direction,
+        max_hops=max_hops,
+        nodes_visited=len(parents),
+        requests_used=requests_used,
+        budget_exhausted=budget_exhausted,
+        elapsed_seconds=round(time.perf_counter() - started, 3),
+        paths=sorted(paths.values(), key=lambda p: p.hops)
+    )
+
+# Wallet clustering
+CLUSTER_GAS_TOPUP_MAX_WEI = int(float(os.getenv("CLUSTER_GAS_TOPUP_MAX_ETH", "0.05")) * 10**18)
+CLUSTER_FUNDER_MAX_FANOUT = int(os.getenv("CLUSTER_FUNDER_MAX_FANOUT", "50"))
+
+class UnionFind:
+    """Disjoint-set forest with path compression and union by size"""
+
+    def __init__(self):
+        self.parent: Dict[str, str] = {}
+        self.size: Dict[str, int] = {}
+
+    def add(self, x: str):
+        if x not in self.parent:
+            self.parent[x] = x
+            self.size[x] = 1
+
+    def find(self, x: str) -> str:
+        parent = self.parent
+        if x not in parent:
+            return x
+        root = x
+        while parent[root] != root:
+            root = parent[root]
+        # Point every node on the walked path straight at the root
+        while parent[x] != root:
+            parent[x], x = root, parent[x]
+        return root
+
+    def union(self, a: str, b: str) -> Optional[tuple[str, str]]:
+        """Merge the sets of a and b; returns (surviving_root, absorbed_root) or None if already joined"""
+        self.add(a)
+        self.add(b)
+        root_a, root_b = self.find(a), self.find(b)
+        if root_a == root_b:
+            return None
+        if self.size[root_a] < self.size[root_b]:
+            root_a, root_b = root_b, root_a
+        self.parent[root_b] = root_a
+        self.size[root_a] += self.size.pop(root_b)
+        return root_a, root_b
+
+class WalletClusterEngine:
+    """Clusters wallets from observed transactions and persists the result in SQLite.
+
+    The union-find lives in memory; every wallet row also stores its current root, so reading a
+    cluster back is a single indexed query regardless of how the cluster was assembled.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS wallet_clusters (
+            address TEXT PRIMARY KEY,
+            root TEXT NOT NULL,
+            heuristic TEXT
+        );
+        CREATE INDEX IF NOT EXISTS idx_wallet_clusters_root ON wallet_clusters(root);
+        CREATE TABLE IF NOT EXISTS cluster_links (
+            source TEXT NOT NULL,
+            target TEXT NOT NULL,
+            heuristic TEXT NOT NULL,
+            tx_hash TEXT,
+            PRIMARY KEY (source, target, heuristic)
+        );
+        CREATE TABLE IF NOT EXISTS deposit_addresses (
+            address TEXT PRIMARY KEY,
+            exchange TEXT
+        );
+        CREATE TABLE IF NOT EXISTS wallet_funding (
+            address TEXT PRIMARY KEY,
+            funder TEXT NOT NULL,
+            tx_hash TEXT,
+            block_timestamp TEXT
+        );
+        CREATE INDEX IF NOT EXISTS idx_wallet_funding_funder ON wallet_funding(funder);
     """
+
+    def __init__(self):
+        self.uf = UnionFind()
+        self.loaded = False
+
+    def _ensure_loaded(self, db: sqlite3.Connection):
+        if self.loaded:
+            return
+        db.executescript(self.SCHEMA)
+        for address, root in db.execute("SELECT address, root FROM wallet_clusters"):
+            self.uf.parent[address] = root
+            self.uf.size[root] = self.uf.size.get(root, 0) + 1
+        self.loaded = True
+
+    def _link(self, db: sqlite3.Connection, a: str, b: str, heuristic: str, tx_hash: str):
+        if a == b:
+            return
+        db.execute(
+            "INSERT OR IGNORE INTO cluster_links (source, target, heuristic, tx_hash) VALUES (?, ?, ?, ?)",
+            (a, b, heuristic, tx_hash)
+        )
+        for node in (a, b):
+            db.execute(
+                "INSERT OR IGNORE INTO wallet_clusters (address, root, heuristic) VALUES (?, ?, ?)",
+                (node, node, heuristic)
+            )
+        merged = self.uf.union(a, b)
+        if merged:
+            survivor, absorbed = merged
+            db.execute("UPDATE wallet_clusters SET root = ? WHERE root = ?", (survivor, absorbed))
+
+    @staticmethod
+    def _is_exchange(address: str, label: Optional[str], entity: Optional[str]) -> bool:
+        if address in KNOWN_EXCHANGES:
+            return True
+        return any(name and "exchange" in name.lower() for name in (label, entity))
+
+    @staticmethod
+    def _is_clusterable(address: str, label: Optional[str], entity: Optional[str]) -> bool:
+        """Only unlabeled, non-service wallets are merged; labels indicate exchanges, protocols and contracts"""
+        if not address or address in KNOWN_EXCHANGES or address in MIXER_ADDRESSES:
+            return False
+        return not label and not entity
+
+    def observe(self, transactions: List[Dict], subject: Optional[str] = None, history_complete: bool = False):
+        """Apply the deposit-address, funding-source and gas-payer heuristics to a batch of transactions.
+
+        A funding source is only recorded for `subject`, and only when `history_complete` says the batch
+        is its entire history: then the earliest transaction shows who really funded it. A transfer seen
+        in someone else's history proves nothing about whether it was the recipient's first funding.
+        """
+        subject = (subject or "").lower()
+        rows = []
+        for tx in transactions:
+            rows.append((
+                tx.get("block_timestamp", ""),
+                (tx.get("from_address") or "").lower(),
+                (tx.get("to_address") or "").lower(),
+                int(tx.get("value", 0) or 0),
+                tx.get("hash", ""),
+                tx
+            ))
+        # Oldest first, so "first funder" and "top-up before first contract call" follow chain order
+        rows.sort(key=lambda r: r[0])
+        # The subject's first-ever transaction, when it is an incoming native transfer, is its funding
+        funding_tx = None
+        if subject and history_complete and rows and rows[0][2] == subject and rows[0][3] > 0:
+            funding_tx = rows[0][4]
+
+        with _db_lock:
+            db = get_db()
+            self._ensure_loaded(db)
+
+            # Deposit addresses: unlabeled wallets that forward into an exchange
+            first_contract_call = {}
+            for timestamp, from_addr, to_addr, _, _, tx in rows:
+                if self._is_exchange(to_addr, tx.get("to_address_label"), tx.get("to_address_entity")) \
+                        and self._is_clusterable(from_addr, tx.get("from_address_label"), tx.get("from_address_entity")):
+                    db.execute(
+                        "INSERT OR IGNORE INTO deposit_addresses (address, exchange) VALUES (?, ?)",
+                        (from_addr, KNOWN_EXCHANGES.get(to_addr) or tx.get("to_address_label") or tx.get("to_address_entity"))
+                    )
+                if tx.get("input") not in (None, "", "0x") and from_addr not in first_contract_call:
+                    first_contract_call[from_addr] = timestamp
+
+            candidate_deposits = {r[2] for r in rows}
+            known_deposits = set()
+            if candidate_deposits:
+                placeholders = ",".join("?" * len(candidate_deposits))
+                known_deposits = {
+                    row[0] for row in db.execute(
+                        f"SELECT address FROM deposit_addresses WHERE address IN ({placeholders})",
+                        tuple(candidate_deposits)
+                    )
+                }
+
+            for timestamp, from_addr, to_addr, value_wei, tx_hash, tx in rows:
+                sender_ok = self._is_clusterable(from_addr, tx.get("from_address_label"), tx.get("from_address_entity"))
+                receiver_ok = self._is_clusterable(to_addr, tx.get("to_address_label"), tx.get("to_address_entity"))
+                if not (sender_ok and receiver_ok):
+                    continue
+
+                # Shared deposit address: every wallet paying into the same deposit address has one owner
+                if to_addr in known_deposits:
+                    self._link(db, from_addr, to_addr, "shared_deposit", tx_hash)
+                    continue
+
+                if value_wei <= 0:
+                    continue
+
+                # Funding source: the wallet behind the subject's first-ever transaction
+                funded = tx_hash != funding_tx or db.execute(
+                    "SELECT 1 FROM wallet_funding WHERE address = ?", (to_addr,)
+                ).fetchone()
+                if not funded:
+                    db.execute(
+                        "INSERT INTO wallet_funding (address, funder, tx_hash, block_timestamp) VALUES (?, ?, ?, ?)",
+                        (to_addr, from_addr, tx_hash, timestamp)
+                    )
+                    fanout = db.execute(
+                        "SELECT COUNT(*) FROM wallet_funding WHERE funder = ?", (from_addr,)
+                    ).fetchone()[0]
+                    # Funders of very many wallets are services (faucets, payroll), not owners
+                    if fanout <= CLUSTER_FUNDER_MAX_FANOUT:
+                        self._link(db, from_addr, to_addr, "funding_source", tx_hash)
+                        continue
+
+                # Gas payer: a small top-up that precedes the recipient's contract calls
+                if value_wei <= CLUSTER_GAS_TOPUP_MAX_WEI and first_contract_call.get(to_addr, "") > timestamp:
+                    self._link(db, from_addr, to_addr, "gas_payer", tx_hash)
+
+            db.commit()
+
+    def get_cluster(self, address: str, max_links: int = 1000) -> WalletCluster:
+        """Read a cluster back from persisted state"""
+        addr_lower = address.lower()
+        with _db_lock:
+            db = get_db()
+            self._ensure_loaded(db)
+            row = db.execute("SELECT root FROM wallet_clusters WHERE address = ?", (addr_lower,)).fetchone()
+            root = row[0] if row else addr_lower
+            members = db.execute(
+                "SELECT address, heuristic FROM wallet_clusters WHERE root = ?", (root,)
+            ).fetchall() if row else [(addr_lower, None)]
+            links = db.execute(
+                """SELECT l.source, l.target, l.heuristic, l.tx_hash
+                   FROM wallet_clusters w JOIN cluster_links l ON l.source = w.address
+                   WHERE w.root = ? LIMIT ?""",
+                (root, max_links)
+            ).fetchall() if row else []
+            heuristic_counts = dict(db.execute(
+                """SELECT l.heuristic, COUNT(*)
+                   FROM wallet_clusters w JOIN cluster_links l ON l.source = w.address
+                   WHERE w.root = ? GROUP BY l.heuristic""",
+                (root,)
+            ).fetchall()) if row else {}
+
+        wallets = []
+        for member, heuristic in members:
+            hit = screen_counterparty(member)
+            wallets.append(ClusterWallet(
+                address=member,
+                heuristic=heuristic,
+                risk_category=hit[0] if hit else None
+            ))
+
+        return WalletCluster(
+            address=address,
+            cluster_id=root,
+            size=len(wallets),
+            heuristics=heuristic_counts,
+            wallets=wallets,
+            links=[ClusterLink(source=l[0], target=l[1], heuristic=l[2], tx_hash=l[3] or "") for l in links]
+        )
+
+cluster_engine = WalletClusterEngine()
+
+# Watchlist monitoring
+WATCHLIST_REQUESTS_PER_HOUR = int(os.getenv("WATCHLIST_REQUESTS_PER_HOUR", "36000"))
+WATCHLIST_MIN_INTERVAL_SECONDS = float(os.getenv("WATCHLIST_MIN_INTERVAL_SECONDS", "300"))
+WATCHLIST_MAX_INTERVAL_SECONDS = float(os.getenv("WATCHLIST_MAX_INTERVAL_SECONDS", "21600"))
+WATCHLIST_BASE_INTERVAL_SECONDS = float(os.getenv("WATCHLIST_BASE_INTERVAL_SECONDS", "3600"))
+WATCHLIST_ALERT_THRESHOLD = int(os.getenv("WATCHLIST_ALERT_THRESHOLD", "15"))
+WATCHLIST_PAGE_SIZE = 100
+WATCHLIST_BATCH_SIZE = MORALIS_MAX_CONCURRENCY * 4
+WATCHLIST_WEBHOOK_URL = os.getenv("WATCHLIST_WEBHOOK_URL")
+WATCHLIST_ENABLED = os.getenv("WATCHLIST_ENABLED", "true").lower() in ("1", "true", "yes")
+
+class RequestBudget:
+    """Token bucket capping upstream requests per hour, with bursts of at most one batch"""
+
+    def __init__(self, per_hour: int, burst: int):
+        self.rate = per_hour / 3600.0
+        self.burst = float(burst)
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+
+    def take(self, wanted: int) -> int:
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        granted = min(wanted, int(self.tokens))
+        self.tokens -= granted
+        return granted
+
+    def wait_seconds(self) -> float:
+        """Time until at least one token is available"""
+        return max(0.0, (1 - self.tokens) / self.rate) if self.rate > 0 else 60.0
+
+class WatchlistMonitor:
+    """Polls watched addresses incrementally and screens their new transactions.
+
+    Each address keeps a block cursor, so a poll only fetches transactions newer than the last
+    one seen. The poll interval shrinks with the address's risk score and recent activity, and
+    the scheduler never spends more upstream requests than the hourly budget allows. Alerts are
+    queued in SQLite and optionally pushed to a webhook.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS watchlist (
+            address TEXT NOT NULL,
+            chain TEXT NOT NULL,
+            risk_score INTEGER NOT NULL DEFAULT 0,
+            activity REAL NOT NULL DEFAULT 0,
+            last_block INTEGER,
+            last_polled REAL,
+            next_poll REAL NOT NULL,
+            page_cursor TEXT,
+            failures INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (address, chain)
+        );
+        CREATE INDEX IF NOT EXISTS idx_watchlist_next_poll ON watchlist(next_poll);
+        CREATE TABLE IF NOT EXISTS watchlist_alerts (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            created_at REAL NOT NULL,
+            address TEXT NOT NULL,
+            chain TEXT NOT NULL,
+            tx_hash TEXT NOT NULL,
+            block_number INTEGER,
+            risk_score INTEGER NOT NULL,
+            flags TEXT NOT NULL,
+            flag_codes TEXT NOT NULL,
+            delivered INTEGER NOT NULL DEFAULT 0,
+            UNIQUE (address, chain, tx_hash)
+        );
+    """
+
+    def __init__(self):
+        self.budget = RequestBudget(WATCHLIST_REQUESTS_PER_HOUR, WATCHLIST_BATCH_SIZE)
+        self.task: Optional[asyncio.Task] = None
+        self.ready = False
+        self.polls = 0
+        self.alerts = 0
+        self.errors = 0
+
+    def _db(self) -> sqlite3.Connection:
+        db = get_db()
+        if not self.ready:
+            db.executescript(self.SCHEMA)
+            # Watchlists created before paging/backoff lack these columns
+            columns = {row[1] for row in db.execute("PRAGMA table_info(watchlist)")}
+            for column, ddl in (("page_cursor", "TEXT"), ("failures", "INTEGER NOT NULL DEFAULT 0")):
+                if column not in columns:
+                    db.execute(f"ALTER TABLE watchlist ADD COLUMN {column} {ddl}")
+            self.ready = True
+        return db
+
+    @staticmethod
+    def poll_interval(risk_score: int, activity: float) -> float:
+        """Riskier and busier addresses are polled more often"""
+        interval = WATCHLIST_BASE_INTERVAL_SECONDS / (1 + risk_score / 25 + activity)
+        return min(WATCHLIST_MAX_INTERVAL_SECONDS, max(WATCHLIST_MIN_INTERVAL_SECONDS, interval))
+
+    def add(self, addresses: List[str], chain: str, priority: int) -> int:
+        now = time.time()
+        rows = [(a.strip().lower(), chain, max(0, min(priority, 100)), now) for a in addresses if a.strip()]
+        with _db_lock:
+            db = self._db()
+            before = db.total_changes
+            db.executemany(
+                "INSERT OR IGNORE INTO watchlist (address, chain, risk_score, next_poll) VALUES (?, ?, ?, ?)",
+                rows
+            )
+            db.commit()
+            return db.total_changes - before
+
+    def remove(self, address: str, chain: str) -> bool:
+        with _db_lock:
+            db = self._db()
+            removed = db.execute(
+                "DELETE FROM watchlist WHERE address = ? AND chain = ?", (address.lower(), chain)
+            ).rowcount
+            db.commit()
+        return removed > 0
+
+    def entries(self, limit: int, offset: int) -> List[WatchlistEntry]:
+        with _db_lock:
+            db = self._db()
+            rows = db.execute(
+                """SELECT w.address, w.chain, w.risk_score, w.activity, w.last_block, w.last_polled, w.next_poll,
+                          (SELECT COUNT(*) FROM watchlist_alerts a WHERE a.address = w.address AND a.chain = w.chain)
+                   FROM watchlist w ORDER BY w.risk_score DESC, w.address LIMIT ? OFFSET ?""",
+                (limit, offset)
+            ).fetchall()
+        return [
+            WatchlistEntry(
+                address=r[0], chain=r[1], risk_score=r[2], activity=round(r[3], 3), last_block=r[4],
+                last_polled=datetime.fromtimestamp(r[5], timezone.utc).isoformat() if r[5] else None,
+                next_poll=datetime.fromtimestamp(r[6], timezone.utc).isoformat(),
+                alert_count=r[7]
+            )
+            for r in rows
+        ]
+
+    def pending_alerts(self, after_id: int, limit: int) -> List[WatchlistAlert]:
+        """Read the local alert queue; consumers page with the last id they processed"""
+        with _db_lock:
+            rows = self._db().execute(
+                """SELECT id, created_at, address, chain, tx_hash, block_number, risk_score, flags, flag_codes, delivered
+                   FROM watchlist_alerts WHERE id > ? ORDER BY id LIMIT ?""",
+                (after_id, limit)
+            ).fetchall()
+        return [
+            WatchlistAlert(
+                id=r[0], created_at=datetime.fromtimestamp(r[1], timezone.utc).isoformat(),
+                address=r[2], chain=r[3], tx_hash=r[4], block_number=r[5], risk_score=r[6],
+                flags=json.loads(r[7]), flag_codes=json.loads(r[8]), delivered=bool(r[9])
+            )
+            for r in rows
+        ]
+
+    def status(self) -> WatchlistStatus:
+        with _db_lock:
+            db = self._db()
+            total = db.execute("SELECT COUNT(*) FROM watchlist").fetchone()[0]
+            due = db.execute("SELECT COUNT(*) FROM watchlist WHERE next_poll <= ?", (time.time(),)).fetchone()[0]
+        return WatchlistStatus(
+            running=self.task is not None and not self.task.done(),
+            addresses=total,
+            due=due,
+            requests_per_hour=WATCHLIST_REQUESTS_PER_HOUR,
+            polls=self.polls,
+            alerts=self.alerts,
+            errors=self.errors
+        )
+
+    def _due(self, limit: int) -> List[tuple]:
+        with _db_lock:
+            return self._db().execute(
+                """SELECT address, chain, risk_score, activity, last_block, page_cursor, failures FROM watchlist
+                   WHERE next_poll <= ? ORDER BY risk_score DESC, next_poll LIMIT ?""",
+                (time.time(), limit)
+            ).fetchall()
+
+    def screen(self, address: str, chain: str, transactions: List[Dict]) -> List[tuple]:
+        """Score new transactions with the per-transaction ruleset; returns alert rows"""
+        symbol = native_asset(chain)
+        prices = price_table.usd_prices(
+            symbol, [to_unix_timestamp(tx.get("block_timestamp", "")) for tx in transactions]
+        )
+        now = time.time()
+        alerts = []
+        for tx, usd_price in zip(transactions, prices):
+            value = wei_to_native(int(tx.get("value", 0) or 0))
+            value_usd = value * usd_price if usd_price is not None else None
+            tx_flags = screen_address_transaction(address, tx, value, value_usd, symbol)
+            tx_risk, _ = risk_rules.evaluate("address_transaction", tx_flags)
+            if tx_flags and tx_risk >= WATCHLIST_ALERT_THRESHOLD:
+                alerts.append((
+                    now, address, chain, tx.get("hash", ""), int(tx.get("block_number") or 0) or None, tx_risk,
+                    json.dumps([f.message for f in tx_flags]), json.dumps([f.code for f in tx_flags])
+                ))
+        return alerts
+
+    async def poll(
+        self,
+        address: str,
+        chain: str,
+        risk_score: int,
+        activity: float,
+        last_block: Optional[int],
+        page_cursor: Optional[str] = None,
+        failures: int = 0
+    ):
+        """Poll one address; on any failure it backs off instead of staying due and starving the rest"""
+        try:
+            await self._poll(address, chain, risk_score, activity, last_block, page_cursor)
+        except Exception as e:
+            self.errors += 1
+            if isinstance(e, HTTPException):
+                logger.warning("watchlist poll of %s on %s failed: %s", address, chain, e.detail)
+            else:
+                logger.exception("watchlist poll of %s on %s failed", address, chain)
+            delay = min(WATCHLIST_MAX_INTERVAL_SECONDS, WATCHLIST_MIN_INTERVAL_SECONDS * 2 ** min(failures, 16))
+            try:
+                await run_db(self._back_off, address, chain, delay)
+            except sqlite3.Error:
+                logger.exception("could not reschedule watchlist address %s on %s", address, chain)
+
+    def _back_off(self, address: str, chain: str, delay: float):
+        with _db_lock:
+            db = self._db()
+            # The page cursor is dropped; re-reading from the block cursor is safe (alerts are deduplicated)
+            db.execute(
+                """UPDATE watchlist SET next_poll = ?, failures = failures + 1, page_cursor = NULL
+                   WHERE address = ? AND chain = ?""",
+                (time.time() + delay, address, chain)
+            )
+            db.commit()
+
+    async def _poll(
+        self,
+        address: str,
+        chain: str,
+        risk_score: int,
+        activity: float,
+        last_block: Optional[int],
+        page_cursor: Optional[str]
+    ):
+        """Fetch and screen the next page after the address's cursor, then reschedule it"""
+        baseline = last_block is None
+        params = {"chain": chain, "limit": 1, "order": "DESC"} if baseline else {
+            "chain": chain, "limit": WATCHLIST_PAGE_SIZE, "order": "ASC", "from_block": last_block + 1
+        }
+        if page_cursor and not baseline:
+            params["cursor"] = page_cursor
+        try:
+            tx_data = await moralis_request_async(f"/{address}/verbose", params=params)
+        except HTTPException as e:
+            if e.status_code != 404:
+                raise
+            tx_data = {}
+        transactions = tx_data.get("result", [])
+        next_cursor = (tx_data.get("cursor") or None) if transactions and not baseline else None
+
+        now = time.time()
+        blocks = [int(tx.get("block_number") or 0) for tx in transactions]
+        if baseline:
+            # First poll only records where history ends; nothing before it is alerted on
+            new_block, alerts, new_count = (max(blocks) if blocks else 0), [], 0
+        else:
+            for tx in transactions:
+                decode_missing_events(tx.get("logs", []))
+            alerts = self.screen(address, chain, transactions)
+            try:
+                await run_db(baseline_store.observe, address, chain, transactions)
+            except sqlite3.Error:
+                # A baseline failure must not hold back the alerts screened above
+                logger.exception("could not update baseline of %s on %s", address, chain)
+            new_count = len(transactions)
+            # While pages remain, the block cursor stays put and the next poll resumes from the page cursor,
+            # so a block split across pages is read exactly once; the block cursor moves after the last page
+            new_block = last_block if next_cursor else max(blocks, default=last_block)
+
+        activity = 0.7 * activity + 0.3 * new_count
+        risk_score = max([risk_score] + [a[5] for a in alerts])
+        # Remaining pages are fetched on the next scheduler pass rather than after a full interval
+        next_poll = now if next_cursor else now + self.poll_interval(risk_score, activity)
+        inserted = await run_db(
+            self._record_poll, address, chain, alerts,
+            (risk_score, activity, new_block, now, next_poll, next_cursor)
+        )
+
+        self.polls += 1
+        self.alerts += len(inserted)
+        if inserted and WATCHLIST_WEBHOOK_URL:
+            await self.deliver(inserted)
+
+    def _record_poll(self, address: str, chain: str, alerts: List[tuple], state: tuple) -> List[tuple]:
+        """Queue new alerts and store the address's updated schedule; returns the alerts actually inserted"""
+        inserted = []
+        with _db_lock:
+            db = self._db()
+            for alert in alerts:
+                cursor = db.execute(
+                    """INSERT OR IGNORE INTO watchlist_alerts
+                       (created_at, address, chain, tx_hash, block_number, risk_score, flags, flag_codes)
+                       VALUES (?, ?, ?, ?, ?, ?, ?, ?)""",
+                    alert
+                )
+                if cursor.rowcount:
+                    inserted.append((cursor.lastrowid,) + alert)
+            db.execute(
+                """UPDATE watchlist SET risk_score = ?, activity = ?, last_block = ?, last_polled = ?, next_poll = ?,
+                          page_cursor = ?, failures = 0
+                   WHERE address = ? AND chain = ?""",
+                (*state, address, chain)
+            )
+            db.commit()
+        return inserted
+
+    async def deliver(self, alerts: List[tuple]):
+        """Push new alerts to the webhook; undelivered alerts stay readable from the queue"""
+        payload = [
+            {
+                "id": a[0], "address": a[2], "chain": a[3], "tx_hash": a[4], "block_number": a[5],
+                "risk_score": a[6], "flags": json.loads(a[7]), "flag_codes": json.loads(a[8])
+            }
+            for a in alerts
+        ]
+        loop = asyncio.get_running_loop()
+        try:
+            # Default executor: webhook latency must not occupy the upstream worker pool
+            response = await loop.run_in_executor(
+                None, functools.partial(requests.post, WATCHLIST_WEBHOOK_URL, json={"alerts": payload}, timeout=10)
+            )
+            response.raise_for_status()
+        except requests.exceptions.RequestException:
+            self.errors += 1
+            return
+        await run_db(self._mark_delivered, [a[0] for a in alerts])
+
+    def _mark_delivered(self, alert_ids: List[int]):
+        with _db_lock:
+            db = self._db()
+            db.executemany("UPDATE watchlist_alerts SET delivered = 1 WHERE id = ?", [(i,) for i in alert_ids])
+            db.commit()
+
+    async def run_once(self) -> int:
+        """Poll every due address the budget allows; returns the number of polls made"""
+        granted = self.budget.take(WATCHLIST_BATCH_SIZE)
+        if not granted:
+            return 0
+        due = await run_db(self._due, granted)
+        # Return unused tokens so an idle watchlist does not waste the budget
+        self.budget.tokens += granted - len(due)
+        if due:
+            await asyncio.gather(*(self.poll(*row) for row in due), return_exceptions=True)
+        return len(due)
+
+    async def run_forever(self):
+        while True:
+            try:
+                polled = await self.run_once()
+            except sqlite3.Error:
+                self.errors += 1
+                polled = 0
+            if not polled:
+                await asyncio.sleep(max(1.0, min(self.budget.wait_seconds(), 30.0)))
+
+    def start(self):
+        if self.task is None or self.task.done():
+            self.task = start_background_task(self.run_forever())
+
+    async def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+
+watchlist_monitor = WatchlistMonitor()
+
+@app.on_event("startup")
+async def start_watchlist_monitor():
+    if WATCHLIST_ENABLED:
+        watchlist_monitor.start()
+
+@app.on_event("shutdown")
+async def stop_watchlist_monitor():
+    await watchlist_monitor.stop()
+
+# Block-range screening
+BLOCK_SCAN_WORKERS = int(os.getenv("BLOCK_SCAN_WORKERS", str(MORALIS_MAX_CONCURRENCY)))
+BLOCK_SCAN_CHUNK_SIZE = int(os.getenv("BLOCK_SCAN_CHUNK_SIZE", "100"))
+BLOCK_SCAN_MAX_BLOCKS = int(os.getenv("BLOCK_SCAN_MAX_BLOCKS", "50000"))
+BLOCK_SCAN_QUEUE_SIZE = BLOCK_SCAN_WORKERS * 4
+BLOCK_SCAN_RETRIES = 3
+
+def build_screening_index() -> Dict[str, tuple[str, str]]:
+    """Lowercase address -> (category, reason) for every sanctioned and mixer address"""
+    index = {addr.lower(): ("mixer", name) for addr, name in MIXER_ADDRESSES.items()}
+    # Sanctions take precedence over the mixer category for addresses on both lists
+    index.update({addr.lower(): ("sanctioned", reason) for addr, reason in SANCTIONS_LIST.items()})
+    return index
+
+def topic_address(topic: str) -> Optional[str]:
+    """Address packed into an indexed topic (12 zero bytes followed by 20 address bytes)"""
+    if len(topic) == 66 and topic.startswith("0x000000000000000000000000"):
+        return "0x" + topic[26:]
+    return None
+
+def extract_block_addresses(block: Dict) -> tuple[List[tuple], int]:
+    """Every (address, role, tx_hash, log_index) reference in a block, plus its transaction count"""
+    refs = []
+    transactions = block.get("transactions") or []
+    for tx in transactions:
+        tx_hash = tx.get("hash", "")
+        for role in ("from", "to"):
+            address = tx.get(f"{role}_address")
+            if address:
+                refs.append((address.lower(), role, tx_hash, None, tx.get(f"{role}_address_label")))
+        for log in tx.get("logs") or []:
+            log_index = int(log.get("log_index") or 0)
+            emitter = log.get("address")
+            if emitter:
+                refs.append((emitter.lower(), "log_emitter", tx_hash, log_index, None))
+            for topic in log_topics(log)[1:]:
+                address = topic_address(topic)
+                if address:
+                    refs.append((address, "log_topic", tx_hash, log_index, None))
+            for param in (log.get("decoded_event") or {}).get("params") or []:
+                if param.get("type") == "address" and param.get("value"):
+                    refs.append((str(param["value"]).lower(), "log_param", tx_hash, log_index, None))
+    return refs, len(transactions)
+
+class BlockRangeScanner:
+    """Streams a block range through fetch -> parse -> screen stages with checkpointed progress.
+
+    The range is split into fixed-size chunks. Fetch workers each claim a chunk and fetch its
+    blocks in order into a bounded queue, so a slow screen stage back-pressures the fetchers
+    instead of buffering the whole range. The screen stage records hits and advances the chunk's
+    checkpoint in one SQLite transaction per block, so a paused or failed scan resumes exactly
+    where it stopped.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS block_scans (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            chain TEXT NOT NULL,
+            from_block INTEGER NOT NULL,
+            to_block INTEGER NOT NULL,
+            status TEXT NOT NULL,
+            transactions_screened INTEGER NOT NULL DEFAULT 0,
+            elapsed_seconds REAL NOT NULL DEFAULT 0,
+            error TEXT
+        );
+        CREATE TABLE IF NOT EXISTS block_scan_chunks (
+            scan_id INTEGER NOT NULL,
+            start_block INTEGER NOT NULL,
+            end_block INTEGER NOT NULL,
+            next_block INTEGER NOT NULL,
+            PRIMARY KEY (scan_id, start_block)
+        );
+        CREATE TABLE IF NOT EXISTS block_scan_hits (
+            scan_id INTEGER NOT NULL,
+            block_number INTEGER NOT NULL,
+            tx_hash TEXT NOT NULL,
+            log_index INTEGER,
+            address TEXT NOT NULL,
+            role TEXT NOT NULL,
+            category TEXT NOT NULL,
+            reason TEXT NOT NULL,
+            UNIQUE (scan_id, tx_hash, log_index, address, role)
+        );
+        CREATE INDEX IF NOT EXISTS idx_block_scan_hits_scan ON block_scan_hits(scan_id, block_number);
+    """
+
+    def __init__(self):
+        self.tasks: Dict[int, asyncio.Task] = {}
+        self.running_since: Dict[int, float] = {}
+        self.ready = False
+
+    def _db(self) -> sqlite3.Connection:
+        db = get_db()
+        if not self.ready:
+            db.executescript(self.SCHEMA)
+            self.ready = True
+        return db
+
+    def create(self, chain: str, from_block: int, to_block: int) -> int:
+        with _db_lock:
+            db = self._db()
+            scan_id = db.execute(
+                "INSERT INTO block_scans (chain, from_block, to_block, status) VALUES (?, ?, ?, 'paused')",
+                (chain, from_block, to_block)
+            ).lastrowid
+            db.executemany(
+                "INSERT INTO block_scan_chunks (scan_id, start_block, end_block, next_block) VALUES (?, ?, ?, ?)",
+                [
+                    (scan_id, start, min(start + BLOCK_SCAN_CHUNK_SIZE - 1, to_block), start)
+                    for start in range(from_block, to_block + 1, BLOCK_SCAN_CHUNK_SIZE)
+                ]
+            )
+            db.commit()
+        return scan_id
+
+    async def start(self, scan_id: int):
+        """Run (or resume) a scan in the background"""
+        task = self.tasks.get(scan_id)
+        if task is None or task.done():
+            await run_db(self._set_status, scan_id, "running")
+            # Another request may have started the scan while the status was being written
+            task = self.tasks.get(scan_id)
+            if task is None or task.done():
+                self.tasks[scan_id] = start_background_task(self.run(scan_id))
+
+    def _set_status(self, scan_id: int, status: str, error: Optional[str] = None):
+        with _db_lock:
+            db = self._db()
+            db.execute("UPDATE block_scans SET status = ?, error = ? WHERE id = ?", (status, error, scan_id))
+            db.commit()
+
+    def _remaining_chunks(self, scan_id: int) -> tuple[str, List[tuple]]:
+        """(chain, [(next_block, end_block)]) for every chunk not yet fully screened"""
+        with _db_lock:
+            db = self._db()
+            chain = db.execute("SELECT chain FROM block_scans WHERE id = ?", (scan_id,)).fetchone()[0]
+            chunks = db.execute(
+                "SELECT next_block, end_block FROM block_scan_chunks WHERE scan_id = ? AND next_block <= end_block ORDER BY start_block",
+                (scan_id,)
+            ).fetchall()
+        return chain, chunks
+
+    def _checkpoint(self, scan_id: int, number: int, hits: List[tuple], tx_count: int):
+        # Hits and the checkpoint commit together, so a block is never half-recorded
+        with _db_lock:
+            db = self._db()
+            db.executemany(
+                """INSERT OR IGNORE INTO block_scan_hits
+                   (scan_id, block_number, tx_hash, log_index, address, role, category, reason)
+                   VALUES (?, ?, ?, ?, ?, ?, ?, ?)""",
+                hits
+            )
+            db.execute(
+                "UPDATE block_scan_chunks SET next_block = ? WHERE scan_id = ? AND start_block <= ? AND end_block >= ?",
+                (number + 1, scan_id, number, number)
+            )
+            db.execute(
+                "UPDATE block_scans SET transactions_screened = transactions_screened + ? WHERE id = ?",
+                (tx_count, scan_id)
+            )
+            db.commit()
+
+    def _finish(self, scan_id: int, elapsed: float, status: str, error: Optional[str]):
+        with _db_lock:
+            db = self._db()
+            db.execute(
+                "UPDATE block_scans SET elapsed_seconds = elapsed_seconds + ? WHERE id = ?",
+                (elapsed, scan_id)
+            )
+            db.commit()
+            self._set_status(scan_id, status, error)
+
+    async def run(self, scan_id: int):
+        chain, chunks = await run_db(self._remaining_chunks, scan_id)
+
+        pending = asyncio.Queue()
+        for chunk in chunks:
+            pending.put_nowait(chunk)
+        fetched = asyncio.Queue(maxsize=BLOCK_SCAN_QUEUE_SIZE)
+        parsed = asyncio.Queue(maxsize=BLOCK_SCAN_QUEUE_SIZE)
+        index = build_screening_index()
+        started = time.perf_counter()
+
+        async def fetch_worker():
+            while True:
+                try:
+                    next_block, end_block = pending.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+                for number in range(next_block, end_block + 1):
+                    for attempt in range(BLOCK_SCAN_RETRIES):
+                        try:
+                            block = await moralis_request_async(f"/block/{number}", params={"chain": chain})
+                            break
+                        except HTTPException as e:
+                            if e.status_code == 404 or attempt == BLOCK_SCAN_RETRIES - 1:
+                                raise
+                            await asyncio.sleep(2 ** attempt)
+                    await fetched.put((number, end_block, block))
+
+        async def parse_stage():
+            while True:
+                item = await fetched.get()
+                if item is None:
+                    await parsed.put(None)
+                    return
+                number, end_block, block = item
+                for tx in block.get("transactions") or []:
+                    decode_missing_events(tx.get("logs") or [])
+                refs, tx_count = extract_block_addresses(block)
+                await parsed.put((number, end_block, refs, tx_count))
+
+        async def screen_stage():
+            while True:
+                item = await parsed.get()
+                if item is None:
+                    return
+                number, end_block, refs, tx_count = item
+                hits = []
+                for address, role, tx_hash, log_index, label in refs:
+                    hit = index.get(address)
+                    if hit is None and label and any(kw in label.lower() for kw in MIXER_KEYWORDS):
+                        hit = ("mixer", label)
+                    if hit:
+                        hits.append((scan_id, number, tx_hash, log_index, address, role, hit[0], hit[1]))
+                await run_db(self._checkpoint, scan_id, number, hits, tx_count)
+
+        async def fetch_stage():
+            workers = [asyncio.create_task(fetch_worker()) for _ in range(max(1, BLOCK_SCAN_WORKERS))]
+            try:
+                await asyncio.gather(*workers)
+            except Exception as e:
+                fetch_errors.append(e)
+            finally:
+                for worker in workers:
+                    worker.cancel()
+                await asyncio.gather(*workers, return_exceptions=True)
+            # Drain what was already fetched so every fetched block is checkpointed
+            await fetched.put(None)
+
+        fetch_errors: List[Exception] = []
+        stages = [
+            asyncio.create_task(fetch_stage()),
+            asyncio.create_task(parse_stage()),
+            asyncio.create_task(screen_stage()),
+        ]
+        self.running_since[scan_id] = started
+        error = None
+        try:
+            done, _ = await asyncio.wait(stages, return_when=asyncio.FIRST_EXCEPTION)
+            failure = next((task.exception() for task in done if task.exception()), None)
+            failure = failure or (fetch_errors[0] if fetch_errors else None)
+            if failure is not None:
+                error = str(failure.detail) if isinstance(failure, HTTPException) else str(failure)
+        except asyncio.CancelledError:
+            error = "cancelled"
+        # A failed stage leaves the others blocked on a full or empty queue, so stop them all
+        for stage in stages:
+            stage.cancel()
+        await asyncio.gather(*stages, return_exceptions=True)
+
+        if error == "cancelled":
+            status, error = "paused", None
+        else:
+            status = "failed" if error else "completed"
+        await run_db(self._finish, scan_id, time.perf_counter() - started, status, error)
+        self.running_since.pop(scan_id, None)
+
+    async def pause(self, scan_id: int) -> bool:
+        task = self.tasks.get(scan_id)
+        if task is None or task.done():
+            return False
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+        return True
+
+    def status(self, scan_id: int, hits_limit: int = 1000, hits_offset: int = 0) -> Optional[BlockScanStatus]:
+        with _db_lock:
+            db = self._db()
+            row = db.execute(
+                "SELECT chain, from_block, to_block, status, transactions_screened, elapsed_seconds, error FROM block_scans WHERE id = ?",
+                (scan_id,)
+            ).fetchone()
+            if row is None:
+                return None
+            blocks_done = db.execute(
+                "SELECT COALESCE(SUM(next_block - start_block), 0) FROM block_scan_chunks WHERE scan_id = ?",
+                (scan_id,)
+            ).fetchone()[0]
+            hits_count = db.execute("SELECT COUNT(*) FROM block_scan_hits WHERE scan_id = ?", (scan_id,)).fetchone()[0]
+            hits = db.execute(
+                """SELECT block_number, tx_hash, log_index, address, role, category, reason
+                   FROM block_scan_hits WHERE scan_id = ? ORDER BY block_number, tx_hash, log_index LIMIT ? OFFSET ?""",
+                (scan_id, hits_limit, hits_offset)
+            ).fetchall()
+        chain, from_block, to_block, status, tx_screened, elapsed, error = row
+        if scan_id in self.running_since:
+            elapsed += time.perf_counter() - self.running_since[scan_id]
+        return BlockScanStatus(
+            scan_id=scan_id,
+            chain=chain,
+            from_block=from_block,
+            to_block=to_block,
+            status=status,
+            blocks_total=to_block - from_block + 1,
+            blocks_done=blocks_done,
+            transactions_screened=tx_screened,
+            hits_count=hits_count,
+            elapsed_seconds=round(elapsed, 3),
+            blocks_per_second=round(blocks_done / elapsed, 2) if elapsed > 0 else 0.0,
+            error=error,
+            hits=[
+                BlockScanHit(
+                    block_number=h[0], tx_hash=h[1], log_index=h[2], address=h[3],
+                    role=h[4], category=h[5], reason=h[6]
+                )
+                for h in hits
+            ]
+        )
+
+block_scanner = BlockRangeScanner()
+
+# Persisted analysis results
+ENTITY_TERM_SPLIT = str.maketrans({c: " " for c in "-_.,:;/()[]{}#@|'\""})
+
+def entity_terms(*names: Optional[str]) -> set:
+    """Lowercase words of entity names/labels, so "Tornado Cash: Router" is found by "tornado" """
+    terms = set()
+    for name in names:
+        if name:
+            terms.update(word for word in name.lower().translate(ENTITY_TERM_SPLIT).split() if len(word) > 1)
+    return terms
+
+# Key-filter matches above which search stops materializing the id set and probes per row instead
+SEARCH_DRIVE_LIMIT = int(os.getenv("SEARCH_DRIVE_LIMIT", "20000"))
+
+class AnalysisStore:
+    """Keeps every transaction and address analysis in SQLite for later querying.
+
+    `analyses` holds one row per analysis with the filterable columns and the full response as
+    JSON. A transaction keeps one row per (hash, chain, rule-set version, label-set version);
+    analysing it again under the same versions refreshes that row instead of adding another. Addresses, flag codes and entity terms go into narrow WITHOUT ROWID tables keyed by the
+    searched value, so each lookup is an index range scan rather than a pass over the results.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS analyses (
+            id INTEGER PRIMARY KEY,
+            kind TEXT NOT NULL,
+            subject TEXT NOT NULL,
+            chain TEXT NOT NULL,
+            analyzed_at REAL NOT NULL,
+            block_time INTEGER,
+            risk_score INTEGER NOT NULL,
+            risk_level TEXT NOT NULL,
+            value_native REAL,
+            value_usd REAL,
+            result TEXT NOT NULL,
+            version_key TEXT
+        );
+        CREATE INDEX IF NOT EXISTS idx_analyses_subject ON analyses(subject, analyzed_at);
+        CREATE INDEX IF NOT EXISTS idx_analyses_block_time ON analyses(block_time);
+        CREATE INDEX IF NOT EXISTS idx_analyses_risk_level ON analyses(risk_level, block_time);
+        CREATE INDEX IF NOT EXISTS idx_analyses_chain ON analyses(chain, block_time);
+        CREATE INDEX IF NOT EXISTS idx_analyses_risk_score ON analyses(risk_score);
+        CREATE INDEX IF NOT EXISTS idx_analyses_value_usd ON analyses(value_usd);
+        CREATE TABLE IF NOT EXISTS analysis_addresses (
+            address TEXT NOT NULL,
+            analysis_id INTEGER NOT NULL,
+            role TEXT NOT NULL,
+            PRIMARY KEY (address, analysis_id, role)
+        ) WITHOUT ROWID;
+        CREATE TABLE IF NOT EXISTS analysis_flags (
+            code TEXT NOT NULL,
+            analysis_id INTEGER NOT NULL,
+            PRIMARY KEY (code, analysis_id)
+        ) WITHOUT ROWID;
+        CREATE INDEX IF NOT EXISTS idx_analysis_flags_analysis ON analysis_flags(analysis_id);
+        CREATE TABLE IF NOT EXISTS analysis_entities (
+            term TEXT NOT NULL,
+            analysis_id INTEGER NOT NULL,
+            PRIMARY KEY (term, analysis_id)
+        ) WITHOUT ROWID;
+    """
+
+    def __init__(self):
+        self.ready = False
+
+    def _db(self) -> sqlite3.Connection:
+        db = get_db()
+        if not self.ready:
+            db.executescript(self.SCHEMA)
+            # Stores created before deduplication lack the version key
+            if "version_key" not in {row[1] for row in db.execute("PRAGMA table_info(analyses)")}:
+                db.execute("ALTER TABLE analyses ADD COLUMN version_key TEXT")
+            db.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_analyses_version_key ON analyses(version_key)")
+            # Refresh planner statistics where they are stale (bounded work, cheap on large tables)
+            db.execute("PRAGMA analysis_limit=1000")
+            db.execute("PRAGMA optimize")
+            self.ready = True
+        return db
+
+    def _save(
+        self,
+        kind: str,
+        subject: str,
+        chain: str,
+        result: BaseModel,
+        block_time: Optional[int],
+        value_native: Optional[float],
+        value_usd: Optional[float],
+        addresses: set,
+        terms: set,
+        codes: set,
+        version_key: Optional[str] = None
+    ) -> int:
+        values = (
+            kind, subject.lower(), chain, time.time(), block_time, result.risk_score, result.risk_level,
+            value_native, value_usd, result.model_dump_json()
+        )
+        with _db_lock:
+            db = self._db()
+            existing = None
+            if version_key is not None:
+                existing = db.execute("SELECT id FROM analyses WHERE version_key = ?", (version_key,)).fetchone()
+            if existing is None:
+                analysis_id = db.execute(
+                    """INSERT INTO analyses
+                       (kind, subject, chain, analyzed_at, block_time, risk_score, risk_level, value_native, value_usd, result, version_key)
+                       VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+                    values + (version_key,)
+                ).lastrowid
+            else:
+                # Same analysis under the same versions: refresh the row and its index entries
+                analysis_id = existing[0]
+                db.execute(
+                    """UPDATE analyses SET kind = ?, subject = ?, chain = ?, analyzed_at = ?, block_time = ?,
+                       risk_score = ?, risk_level = ?, value_native = ?, value_usd = ?, result = ? WHERE id = ?""",
+                    values + (analysis_id,)
+                )
+                for table in ("analysis_addresses", "analysis_flags", "analysis_entities"):
+                    db.execute(f"DELETE FROM {table} WHERE analysis_id = ?", (analysis_id,))
+            db.executemany(
+                "INSERT OR IGNORE INTO analysis_addresses (address, analysis_id, role) VALUES (?, ?, ?)",
+                [(address.lower(), analysis_id, role) for address, role in addresses if address]
+            )
+            db.executemany(
+                "INSERT OR IGNORE INTO analysis_flags (code, analysis_id) VALUES (?, ?)",
+                [(code, analysis_id) for code in codes]
+            )
+            db.executemany(
+                "INSERT OR IGNORE INTO analysis_entities (term, analysis_id) VALUES (?, ?)",
+                [(term, analysis_id) for term in terms]
+            )
+            db.commit()
+        return analysis_id
+
+    def record_transaction(self, result: AnalysisResult, chain: str) -> int:
+        version_key = "|".join(
+            (result.tx_hash.lower(), chain, risk_rules.current_version(), counterparty_verdicts.current_version())
+        )
+        details = result.details
+        addresses = {(details.from_address, "from"), (details.to_address, "to")}
+        for event in result.event_analysis:
+            addresses.update((participant, "event_participant") for participant in event.top_addresses)
+        terms = entity_terms(details.from_label, details.from_entity, details.to_label, details.to_entity)
+        for address in (details.from_address, details.to_address):
+            terms |= entity_terms(MIXER_ADDRESSES.get((address or "").lower()), KNOWN_EXCHANGES.get((address or "").lower()))
+        value_native = wei_to_native(int(details.value_wei))
+        return self._save(
+            "transaction", result.tx_hash, chain, result,
+            to_unix_timestamp(details.block_timestamp), value_native, details.value_usd,
+            addresses, terms, {flag.code for flag in result.flag_codes}, version_key
+        )
+
+    def record_address(self, result: AddressAnalysis, chain: str) -> int:
+        addresses = {(result.address, "subject")}
+        terms = entity_terms(result.address_label)
+        codes = {flag.code for flag in result.flag_codes}
+        block_times = []
+        for tx in result.recent_transactions:
+            addresses.add((tx.to_address if tx.direction == "outgoing" else tx.from_address, "counterparty"))
+            terms |= entity_terms(tx.entity_interaction)
+            codes.update(tx.flag_codes)
+            block_times.append(to_unix_timestamp(tx.block_timestamp))
+        codes.discard("STANDARD")
+        summary = result.behavior_summary
+        return self._save(
+            "address", result.address, chain, result,
+            max((t for t in block_times if t is not None), default=None),
+            summary.get("total_volume_eth"), summary.get("total_volume_usd"),
+            addresses, terms, codes
+        )
+
+    @staticmethod
+    def _timestamp(value: Optional[float]) -> Optional[str]:
+        return datetime.fromtimestamp(value, timezone.utc).isoformat() if value is not None else None
+
+    def _load(self, db: sqlite3.Connection, ids: List[int], include_result: bool) -> List[StoredAnalysis]:
+        """Materialize rows by id, preserving the order of `ids`"""
+        if not ids:
+            return []
+        placeholders = ",".join("?" * len(ids))
+        columns = "id, kind, subject, chain, analyzed_at, block_time, risk_score, risk_level, value_native, value_usd"
+        rows = {
+            row[0]: row for row in db.execute(
+                f"SELECT {columns}{', result' if include_result else ''} FROM analyses WHERE id IN ({placeholders})",
+                ids
+            )
+        }
+        codes = defaultdict(list)
+        for analysis_id, code in db.execute(
+            f"SELECT analysis_id, code FROM analysis_flags WHERE analysis_id IN ({placeholders})", ids
+        ):
+            codes[analysis_id].append(code)
+        return [
+            StoredAnalysis(
+                id=r[0], kind=r[1], subject=r[2], chain=r[3],
+                analyzed_at=self._timestamp(r[4]), block_time=self._timestamp(r[5]),
+                risk_score=r[6], risk_level=r[7], value_native=r[8], value_usd=r[9],
+                flag_codes=sorted(codes[r[0]]),
+                result=json.loads(r[10]) if include_result else None
+            )
+            for r in (rows[i] for i in ids if i in rows)
+        ]
+
+    def history(self, key: str, limit: int = 20, include_result: bool = True) -> List[StoredAnalysis]:
+        """Past analyses of a transaction hash, or every analysis touching an address, newest first"""
+        key = key.lower()
+        with _db_lock:
+            db = self._db()
+            ids = [row[0] for row in db.execute(
+                """SELECT id FROM analyses WHERE subject = ?
+                   UNION SELECT analysis_id FROM analysis_addresses WHERE address = ?
+                   ORDER BY 1 DESC LIMIT ?""",
+                (key, key, limit)
+            )]
+            return self._load(db, ids, include_result)
+
+    SORT_COLUMNS = {
+        "block_time": "block_time",
+        "risk_score": "risk_score",
+        "value_usd": "value_usd",
+        "analyzed_at": "id"
+    }
+
+    def search(
+        self,
+        risk_levels: List[str],
+        flag_codes: List[str],
+        entity: Optional[str],
+        address: Optional[str],
+        chain: Optional[str],
+        kind: Optional[str],
+        since: Optional[int],
+        until: Optional[int],
+        min_value_usd: Optional[float],
+        max_value_usd: Optional[float],
+        sort: str,
+        descending: bool,
+        cursor: Optional[str],
+        limit: int,
+        include_result: bool
+    ) -> tuple[List[StoredAnalysis], Optional[str]]:
+        """Filtered, keyset-paginated listing of stored analyses.
+
+        Address, flag and entity filters use their key tables: a selective key drives the query
+        as `id IN (...)`, while a common one (found with a bounded count) becomes a primary-key
+        probe per row as the sort index is walked. Other filters are index-backed comparisons
+        on `analyses`. Pages continue from the (sort value, id) of the last
+        row instead of an OFFSET, so deep pages cost the same as the first.
+        """
+        column = self.SORT_COLUMNS[sort]
+        where, params = [], []
+        key_filters = []
+        if risk_levels:
+            where.append(f"risk_level IN ({','.join('?' * len(risk_levels))})")
+            params.extend(risk_levels)
+        if flag_codes:
+            key_filters.append(("analysis_flags", "code", flag_codes))
+        for term in sorted(entity_terms(entity)):
+            key_filters.append(("analysis_entities", "term", [term]))
+        if address:
+            key_filters.append(("analysis_addresses", "address", [address.lower()]))
+        if chain:
+            where.append("chain = ?")
+            params.append(chain)
+        if kind:
+            where.append("kind = ?")
+            params.append(kind)
+        if since is not None:
+            where.append("block_time >= ?")
+            params.append(since)
+        if until is not None:
+            where.append("block_time < ?")
+            params.append(until)
+        if min_value_usd is not None:
+            where.append("value_usd >= ?")
+            params.append(min_value_usd)
+        if max_value_usd is not None:
+            where.append("value_usd <= ?")
+            params.append(max_value_usd)
+        if column != "id":
+            # Rows without a sort value cannot be placed in keyset order
+            where.append(f"{column} IS NOT NULL")
+        if cursor:
+            last_value, last_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+            comparison = "<" if descending else ">"
+            if column == "id":
+                where.append(f"id {comparison} ?")
+                params.append(last_id)
+            else:
+                where.append(f"({column}, id) {comparison} (?, ?)")
+                params.extend([last_value, last_id])
+
+        direction = "DESC" if descending else "ASC"
+        order = f"id {direction}" if column == "id" else f"{column} {direction}, id {direction}"
+        with _db_lock:
+            db = self._db()
+            for table, key, values in key_filters:
+                placeholders = ",".join("?" * len(values))
+                matches = db.execute(
+                    f"SELECT COUNT(*) FROM (SELECT 1 FROM {table} WHERE {key} IN ({placeholders}) LIMIT ?)",
+                    values + [SEARCH_DRIVE_LIMIT]
+                ).fetchone()[0]
+                if matches < SEARCH_DRIVE_LIMIT:
+                    # Selective key: the matching ids drive the query and only they are sorted
+                    where.append(f"id IN (SELECT analysis_id FROM {table} WHERE {key} IN ({placeholders}))")
+                else:
+                    # Common key: walk the sort order and probe the key table's primary key per row
+                    where.append(
+                        f"EXISTS (SELECT 1 FROM {table} k WHERE k.{key} IN ({placeholders}) AND k.analysis_id = analyses.id)"
+                    )
+                params.extend(values)
+            sql = (
+                f"SELECT id, {column} FROM analyses"
+                + (f" WHERE {' AND '.join(where)}" if where else "")
+                + f" ORDER BY {order} LIMIT ?"
+            )
+            rows = db.execute(sql, params + [limit + 1]).fetchall()
+            page = rows[:limit]
+            items = self._load(db, [row[0] for row in page], include_result)
+
+        next_cursor = None
+        if len(rows) > limit:
+            last_id, last_value = page[-1]
+            next_cursor = base64.urlsafe_b64encode(json.dumps([last_value, last_id]).encode()).decode()
+        return items, next_cursor
+
+analysis_store = AnalysisStore()
+
+# Precomputed indirect exposure
+EXPOSURE_MAX_HOPS = int(os.getenv("EXPOSURE_MAX_HOPS", "2"))
+EXPOSURE_DECAY = float(os.getenv("EXPOSURE_DECAY", "0.5"))
+EXPOSURE_CHAINS = [c.strip() for c in os.getenv("EXPOSURE_CHAINS", "eth").split(",") if c.strip()]
+EXPOSURE_REFRESH_SECONDS = float(os.getenv("EXPOSURE_REFRESH_SECONDS", "21600"))
+EXPOSURE_REQUEST_BUDGET = int(os.getenv("EXPOSURE_REQUEST_BUDGET", "500"))
+EXPOSURE_MIN_PCT = float(os.getenv("EXPOSURE_MIN_PCT", "1"))
+# Off by default: each rebuild spends up to EXPOSURE_REQUEST_BUDGET upstream calls per chain
+EXPOSURE_ENABLED = os.getenv("EXPOSURE_ENABLED", "false").lower() in ("1", "true", "yes")
+
+class ExposureIndex:
+    """Reverse index from sanctioned/mixer sources to the addresses their funds reached.
+
+    A background job walks outgoing transfers from every source for up to EXPOSURE_MAX_HOPS hops.
+    Each hop forwards a proportional share of the sender's taint (taint / outflow, capped at 1)
+    multiplied by EXPOSURE_DECAY per hop beyond the first; each node is expanded at most once.
+    Per-source rows, a per-address summary and the tainted share of each individual incoming transfer
+    are then swapped in atomically, so analyses read exposure with primary-key lookups and can relate
+    taint to exactly the transfers they are looking at.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS exposure_sources (
+            address TEXT NOT NULL,
+            chain TEXT NOT NULL,
+            source TEXT NOT NULL,
+            category TEXT NOT NULL,
+            hops INTEGER NOT NULL,
+            weight_wei TEXT NOT NULL,
+            PRIMARY KEY (address, chain, source)
+        ) WITHOUT ROWID;
+        CREATE INDEX IF NOT EXISTS idx_exposure_sources_source ON exposure_sources(source, chain);
+        CREATE TABLE IF NOT EXISTS exposure_scores (
+            address TEXT NOT NULL,
+            chain TEXT NOT NULL,
+            sanctioned_wei TEXT NOT NULL,
+            mixer_wei TEXT NOT NULL,
+            nearest_hops INTEGER NOT NULL,
+            PRIMARY KEY (address, chain)
+        ) WITHOUT ROWID;
+        CREATE TABLE IF NOT EXISTS exposure_transfers (
+            address TEXT NOT NULL,
+            chain TEXT NOT NULL,
+            tx_hash TEXT NOT NULL,
+            sanctioned_wei TEXT NOT NULL,
+            mixer_wei TEXT NOT NULL,
+            PRIMARY KEY (address, chain, tx_hash)
+        ) WITHOUT ROWID;
+        CREATE TABLE IF NOT EXISTS exposure_runs (
+            chain TEXT PRIMARY KEY,
+            updated_at REAL NOT NULL,
+            nodes INTEGER NOT NULL,
+            requests_used INTEGER NOT NULL
+        );
+    """
+
+    def __init__(self):
+        self.task: Optional[asyncio.Task] = None
+        self.ready = False
+        # Chains with a rebuild in flight; a second concurrent walk would only repeat the upstream spend
+        self.rebuilding: set = set()
+
+    def _db(self) -> sqlite3.Connection:
+        db = get_db()
+        if not self.ready:
+            db.executescript(self.SCHEMA)
+            self.ready = True
+        return db
+
+    async def rebuild(self, chain: str) -> int:
+        """Recompute the chain's index from the current source lists; returns the number of exposed addresses"""
+        self.rebuilding.add(chain)
+        try:
+            return await self._rebuild(chain)
+        finally:
+            self.rebuilding.discard(chain)
+
+    async def _rebuild(self, chain: str) -> int:
+        sources = {}
+        for address in set(SANCTIONS_LIST) | set(MIXER_ADDRESSES):
+            hit = screen_counterparty(address)
+            if hit:
+                sources[address.lower()] = hit[0]
+
+        # taint[node][source] = decayed wei reaching node from source; hops[node][source] = first hop
+        taint: Dict[str, Dict[str, int]] = defaultdict(dict)
+        hops: Dict[str, Dict[str, int]] = defaultdict(dict)
+        # (node, tx_hash) -> [sanctioned wei, mixer wei] carried by that incoming transfer
+        transfer_taint: Dict[tuple, list] = {}
+        frontier = list(sources)
+        # Re-expanding a node reached again on a later hop would count its outflows twice
+        expanded = set()
+        requests_used = 0
+
+        for hop in range(1, EXPOSURE_MAX_HOPS + 1):
+            frontier = [node for node in frontier if node not in expanded]
+            frontier = frontier[:max(0, EXPOSURE_REQUEST_BUDGET - requests_used)]
+            if not frontier:
+                break
+            expanded.update(frontier)
+            requests_used += len(frontier)
+            histories = await asyncio.gather(
+                *(moralis_request_async(f"/{node}", params={"chain": chain, "limit": 100, "order": "DESC"}) for node in frontier),
+                return_exceptions=True
+            )
+            received = defaultdict(int)
+            for node, history in zip(frontier, histories):
+                if isinstance(history, Exception):
+                    continue
+                outgoing = []
+                for tx in history.get("result", []):
+                    value = int(tx.get("value", 0) or 0)
+                    target = (tx.get("to_address") or "").lower()
+                    if value > 0 and target and (tx.get("from_address") or "").lower() == node:
+                        outgoing.append((target, value, tx.get("hash", "")))
+                outflow = sum(value for _, value, _ in outgoing)
+                if not outflow:
+                    continue
+                # A source passes on everything it sends; any other node passes on its tainted share
+                shares = {node: 1.0} if node in sources else {
+                    source: min(1.0, amount / outflow) * EXPOSURE_DECAY for source, amount in taint[node].items()
+                }
+                for target, value, tx_hash in outgoing:
+                    if target in sources:
+                        continue
+                    for source, share in shares.items():
+                        amount = int(value * share)
+                        if amount <= 0:
+                            continue
+                        taint[target][source] = taint[target].get(source, 0) + amount
+                        hops[target].setdefault(source, hop)
+                        received[target] += amount
+                        carried = transfer_taint.setdefault((target, tx_hash), [0, 0])
+                        carried[0 if sources[source] == "sanctioned" else 1] += amount
+            # Exchanges are hubs; their outflows are customer withdrawals, not forwarded taint
+            frontier = [
+                node for node, _ in sorted(received.items(), key=lambda item: item[1], reverse=True)
+                if node not in KNOWN_EXCHANGES
+            ]
+
+        source_rows, score_rows = [], []
+        for node, per_source in taint.items():
+            totals = {"sanctioned": 0, "mixer": 0}
+            for source, amount in per_source.items():
+                source_rows.append((node, chain, source, sources[source], hops[node][source], str(amount)))
+                totals[sources[source]] += amount
+            score_rows.append((
+                node, chain, str(totals["sanctioned"]), str(totals["mixer"]), min(hops[node].values())
+            ))
+
+        transfer_rows = [
+            # A transfer cannot carry more taint than its value, however many sources share it
+            (node, chain, tx_hash, str(sanctioned), str(mixer))
+            for (node, tx_hash), (sanctioned, mixer) in transfer_taint.items() if tx_hash
+        ]
+        await run_db(self._replace, chain, source_rows, score_rows, transfer_rows, requests_used)
+        return len(score_rows)
+
+    def _replace(self, chain: str, source_rows: List[tuple], score_rows: List[tuple], transfer_rows: List[tuple], requests_used: int):
+        """Swap in a chain's rebuilt index in one transaction"""
+        with _db_lock:
+            db = self._db()
+            db.execute("DELETE FROM exposure_sources WHERE chain = ?", (chain,))
+            db.execute("DELETE FROM exposure_scores WHERE chain = ?", (chain,))
+            db.execute("DELETE FROM exposure_transfers WHERE chain = ?", (chain,))
+            db.executemany("INSERT INTO exposure_sources VALUES (?, ?, ?, ?, ?, ?)", source_rows)
+            db.executemany("INSERT INTO exposure_scores VALUES (?, ?, ?, ?, ?)", score_rows)
+            db.executemany("INSERT INTO exposure_transfers VALUES (?, ?, ?, ?, ?)", transfer_rows)
+            db.execute(
+                "INSERT OR REPLACE INTO exposure_runs (chain, updated_at, nodes, requests_used) VALUES (?, ?, ?, ?)",
+                (chain, time.time(), len(score_rows), requests_used)
+            )
+            db.commit()
+
+    def lookup(self, address: str, chain: str) -> Optional[tuple[int, int, int]]:
+        """(sanctioned wei, mixer wei, nearest hops) for an address, or None if it is not exposed"""
+        with _db_lock:
+            row = self._db().execute(
+                "SELECT sanctioned_wei, mixer_wei, nearest_hops FROM exposure_scores WHERE address = ? AND chain = ?",
+                (address.lower(), chain)
+            ).fetchone()
+        return (int(row[0]), int(row[1]), row[2]) if row else None
+
+    def transfer_taint(self, address: str, chain: str, tx_hashes: List[str]) -> tuple[int, int]:
+        """(sanctioned wei, mixer wei) carried into an address by the given incoming transfers"""
+        if not tx_hashes:
+            return 0, 0
+        placeholders = ",".join("?" * len(tx_hashes))
+        with _db_lock:
+            rows = self._db().execute(
+                f"""SELECT sanctioned_wei, mixer_wei FROM exposure_transfers
+                    WHERE address = ? AND chain = ? AND tx_hash IN ({placeholders})""",
+                (address.lower(), chain, *tx_hashes)
+            ).fetchall()
+        return sum(int(r[0]) for r in rows), sum(int(r[1]) for r in rows)
+
+    def summary(self, address: str, chain: str) -> ExposureSummary:
+        with _db_lock:
+            db = self._db()
+            rows = db.execute(
+                """SELECT source, category, hops, weight_wei FROM exposure_sources
+                   WHERE address = ? AND chain = ?""",
+                (address.lower(), chain)
+            ).fetchall()
+            run = db.execute("SELECT updated_at FROM exposure_runs WHERE chain = ?", (chain,)).fetchone()
+        sources = sorted(
+            (
+                ExposureSource(
+                    source=source,
+                    category=category,
+                    label=SANCTIONS_LIST.get(source) or MIXER_ADDRESSES.get(source),
+                    hops=hop,
+                    amount=wei_to_native(int(weight))
+                )
+                for source, category, hop, weight in rows
+            ),
+            key=lambda s: s.amount,
+            reverse=True
+        )
+        return ExposureSummary(
+            address=address,
+            chain=chain,
+            sanctioned_amount=sum(s.amount for s in sources if s.category == "sanctioned"),
+            mixer_amount=sum(s.amount for s in sources if s.category == "mixer"),
+            nearest_hops=min((s.hops for s in sources), default=None),
+            sources=sources,
+            index_updated_at=datetime.fromtimestamp(run[0], timezone.utc).isoformat() if run else None
+        )
+
+    async def run_forever(self):
+        while True:
+            for chain in EXPOSURE_CHAINS:
+                if chain in self.rebuilding:
+                    continue
+                try:
+                    await self.rebuild(chain)
+                except (sqlite3.Error, HTTPException):
+                    pass
+            await asyncio.sleep(EXPOSURE_REFRESH_SECONDS)
+
+    def start(self):
+        if self.task is None or self.task.done():
+            self.task = start_background_task(self.run_forever())
+
+    async def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+
+exposure_index = ExposureIndex()
+
+# Rolling per-address baselines
+BASELINE_MIN_SAMPLES = int(os.getenv("BASELINE_MIN_SAMPLES", "30"))
+BASELINE_Z_THRESHOLD = float(os.getenv("BASELINE_Z_THRESHOLD", "3"))
+BASELINE_EWMA_ALPHA = float(os.getenv("BASELINE_EWMA_ALPHA", "0.1"))
+BASELINE_MIN_STD = 0.25  # Log-scale floor so near-constant histories do not flag tiny deviations
+
+class RunningStat:
+    """Welford mean/variance plus an EWMA, updated in O(1) per observation"""
+
+    __slots__ = ("n", "mean", "m2", "ewma")
+
+    def __init__(self, n: int = 0, mean: float = 0.0, m2: float = 0.0, ewma: float = 0.0):
+        self.n, self.mean, self.m2, self.ewma = n, mean, m2, ewma
+
+    def update(self, x: float):
+        self.n += 1
+        delta = x - self.mean
+        self.mean += delta / self.n
+        self.m2 += delta * (x - self.mean)
+        self.ewma = x if self.n == 1 else BASELINE_EWMA_ALPHA * x + (1 - BASELINE_EWMA_ALPHA) * self.ewma
+
+    @property
+    def std(self) -> float:
+        return math.sqrt(self.m2 / (self.n - 1)) if self.n > 1 else 0.0
+
+    def zscore(self, x: float) -> float:
+        return (x - self.mean) / max(self.std, BASELINE_MIN_STD)
+
+class AddressBaseline:
+    """Streaming statistics of one address on one chain.
+
+    Value and inter-arrival time are tracked on a log1p scale (both are heavy-tailed); churn is
+    the 0/1 indicator of a never-seen counterparty.
+    """
+
+    __slots__ = ("value", "gap", "churn", "last_ts")
+
+    def __init__(self, value: RunningStat = None, gap: RunningStat = None, churn: RunningStat = None, last_ts: int = 0):
+        self.value = value or RunningStat()
+        self.gap = gap or RunningStat()
+        self.churn = churn or RunningStat()
+        self.last_ts = last_ts
+
+    @property
+    def mature(self) -> bool:
+        return self.value.n >= BASELINE_MIN_SAMPLES
+
+HISTOGRAM_CELLS = 7 * 24
+# Typical share of a person's activity by local hour (00-23), used to place the owner's day
+HEATMAP_DIURNAL_TEMPLATE = (
+    0.30, 0.15, 0.05, 0.05, 0.05, 0.10, 0.20, 0.30, 0.60, 1.00, 1.00, 1.00,
+    1.00, 1.00, 1.00, 1.00, 1.00, 1.00, 1.00, 1.00, 1.00, 0.90, 0.80, 0.50
+)
+HEATMAP_MIN_TRANSACTIONS = 24
+
+def histogram_cell(ts: int) -> int:
+    """Day-of-week x hour-of-day cell (UTC, Monday = 0) of a unix timestamp"""
+    days, seconds = divmod(ts, 86400)
+    # 1970-01-01 was a Thursday (weekday 3)
+    return (days + 3) % 7 * 24 + seconds // 3600
+
+def infer_utc_offset(counts: array) -> tuple[Optional[int], float]:
+    """UTC offset that best aligns the hourly profile with a human day, with a 0-1 confidence"""
+    total = sum(counts)
+    if total < HEATMAP_MIN_TRANSACTIONS:
+        return None, 0.0
+    hours = [sum(counts[day * 24 + hour] for day in range(7)) for hour in range(24)]
+    fit = {
+        offset: sum(hours[(local - offset) % 24] * weight for local, weight in enumerate(HEATMAP_DIURNAL_TEMPLATE))
+        for offset in range(-11, 13)
+    }
+    offset = max(fit, key=lambda o: (fit[o], -abs(o)))
+    # Round-the-clock activity (bots, exchanges) fits every offset equally well
+    worst = min(fit.values())
+    confidence = (fit[offset] - worst) / fit[offset] if fit[offset] else 0.0
+    return offset, round(confidence, 3)
+
+class BaselineStore:
+    """Persists per-address baselines and the set of counterparties each address has used.
+
+    Only transactions newer than the stored `last_ts` are applied, so re-analyzing an address
+    updates its baseline with the new transactions alone and never re-reads history.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS address_baselines (
+            address TEXT NOT NULL,
+            chain TEXT NOT NULL,
+            last_ts INTEGER NOT NULL,
+            value_n INTEGER NOT NULL, value_mean REAL NOT NULL, value_m2 REAL NOT NULL, value_ewma REAL NOT NULL,
+            gap_n INTEGER NOT NULL, gap_mean REAL NOT NULL, gap_m2 REAL NOT NULL, gap_ewma REAL NOT NULL,
+            churn_n INTEGER NOT NULL, churn_mean REAL NOT NULL, churn_m2 REAL NOT NULL, churn_ewma REAL NOT NULL,
+            PRIMARY KEY (address, chain)
+        ) WITHOUT ROWID;
+        CREATE TABLE IF NOT EXISTS activity_histograms (
+            address TEXT NOT NULL,
+            chain TEXT NOT NULL,
+            counts BLOB NOT NULL,
+            value_sums BLOB NOT NULL,
+            PRIMARY KEY (address, chain)
+        ) WITHOUT ROWID;
+        CREATE TABLE IF NOT EXISTS baseline_counterparties (
+            address TEXT NOT NULL,
+            chain TEXT NOT NULL,
+            counterparty TEXT NOT NULL,
+            PRIMARY KEY (address, chain, counterparty)
+        ) WITHOUT ROWID;
+    """
+
+    def __init__(self):
+        self.ready = False
+
+    def _db(self) -> sqlite3.Connection:
+        db = get_db()
+        if not self.ready:
+            db.executescript(self.SCHEMA)
+            self.ready = True
+        return db
+
+    def load(self, address: str, chain: str) -> Optional[AddressBaseline]:
+        with _db_lock:
+            row = self._db().execute(
+                "SELECT * FROM address_baselines WHERE address = ? AND chain = ?", (address.lower(), chain)
+            ).fetchone()
+        if row is None:
+            return None
+        return AddressBaseline(
+            value=RunningStat(*row[3:7]), gap=RunningStat(*row[7:11]), churn=RunningStat(*row[11:15]), last_ts=row[2]
+        )
+
+    def seen_counterparties(self, address: str, chain: str, candidates: set) -> set:
+        if not candidates:
+            return set()
+        placeholders = ",".join("?" * len(candidates))
+        with _db_lock:
+            return {
+                row[0] for row in self._db().execute(
+                    f"""SELECT counterparty FROM baseline_counterparties
+                        WHERE address = ? AND chain = ? AND counterparty IN ({placeholders})""",
+                    [address.lower(), chain, *candidates]
+                )
+            }
+
+    @staticmethod
+    def counterparty(address: str, tx: Dict) -> str:
+        from_addr = (tx.get("from_address") or "").lower()
+        return (tx.get("to_address") or "").lower() if from_addr == address else from_addr
+
+    def observe(self, address: str, chain: str, transactions: List[Dict]) -> AddressBaseline:
+        """Fold transactions newer than the baseline into it, oldest first"""
+        address = address.lower()
+        with _db_lock:
+            db = self._db()
+            baseline = self.load(address, chain) or AddressBaseline()
+            rows = sorted(
+                (
+                    (ts, tx) for ts, tx in ((to_unix_timestamp(tx.get("block_timestamp", "")), tx) for tx in transactions)
+                    if ts is not None and ts > baseline.last_ts
+                ),
+                key=lambda row: row[0]
+            )
+            if not rows:
+                return baseline
+
+            seen = self.seen_counterparties(address, chain, {self.counterparty(address, tx) for _, tx in rows})
+            counts, value_sums = self.load_histogram(address, chain)
+            new_counterparties = []
+            for ts, tx in rows:
+                value = wei_to_native(int(tx.get("value", 0) or 0))
+                cell = histogram_cell(ts)
+                counts[cell] += 1
+                value_sums[cell] += value
+                baseline.value.update(math.log1p(value))
+                if baseline.last_ts:
+                    baseline.gap.update(math.log1p(ts - baseline.last_ts))
+                counterparty = self.counterparty(address, tx)
+                is_new = counterparty not in seen
+                baseline.churn.update(1.0 if is_new else 0.0)
+                if is_new:
+                    seen.add(counterparty)
+                    new_counterparties.append((address, chain, counterparty))
+                baseline.last_ts = ts
+
+            stats = [baseline.value, baseline.gap, baseline.churn]
+            db.execute(
+                "INSERT OR REPLACE INTO address_baselines VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                [address, chain, baseline.last_ts] + [getattr(stat, f) for stat in stats for f in RunningStat.__slots__]
+            )
+            db.executemany("INSERT OR IGNORE INTO baseline_counterparties VALUES (?, ?, ?)", new_counterparties)
+            db.execute(
+                "INSERT OR REPLACE INTO activity_histograms VALUES (?, ?, ?, ?)",
+                (address, chain, counts.tobytes(), value_sums.tobytes())
+            )
+            db.commit()
+        return baseline
+
+    def load_histogram(self, address: str, chain: str) -> tuple[array, array]:
+        """(counts, value sums) as flat 168-cell arrays; zeros if the address has none yet"""
+        with _db_lock:
+            row = self._db().execute(
+                "SELECT counts, value_sums FROM activity_histograms WHERE address = ? AND chain = ?",
+                (address.lower(), chain)
+            ).fetchone()
+        counts, value_sums = array("q"), array("d")
+        if row:
+            counts.frombytes(row[0])
+            value_sums.frombytes(row[1])
+        else:
+            counts.extend([0] * HISTOGRAM_CELLS)
+            value_sums.extend([0.0] * HISTOGRAM_CELLS)
+        return counts, value_sums
+
+    def heatmap(self, address: str, chain: str) -> ActivityHeatmap:
+        counts, value_sums = self.load_histogram(address, chain)
+        offset, confidence = infer_utc_offset(counts)
+        return ActivityHeatmap(
+            address=address,
+            chain=chain,
+            transactions=sum(counts),
+            counts=[counts[day * 24:(day + 1) * 24].tolist() for day in range(7)],
+            value_sums=[[round(v, 6) for v in value_sums[day * 24:(day + 1) * 24]] for day in range(7)],
+            inferred_utc_offset=offset,
+            timezone_confidence=confidence
+        )
+
+    def stats(self, address: str, chain: str) -> Optional[AddressBaselineStats]:
+        baseline = self.load(address, chain)
+        if baseline is None:
+            return None
+
+        def metric(stat: RunningStat) -> BaselineMetric:
+            return BaselineMetric(mean=math.expm1(stat.mean), ewma=math.expm1(stat.ewma), std_log=stat.std)
+
+        return AddressBaselineStats(
+            address=address,
+            chain=chain,
+            transactions_observed=baseline.value.n,
+            mature=baseline.mature,
+            last_seen=datetime.fromtimestamp(baseline.last_ts, timezone.utc).isoformat() if baseline.last_ts else None,
+            value=metric(baseline.value),
+            inter_arrival_seconds=metric(baseline.gap),
+            counterparty_churn=baseline.churn.mean,
+            counterparty_churn_ewma=baseline.churn.ewma
+        )
+
+baseline_store = BaselineStore()
+
+@app.on_event("startup")
+async def start_exposure_index():
+    if EXPOSURE_ENABLED:
+        exposure_index.start()
+
+@app.on_event("shutdown")
+async def stop_exposure_index():
+    await exposure_index.stop()
+
+# API Endpoints
+
+async def run_transaction_analysis(tx_hash: str, chain: str = "eth") -> AnalysisResult:
+    """Analyze a transaction; the result is assembled from already-checked values without re-validation"""
     try:
-        tx_data = moralis_request(
+        tx_data = await moralis_request_async(
             f"/transaction/{tx_hash}/verbose",
             params={"chain": chain}
         )
+        mark_stage("moralis")
+        
+        # Decode logs from unverified contracts locally
+        decode_missing_events(tx_data.get("logs", []))
+        mark_stage("decode")
         
         from_addr = tx_data.get("from_address", "")
         to_addr = tx_data.get("to_address", "")
         value_wei = int(tx_data.get("value", 0))
-        value_eth = value_wei / 1e18 # Convert Wei to ETH
+        value_eth = wei_to_native(value_wei) # Float view for thresholds; display comes from the exact wei
         nonce = int(tx_data.get("nonce", 0))
         
         # Initialize flags and checks
@@ -427,25 +4091,70 @@ async def analyze_transaction(tx_hash: str, chain: str = "eth"):
         sanctions_hit = from_sanctioned or to_sanctioned
         
         if from_sanctioned:
-            flags.append(f"🚨 CRITICAL: From address sanctioned - {from_reason}")
+            flags.append(make_flag(
+                "SANCTIONED_FROM",
+                f"🚨 CRITICAL: From address sanctioned - {from_reason}",
+                address=from_addr,
+                reason=from_reason
+            ))
         if to_sanctioned:
-            flags.append(f"🚨 CRITICAL: To address sanctioned - {to_reason}")
+            flags.append(make_flag(
+                "SANCTIONED_TO",
+                f"🚨 CRITICAL: To address sanctioned - {to_reason}",
+                address=to_addr,
+                reason=to_reason
+            ))
         
         # Extract Entity Labels (Mixers, Exchanges)
         entity_labels, mixer_hit, exchange_hit = extract_moralis_labels(tx_data)
         
         if mixer_hit:
-            flags.append("🔄 Mixer/privacy service detected")
+            flags.append(make_flag("MIXER_DETECTED", "🔄 Mixer/privacy service detected"))
+        mark_stage("labels")
         
         # Deep Event Analysis (Logs)
         event_analyses, event_flags = analyze_events(tx_data.get("logs", []))
         flags.extend(event_flags)
+        mark_stage("events")
+        
+        # Circular Flow Detection (same-token cycles in the transfer graph)
+        flow_edges, _, _, _ = build_token_flow_graph(tx_data)
+        circular_flows = detect_transaction_cycles(flow_edges)
+        for finding in circular_flows:
+            flags.append(make_flag(
+                "CIRCULAR_FLOW",
+                f"🔁 Circular flow: {len(finding.path) - 1}-address cycle of token {finding.token}",
+                scope=finding.scope,
+                token=finding.token,
+                path_length=len(finding.path) - 1
+            ))
+        mark_stage("flows")
         
-        # Value Analysis
-        if value_eth > 100:
-            flags.append(f"💰 Very high value: {value_eth:.2f} ETH (~${value_eth * 2500:.2f})")
-        elif value_eth > 10:
-            flags.append(f"💰 High value: {value_eth:.2f} ETH")
+        # Value Analysis (USD at block time when the native asset is priced)
+        symbol = native_asset(chain)
+        usd_price = price_table.usd_price(symbol, to_unix_timestamp(tx_data.get("block_timestamp", "")))
+        value_usd = value_eth * usd_price if usd_price is not None else None
+        tier = value_tier(
+            value_eth, value_usd,
+            (HIGH_VALUE_NATIVE, VERY_HIGH_VALUE_NATIVE), (HIGH_VALUE_USD, VERY_HIGH_VALUE_USD)
+        )
+        usd_text = f" (~${value_usd:,.2f})" if value_usd is not None else ""
+        if tier == 2:
+            flags.append(make_flag(
+                "VERY_HIGH_VALUE",
+                f"💰 Very high value: {value_eth:.2f} {symbol}{usd_text}",
+                value=value_eth,
+                symbol=symbol,
+                value_usd=value_usd
+            ))
+        elif tier == 1:
+            flags.append(make_flag(
+                "HIGH_VALUE",
+                f"💰 High value: {value_eth:.2f} {symbol}{usd_text}",
+                value=value_eth,
+                symbol=symbol,
+                value_usd=value_usd
+            ))
         
         # Analyze Decoded Function Calls (Input Data)
         decoded_call = tx_data.get("decoded_call")
@@ -454,7 +4163,11 @@ async def analyze_transaction(tx_hash: str, chain: str = "eth"):
             
             # Check for high-risk methods
             if any(risk in method for risk in HIGH_RISK_METHODS):
-                flags.append(f"🚨 HIGH RISK method: {decoded_call.get('label')}")
+                flags.append(make_flag(
+                    "HIGH_RISK_METHOD",
+                    f"🚨 HIGH RISK method: {decoded_call.get('label')}",
+                    method=decoded_call.get("label")
+                ))
             
             # Check parameters specifically for 'deadline' (MEV detection)
             params = decoded_call.get("params", [])
@@ -463,7 +4176,7 @@ async def analyze_transaction(tx_hash: str, chain: str = "eth"):
                     # Very short deadline relative to timestamp might indicate MEV/Flashbots
                     deadline = int(param.get("value", 0))
                     if 0 < deadline < 9999999999: # Simple heuristic
-                        flags.append("⚡ Short deadline (possible MEV)")
+                        flags.append(make_flag("SHORT_DEADLINE", "⚡ Short deadline (possible MEV)", deadline=deadline))
         
         # Timing Analysis
         timing_flags = analyze_timing(tx_data.get("block_timestamp", ""))
@@ -475,47 +4188,41 @@ async def analyze_transaction(tx_hash: str, chain: str = "eth"):
         
         # Calculate Overall Risk Score
         risk_score, risk_factors = calculate_advanced_risk_score(
-            sanctions_hit,
-            mixer_hit,
-            flags,
+            flags + timing_flags,
             entity_labels,
-            complexity_score,
-            timing_flags
+            complexity_score
         )
         
         # Determine Categorical Risk Level
-        if risk_score >= 70:
-            risk_level = "CRITICAL"
-        elif risk_score >= 50:
-            risk_level = "HIGH"
-        elif risk_score >= 30:
-            risk_level = "MEDIUM"
-        else:
-            risk_level = "LOW"
+        risk_level = risk_level_for_score(risk_score)
+        
+        mark_stage("scoring")
         
         # Add 'Safe' indicator if score is low and no flags
         if not flags and risk_score < 30:
-            flags.append("✅ Standard transaction - no suspicious indicators")
+            flags.append(make_flag("STANDARD_TRANSACTION", "✅ Standard transaction - no suspicious indicators"))
         
-        # Construct and return result object
-        return AnalysisResult(
+        # Construct the result object (values are computed here, so validation is skipped)
+        result = AnalysisResult.model_construct(
             tx_hash=tx_hash,
             risk_score=risk_score,
             risk_level=risk_level,
             risk_factors=risk_factors,
-            flags=flags,
-            details=TransactionDetails(
+            flags=[f.message for f in flags],
+            details=TransactionDetails.model_construct(
                 from_address=from_addr,
                 from_label=tx_data.get("from_address_label"),
                 from_entity=tx_data.get("from_address_entity"),
                 to_address=to_addr,
                 to_label=tx_data.get("to_address_label"),
                 to_entity=tx_data.get("to_address_entity"),
-                value=f"{value_eth:.6f} ETH",
-                block_number=tx_data.get("block_number", 0),
+                value=f"{format_units(value_wei, places=6)} {symbol}",
+                value_wei=str(value_wei),
+                value_usd=round(value_usd, 2) if value_usd is not None else None,
+                block_number=int(tx_data.get("block_number") or 0),
                 block_timestamp=tx_data.get("block_timestamp", ""),
                 gas_used=tx_data.get("receipt_gas_used", "0"),
-                gas_price=f"{int(tx_data.get('gas_price', 0)) / 1e9:.2f} Gwei", # Convert Wei to Gwei
+                gas_price=f"{format_units(int(tx_data.get('gas_price', 0)), decimals=9, places=2)} Gwei", # Convert Wei to Gwei
                 transaction_fee=tx_data.get("transaction_fee", "0"),
                 nonce=nonce,
                 decoded_call=decoded_call
@@ -526,46 +4233,120 @@ async def analyze_transaction(tx_hash: str, chain: str = "eth"):
             exchange_interaction=exchange_hit,
             entity_labels=entity_labels,
             complexity_score=complexity_score,
-            timing_flags=timing_flags
+            timing_flags=[f.message for f in timing_flags],
+            flag_codes=flags + timing_flags,
+            circular_flows=circular_flows
         )
         
+        mark_stage("build")
+        
+        await run_db(record_transaction_analysis, result, chain)
+        mark_stage("persist")
+        
+        return result
+        
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Error analyzing transaction: {str(e)}")
 
-@app.get("/api/analyze-address/{address}", response_model=AddressAnalysis)
-async def analyze_address(address: str, chain: str = "eth", limit: int = 25):
+@app.get("/api/analyze-transaction/{tx_hash}", response_model=AnalysisResult)
+async def analyze_transaction(
+    tx_hash: str,
+    chain: str = "eth",
+    fields: Optional[str] = None,
+    if_none_match: Optional[str] = Header(None)
+):
     """
-    Enhanced address analysis with behavioral pattern detection
+    Enhanced transaction analysis with deep event parsing and pattern detection
     
-    - **address**: Wallet address
+    - **tx_hash**: Transaction hash
     - **chain**: Blockchain network (default: eth)
-    - **limit**: Number of transactions to analyze (default: 25)
+    - **fields**: Comma-separated fields to return (e.g. `risk_score,risk_level,details.value`); default all
     
-    Returns comprehensive address profile including:
-    - Transaction velocity and timing patterns
-    - High-risk counterparty detection
-    - Entity label extraction
-    - Behavioral anomaly detection
+    Returns comprehensive risk analysis including:
+    - Event-level analysis (approvals, swaps, transfers)
+    - Entity recognition via Moralis labels
+    - Timing and complexity analysis
     - Multi-factor risk scoring
+    
+    Mined transactions carry a strong ETag over (hash, chain, rule-set version, label-set version,
+    build version, price-table version, fields);
+    a matching `If-None-Match` gets a 304 without any lookup or analysis.
     """
+    return await timed_analysis(
+        "transaction", tx_hash, functools.partial(transaction_analysis_response, tx_hash, chain, fields, if_none_match)
+    )
+
+def record_transaction_analysis(result: AnalysisResult, chain: str):
+    """Keep the result for later querying (persistence is best-effort)"""
+    try:
+        analysis_store.record_transaction(result, chain)
+    except sqlite3.Error:
+        logger.exception("could not persist analysis of %s", result.tx_hash)
+
+async def transaction_analysis_response(tx_hash: str, chain: str, fields: Optional[str], if_none_match: Optional[str]) -> Response:
+    include = parse_fields(fields, AnalysisResult)
+    key = (
+        tx_hash.lower(), chain, risk_rules.current_version(), counterparty_verdicts.current_version(),
+        APP_VERSION, price_table.version
+    )
+    etag = analysis_etag(*key, fields or "")
+    cache_headers = {"ETag": etag, "Cache-Control": f"public, max-age={TX_RESPONSE_MAX_AGE}"}
+    # ETags are only issued for mined transactions, so a match means the body cannot have changed
+    # Cache hits and revalidations were stored when first computed, so they are not recorded again
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=cache_headers)
+    
+    cached = tx_response_cache.get(key)
+    mark_stage("cache")
+    if cached is None:
+        result = await run_transaction_analysis(tx_hash, chain)
+        cached = (result, to_json(result))
+        # Mined transactions never change, so their serialized analysis is reusable until a version changes
+        if result.details.block_number:
+            tx_response_cache.put(key, cached)
+    result, body = cached
+    if include is not None:
+        body = to_json(result, include=include)
+    if not result.details.block_number:
+        cache_headers = {"Cache-Control": "no-store"}
+    return Response(content=body, media_type="application/json", headers=cache_headers)
+
+async def run_address_analysis(address: str, chain: str = "eth", limit: int = 25, trace_hops: int = 0) -> AddressAnalysis:
+    """Analyze an address; the result is assembled from already-checked values without re-validation"""
     try:
-        tx_data = moralis_request(
+        tx_data = await moralis_request_async(
             f"/{address}/verbose",
             params={"chain": chain, "limit": limit, "order": "DESC"}
         )
+        mark_stage("moralis")
         
         transactions = tx_data.get("result", [])
         
         if not transactions:
             raise HTTPException(status_code=404, detail="No transactions found")
         
+        # Decode logs from unverified contracts locally
+        for tx in transactions:
+            decode_missing_events(tx.get("logs", []))
+        mark_stage("decode")
+        
+        # Feed observed transactions into wallet clustering (persistence is best-effort)
+        try:
+            await run_db(
+                cluster_engine.observe,
+                transactions, subject=address, history_complete=len(transactions) < limit and not tx_data.get("cursor")
+            )
+        except sqlite3.Error:
+            pass
+        mark_stage("clustering")
+        
         # Initialize analysis counters and lists
         flags = []
         risk_factors = []
         high_risk_counterparties = []
         mixer_interactions = 0
         large_tx_count = 0
-        total_volume = 0
+        total_volume_wei = 0
         timestamps = []
         
         # Check if target address itself is sanctioned
@@ -573,7 +4354,12 @@ async def analyze_address(address: str, chain: str = "eth", limit: int = 25):
         sanctions_hit = addr_sanctioned
         
         if addr_sanctioned:
-            flags.append(f"🚨 CRITICAL: Address is sanctioned - {addr_reason}")
+            flags.append(make_flag(
+                "SANCTIONED_ADDRESS",
+                f"🚨 CRITICAL: Address is sanctioned - {addr_reason}",
+                address=address,
+                reason=addr_reason
+            ))
             risk_factors.append("Address on sanctions list")
         
         # Determine Label for the Target Address (from own txs)
@@ -586,15 +4372,35 @@ async def analyze_address(address: str, chain: str = "eth", limit: int = 25):
             else:
                 address_label = first_tx.get("to_address_label")
         
+        # Value every transaction at its block time with one vectorized price lookup
+        symbol = native_asset(chain)
+        tx_prices = price_table.usd_prices(
+            symbol, [to_unix_timestamp(tx.get("block_timestamp", "")) for tx in transactions]
+        )
+        total_volume_usd = 0.0
+        priced = True
+        
+        # Wallet-relative baseline (as it was before this page); mature baselines replace fixed value thresholds
+        baseline = None
+        try:
+            baseline = await run_db(baseline_store.load, address, chain)
+        except sqlite3.Error:
+            pass
+        relative = baseline is not None and baseline.mature
+        value_anomalies = 0
+        mark_stage("pricing")
+        
         # Iterate and Analyze Recent Transactions
         recent_txs = []
         entity_interactions = defaultdict(int)
         
-        for tx in transactions:
+        for tx, usd_price in zip(transactions, tx_prices):
             tx_hash = tx.get("hash", "")
             from_addr = tx.get("from_address", "")
             to_addr = tx.get("to_address", "")
-            value = int(tx.get("value", 0)) / 1e18 # ETH value
+            value_wei = int(tx.get("value", 0) or 0)
+            value = wei_to_native(value_wei) # Float view for thresholds and baselines
+            value_usd = value * usd_price if usd_price is not None else None
             timestamp = tx.get("block_timestamp", "")
             
             # Parse timestamp for timing analysis
@@ -604,7 +4410,11 @@ async def analyze_address(address: str, chain: str = "eth", limit: int = 25):
             except:
                 pass
             
-            total_volume += value
+            total_volume_wei += value_wei
+            if value_usd is None:
+                priced = False
+            else:
+                total_volume_usd += value_usd
             
             # Identify Counterparty (the other side of the tx)
             is_outgoing = from_addr.lower() == address.lower()
@@ -622,41 +4432,29 @@ async def analyze_address(address: str, chain: str = "eth", limit: int = 25):
             if cp_entity:
                 entity_interactions[cp_entity] += 1
             
-            # Analyze this specific transaction
-            tx_flags = []
-            tx_risk = 0
+            # Analyze this specific transaction (sanctions, mixer, value)
+            tx_flags = screen_address_transaction(address, tx, value, value_usd, symbol)
             entity_info = None
             
-            # Counterparty Sanctions Check
-            cp_sanctioned, cp_reason = check_sanctions(counterparty)
-            if cp_sanctioned:
-                tx_flags.append(f"Sanctioned: {cp_reason}")
-                high_risk_counterparties.append(counterparty)
-                tx_risk += 70
-            
-            # Counterparty Mixer Check
-            # Check label keywords
-            if cp_label and any(kw in cp_label.lower() for kw in MIXER_KEYWORDS):
-                tx_flags.append("Mixer interaction")
-                mixer_interactions += 1
-                tx_risk += 40
-                entity_info = cp_label
-            # Check entity keywords
-            elif cp_entity and any(kw in cp_entity.lower() for kw in MIXER_KEYWORDS):
-                tx_flags.append("Mixer interaction")
-                mixer_interactions += 1
-                tx_risk += 40
-                entity_info = cp_entity
+            if relative:
+                value_z = baseline.value.zscore(math.log1p(value))
+                # Values this wallet routinely moves are not "large" for it
+                tx_flags = [f for f in tx_flags if f.code not in ("VERY_LARGE_TX", "LARGE_TX")]
+                if value_z >= BASELINE_Z_THRESHOLD:
+                    tx_flags.append(make_flag(
+                        "VALUE_ANOMALY", f"Unusual value for this wallet: {value:.2f} {symbol} (z={value_z:.1f})",
+                        value=value, symbol=symbol, zscore=round(value_z, 2)
+                    ))
+                    value_anomalies += 1
             
-            # Transaction Value Check
-            if value > 50:
-                tx_flags.append(f"Very large: {value:.2f} ETH")
-                large_tx_count += 1
-                tx_risk += 25
-            elif value > 10:
-                tx_flags.append(f"Large: {value:.2f} ETH")
-                large_tx_count += 1
-                tx_risk += 15
+            for flag in tx_flags:
+                if flag.code == "SANCTIONED_COUNTERPARTY":
+                    high_risk_counterparties.append(counterparty)
+                elif flag.code == "MIXER_COUNTERPARTY":
+                    mixer_interactions += 1
+                    entity_info = flag.params.get("label") or flag.params.get("entity")
+                elif flag.code in ("VERY_LARGE_TX", "LARGE_TX"):
+                    large_tx_count += 1
             
             # Set display info for entity
             if cp_entity and not entity_info:
@@ -664,8 +4462,11 @@ async def analyze_address(address: str, chain: str = "eth", limit: int = 25):
             elif cp_label and not entity_info:
                 entity_info = cp_label
             
+            # Score this transaction with the per-transaction ruleset
+            tx_risk, _ = risk_rules.evaluate("address_transaction", tx_flags)
+            
             if not tx_flags:
-                tx_flags.append("Standard")
+                tx_flags.append(make_flag("STANDARD", "Standard"))
             
             # Determine transaction direction
             direction = "outgoing" if is_outgoing else "incoming"
@@ -685,49 +4486,201 @@ async def analyze_address(address: str, chain: str = "eth", limit: int = 25):
                 category = "contract"
             
             # Add to list of analyzed transactions
-            recent_txs.append(AddressTransaction(
+            recent_txs.append(AddressTransaction.model_construct(
                 hash=tx_hash,
                 block_timestamp=timestamp,
                 from_address=from_addr,
                 to_address=to_addr,
-                value=f"{value:.4f} ETH",
-                risk_score=min(100, tx_risk),
-                flags=tx_flags,
+                value=f"{format_units(value_wei)} {symbol}",
+                value_wei=str(value_wei),
+                risk_score=tx_risk,
+                flags=[f.message for f in tx_flags],
+                flag_codes=[f.code for f in tx_flags],
                 entity_interaction=entity_info,
                 direction=direction,
                 category=category
             ))
         
+        mark_stage("screening")
+        
         # Time-Based Pattern Analysis (Bursts, Late Night)
         time_patterns = analyze_time_patterns(timestamps)
         
+        # Round trips (funds returning from the same counterparty within the window)
+        circular_flows = detect_round_trips(address, transactions)
+        if circular_flows:
+            flags.append(make_flag(
+                "CIRCULAR_FLOW",
+                f"🔁 Circular flow: {len(circular_flows)} round trip(s) within {CIRCULAR_FLOW_WINDOW_HOURS:g}h",
+                scope="address_history",
+                count=len(circular_flows),
+                window_hours=CIRCULAR_FLOW_WINDOW_HOURS
+            ))
+            risk_factors.append("Round-trip fund flows")
+        mark_stage("patterns")
+        
+        # Multi-hop exposure (sanctioned/mixer nodes reachable beyond direct counterparties)
+        if trace_hops > 0:
+            hops = min(trace_hops, TRACE_MAX_HOPS)
+            trace = await trace_counterparty_graph(address, chain, max_hops=hops)
+            indirect_paths = [p for p in trace.paths if p.hops > 1]
+            if indirect_paths:
+                flags.append(make_flag(
+                    "INDIRECT_EXPOSURE",
+                    f"🕸️ Indirect exposure: {len(indirect_paths)} sanctioned/mixer node(s) within {hops} hops",
+                    count=len(indirect_paths),
+                    hops=hops
+                ))
+                risk_factors.append("Indirect sanctioned/mixer exposure")
+                high_risk_counterparties.extend(p.target for p in indirect_paths)
+            mark_stage("trace")
+        
+        # Precomputed exposure: share of this page's inflows that trace back to sanctioned/mixer sources.
+        # Numerator and denominator both come from the same incoming transfers; the lifetime totals are
+        # only reported as amounts, never divided by a window they were not measured over.
+        exposure = None
+        window_taint = (0, 0)
+        incoming = [
+            tx for tx in transactions
+            if (tx.get("to_address") or "").lower() == address.lower() and int(tx.get("value", 0) or 0) > 0
+        ]
+        inflow_wei = sum(int(tx.get("value", 0) or 0) for tx in incoming)
+        try:
+            exposure = await run_db(exposure_index.lookup, address, chain)
+            if exposure and incoming:
+                window_taint = await run_db(
+                    exposure_index.transfer_taint, address, chain, [tx.get("hash", "") for tx in incoming]
+                )
+        except sqlite3.Error:
+            pass
+        if exposure and not any(f.code == "INDIRECT_EXPOSURE" for f in flags):
+            sanctioned_wei, mixer_wei, nearest_hops = exposure
+            sanctioned_pct = window_taint[0] / inflow_wei * 100 if inflow_wei else None
+            mixer_pct = window_taint[1] / inflow_wei * 100 if inflow_wei else None
+            if inflow_wei:
+                parts = [
+                    f"{pct:.1f}% of inflows trace to {target}"
+                    for pct, target in ((sanctioned_pct, "OFAC-listed entities"), (mixer_pct, "mixers")) if pct
+                ]
+                exposed = sanctioned_pct + mixer_pct >= EXPOSURE_MIN_PCT
+            else:
+                # No inflows on this page to relate the taint to: report the lifetime amounts
+                parts = [
+                    f"{format_units(amount)} {symbol} traces to {target}"
+                    for amount, target in ((sanctioned_wei, "OFAC-listed entities"), (mixer_wei, "mixers")) if amount
+                ]
+                exposed = bool(parts)
+            if exposed:
+                flags.append(make_flag(
+                    "INDIRECT_EXPOSURE",
+                    f"🕸️ Indirect exposure: {' and '.join(parts)} within {EXPOSURE_MAX_HOPS} hops",
+                    category="sanctioned" if (window_taint[0] if inflow_wei else sanctioned_wei) else "mixer",
+                    sanctioned_pct=sanctioned_pct,
+                    mixer_pct=mixer_pct,
+                    nearest_hops=nearest_hops,
+                    precomputed=True
+                ))
+                risk_factors.append("Indirect sanctioned/mixer exposure")
+        mark_stage("exposure")
+        
+        # Deviations from the wallet's own history
+        if relative:
+            if value_anomalies:
+                flags.append(make_flag(
+                    "VALUE_ANOMALIES",
+                    f"📈 {value_anomalies} transaction(s) far above this wallet's usual value",
+                    count=value_anomalies
+                ))
+                risk_factors.append("Values unusual for this wallet")
+            
+            ordered = sorted(t for t in (to_unix_timestamp(tx.get("block_timestamp", "")) for tx in transactions) if t is not None)
+            gaps = [math.log1p(b - a) for a, b in zip(ordered, ordered[1:])]
+            if gaps and baseline.gap.n >= BASELINE_MIN_SAMPLES:
+                gap_z = baseline.gap.zscore(sum(gaps) / len(gaps)) * math.sqrt(len(gaps))
+                if gap_z <= -BASELINE_Z_THRESHOLD:
+                    flags.append(make_flag(
+                        "VELOCITY_ANOMALY",
+                        "⚡ Transacting much faster than this wallet's usual pace",
+                        zscore=round(gap_z, 2)
+                    ))
+                    risk_factors.append("Velocity unusual for this wallet")
+            
+            page_counterparties = [BaselineStore.counterparty(address.lower(), tx) for tx in transactions]
+            try:
+                seen = await run_db(baseline_store.seen_counterparties, address, chain, set(page_counterparties))
+                churn = sum(1 for cp in page_counterparties if cp not in seen) / len(page_counterparties)
+                p = baseline.churn.mean
+                churn_se = math.sqrt(max(p * (1 - p), 0.01) / len(page_counterparties))
+                if (churn - p) / churn_se >= BASELINE_Z_THRESHOLD:
+                    flags.append(make_flag(
+                        "COUNTERPARTY_CHURN",
+                        f"🔀 {churn:.0%} new counterparties (usually {p:.0%})",
+                        churn=round(churn, 3),
+                        baseline=round(p, 3)
+                    ))
+                    risk_factors.append("Counterparty churn unusual for this wallet")
+            except sqlite3.Error:
+                pass
+        
         # Generate Address-Level Aggregate Flags
         if mixer_interactions > 0:
-            flags.append(f"🔄 Mixer interactions: {mixer_interactions} transaction(s)")
+            flags.append(make_flag(
+                "MIXER_INTERACTIONS",
+                f"🔄 Mixer interactions: {mixer_interactions} transaction(s)",
+                count=mixer_interactions
+            ))
             risk_factors.append("Multiple mixer interactions")
         
         if large_tx_count > 3:
-            flags.append(f"💰 Multiple large transactions: {large_tx_count} txs > 10 ETH")
+            flags.append(make_flag(
+                "MULTIPLE_LARGE_TX",
+                f"💰 Multiple large transactions: {large_tx_count} txs > "
+                + (f"${LARGE_TX_USD:,}" if priced else f"{LARGE_TX_NATIVE} {symbol}"),
+                count=large_tx_count
+            ))
             risk_factors.append("High-value transaction pattern")
         
         if time_patterns.burst_detected:
-            flags.append(f"⚡ Burst activity detected: {time_patterns.time_details}")
+            flags.append(make_flag(
+                "BURST_ACTIVITY",
+                f"⚡ Burst activity detected: {time_patterns.time_details}",
+                tx_per_hour=time_patterns.tx_per_hour
+            ))
             risk_factors.append("Burst transaction pattern")
         
         if time_patterns.suspicious_timing:
-            flags.append("🌙 Unusual timing patterns detected")
+            flags.append(make_flag("UNUSUAL_TIMING", "🌙 Unusual timing patterns detected"))
             risk_factors.append("Off-hours activity")
         
         if high_risk_counterparties:
             unique_risk = len(set(high_risk_counterparties))
-            flags.append(f"🚨 High-risk counterparties: {unique_risk} address(es)")
+            flags.append(make_flag(
+                "HIGH_RISK_COUNTERPARTIES",
+                f"🚨 High-risk counterparties: {unique_risk} address(es)",
+                count=unique_risk
+            ))
             risk_factors.append("Sanctioned counterparties")
         
-        if total_volume > 500:
-            flags.append(f"📊 Very high volume: {total_volume:.2f} ETH")
+        total_volume = wei_to_native(total_volume_wei)
+        volume_tier = value_tier(
+            total_volume, total_volume_usd if priced else None,
+            (HIGH_VOLUME_NATIVE, VERY_HIGH_VOLUME_NATIVE), (HIGH_VOLUME_USD, VERY_HIGH_VOLUME_USD)
+        )
+        if relative and not value_anomalies:
+            volume_tier = 0  # High volume made of values typical for this wallet is its normal business
+        if volume_tier == 2:
+            flags.append(make_flag(
+                "VERY_HIGH_VOLUME",
+                f"📊 Very high volume: {total_volume:.2f} {symbol}",
+                volume=total_volume,
+                symbol=symbol
+            ))
             risk_factors.append("Extremely high transaction volume")
-        elif total_volume > 100:
-            flags.append(f"📊 High volume: {total_volume:.2f} ETH")
+        elif volume_tier == 1:
+            flags.append(make_flag(
+                "HIGH_VOLUME", f"📊 High volume: {total_volume:.2f} {symbol}",
+                volume=total_volume, symbol=symbol
+            ))
         
         # Entity Interaction Summary
         entity_labels = []
@@ -744,15 +4697,9 @@ async def analyze_address(address: str, chain: str = "eth", limit: int = 25):
         exchange_txs = [tx for tx in recent_txs if tx.category == "exchange"]
         nft_txs = [tx for tx in recent_txs if tx.category == "nft"]
         
-        # Calculate totals (parse ETH values)
-        def parse_eth_value(value_str):
-            try:
-                return float(value_str.replace(" ETH", ""))
-            except:
-                return 0.0
-        
-        incoming_total = sum(parse_eth_value(tx.value) for tx in incoming_txs)
-        outgoing_total = sum(parse_eth_value(tx.value) for tx in outgoing_txs)
+        # Exact directional totals in wei
+        incoming_total_wei = sum(int(tx.value_wei) for tx in incoming_txs)
+        outgoing_total_wei = sum(int(tx.value_wei) for tx in outgoing_txs)
         
         # Get unique exchange and NFT platforms
         exchange_platforms = list(set(tx.entity_interaction for tx in exchange_txs if tx.entity_interaction))
@@ -761,66 +4708,230 @@ async def analyze_address(address: str, chain: str = "eth", limit: int = 25):
         # Behavioral Summary Dict
         behavior_summary = {
             "total_volume_eth": round(total_volume, 4),
-            "avg_tx_value_eth": round(total_volume / len(transactions), 4) if transactions else 0,
+            "total_volume_wei": str(total_volume_wei),
+            "incoming_total_wei": str(incoming_total_wei),
+            "outgoing_total_wei": str(outgoing_total_wei),
+            "total_volume_usd": round(total_volume_usd, 2) if priced else None,
+            "avg_tx_value_eth": round(wei_to_native(total_volume_wei // len(transactions)), 4) if transactions else 0,
             "large_tx_count": large_tx_count,
             "mixer_interaction_count": mixer_interactions,
             "unique_counterparties": len(set(
                 [tx.to_address for tx in recent_txs] + [tx.from_address for tx in recent_txs]
             )),
             "top_entities": dict(list(entity_interactions.items())[:5]),
-            "analysis_period_days": (timestamps[0] - timestamps[-1]).days if len(timestamps) > 1 else 0
+            "analysis_period_days": (timestamps[0] - timestamps[-1]).days if len(timestamps) > 1 else 0,
+            "baseline_transactions": baseline.value.n if baseline else 0,
+            "indirect_exposure": {
+                "sanctioned_amount": wei_to_native(exposure[0]),
+                "mixer_amount": wei_to_native(exposure[1]),
+                "window_sanctioned_wei": str(window_taint[0]),
+                "window_mixer_wei": str(window_taint[1]),
+                "window_inflow_wei": str(inflow_wei),
+                "nearest_hops": exposure[2]
+            } if exposure else None
         }
         
         # Calculate Final Risk Score
+        # (burst behavior adds a small penalty through the BURST_ACTIVITY rule)
         risk_score, _ = calculate_advanced_risk_score(
-            sanctions_hit,
-            mixer_interactions > 0,
             flags,
             entity_labels,
-            min(len(transactions) * 2, 50),  # Use tx frequency as proxy for complexity
-            [f for f in flags if "timing" in f.lower() or "late" in f.lower()]
+            min(len(transactions) * 2, 50)  # Use tx frequency as proxy for complexity
         )
         
-        # Small penalty for burst behavior
-        if time_patterns.burst_detected:
-            risk_score = min(100, risk_score + 15)
-        
         # Determine Risk Level
-        if risk_score >= 70:
-            risk_level = "CRITICAL"
-        elif risk_score >= 50:
-            risk_level = "HIGH"
-        elif risk_score >= 30:
-            risk_level = "MEDIUM"
-        else:
-            risk_level = "LOW"
+        risk_level = risk_level_for_score(risk_score)
         
         if not flags:
-            flags.append("✅ No suspicious patterns detected")
+            flags.append(make_flag("NO_SUSPICIOUS_PATTERNS", "✅ No suspicious patterns detected"))
         
-        # Return complete analysis
-        return AddressAnalysis(
+        # Build complete analysis (values are computed here, so validation is skipped)
+        result = AddressAnalysis.model_construct(
             address=address,
             address_label=address_label,
             total_transactions=len(transactions),
             risk_score=risk_score,
             risk_level=risk_level,
             risk_factors=risk_factors,
-            flags=flags,
+            flags=[f.message for f in flags],
             entity_labels=entity_labels,
             recent_transactions=recent_txs,
             high_risk_counterparties=list(set(high_risk_counterparties)),
             sanctions_check=sanctions_hit,
             mixer_interaction=mixer_interactions > 0,
             time_patterns=time_patterns,
-            behavior_summary=behavior_summary
+            behavior_summary=behavior_summary,
+            flag_codes=flags,
+            circular_flows=circular_flows
         )
+        mark_stage("scoring")
+        
+        # Keep the result for later querying and fold new transactions into the baseline (best-effort)
+        # Each write is independent, so a failure in one never skips the other
+        try:
+            await run_db(analysis_store.record_address, result, chain)
+        except sqlite3.Error:
+            logger.exception("could not persist analysis of %s on %s", address, chain)
+        try:
+            await run_db(baseline_store.observe, address, chain, transactions)
+        except sqlite3.Error:
+            logger.exception("could not update baseline of %s on %s", address, chain)
+        mark_stage("persist")
+        
+        return result
         
     except HTTPException:
         raise
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Error analyzing address: {str(e)}")
 
+@app.get("/api/analyze-address/{address}", response_model=AddressAnalysis)
+async def analyze_address(
+    address: str,
+    chain: str = "eth",
+    limit: int = 25,
+    trace_hops: int = 0,
+    fields: Optional[str] = None,
+    tx_limit: Optional[int] = Query(None, ge=1, le=1000),
+    tx_cursor: Optional[str] = None
+):
+    """
+    Enhanced address analysis with behavioral pattern detection
+    
+    - **address**: Wallet address
+    - **chain**: Blockchain network (default: eth)
+    - **limit**: Number of transactions to analyze (default: 25)
+    - **trace_hops**: Also trace sanctioned/mixer exposure up to N hops away (default: 0, direct only)
+    - **fields**: Comma-separated fields to return (e.g. `risk_score,risk_level,recent_transactions.hash`); default all
+    - **tx_limit** / **tx_cursor**: Page through `recent_transactions`; pass `next_transactions_cursor` back as `tx_cursor`
+    
+    Returns comprehensive address profile including:
+    - Transaction velocity and timing patterns
+    - High-risk counterparty detection
+    - Entity label extraction
+    - Behavioral anomaly detection
+    - Multi-factor risk scoring
+    """
+    return await timed_analysis("address", address, functools.partial(
+        address_analysis_response, address, chain, limit, trace_hops, fields, tx_limit, tx_cursor
+    ))
+
+async def address_analysis_response(
+    address: str,
+    chain: str,
+    limit: int,
+    trace_hops: int,
+    fields: Optional[str],
+    tx_limit: Optional[int],
+    tx_cursor: Optional[str]
+) -> Response:
+    include = parse_fields(fields, AddressAnalysis)
+    result = await run_address_analysis(address, chain, limit, trace_hops)
+    
+    if (tx_limit or tx_cursor) and (include is None or "recent_transactions" in include):
+        transactions = result.recent_transactions
+        start = 0
+        if tx_cursor:
+            try:
+                after = json.loads(base64.urlsafe_b64decode(tx_cursor.encode()))
+            except ValueError:
+                raise HTTPException(status_code=400, detail="Invalid tx_cursor")
+            # Anything but [block_timestamp, hash] would fail the comparison below with a TypeError
+            if not isinstance(after, list) or len(after) != 2 or not all(isinstance(item, str) for item in after):
+                raise HTTPException(status_code=400, detail="Invalid tx_cursor")
+            # Resume right after the cursor's transaction; if it fell out of the window, after its position (newest first)
+            start = next((i + 1 for i, tx in enumerate(transactions) if tx.hash == after[1]), None)
+            if start is None:
+                start = next(
+                    (i for i, tx in enumerate(transactions) if [tx.block_timestamp, tx.hash] < after),
+                    len(transactions)
+                )
+        end = start + tx_limit if tx_limit else len(transactions)
+        page = transactions[start:end]
+        next_cursor = None
+        if end < len(transactions) and page:
+            next_cursor = base64.urlsafe_b64encode(json.dumps([page[-1].block_timestamp, page[-1].hash]).encode()).decode()
+        result = result.model_copy(update={"recent_transactions": page, "next_transactions_cursor": next_cursor})
+        if include is not None:
+            include["next_transactions_cursor"] = True
+    
+    return json_response(result, include)
+
+MULTICHAIN_DEFAULT_CHAINS = "eth,polygon,bsc,arbitrum,base"
+
+@app.get("/api/analyze-address/{address}/multichain", response_model=MultiChainAddressAnalysis)
+async def analyze_address_multichain(address: str, chains: str = MULTICHAIN_DEFAULT_CHAINS, limit: int = 25):
+    """
+    Address analysis across several chains at once
+    
+    - **address**: Wallet address
+    - **chains**: Comma-separated chains (default: eth,polygon,bsc,arbitrum,base)
+    - **limit**: Number of transactions to analyze per chain (default: 25)
+    
+    Every chain is analyzed concurrently, so latency is that of the slowest chain. Returns the
+    per-chain profiles plus a merged profile scored over the union of every chain's flags.
+    """
+    chain_list = list(dict.fromkeys(c.strip().lower() for c in chains.split(",") if c.strip()))
+    if not chain_list:
+        raise HTTPException(status_code=400, detail="At least one chain is required")
+    
+    started = time.perf_counter()
+    
+    async def run_chain(chain: str) -> ChainBreakdown:
+        chain_started = time.perf_counter()
+        try:
+            analysis = await run_address_analysis(address, chain=chain, limit=limit)
+            status, error = "ok", None
+        except HTTPException as e:
+            analysis = None
+            status = "no_activity" if e.status_code == 404 else "error"
+            error = str(e.detail)
+        return ChainBreakdown(
+            chain=chain,
+            status=status,
+            error=error,
+            elapsed_seconds=round(time.perf_counter() - chain_started, 3),
+            analysis=analysis
+        )
+    
+    breakdowns = await asyncio.gather(*(run_chain(chain) for chain in chain_list))
+    
+    # Merge the chain profiles
+    merged_flags: List[RiskFlag] = []
+    flags, risk_factors, entity_labels = [], [], []
+    counterparties = set()
+    for breakdown in breakdowns:
+        analysis = breakdown.analysis
+        if analysis is None:
+            continue
+        merged_flags.extend(analysis.flag_codes)
+        flags.extend(f"[{breakdown.chain}] {flag}" for flag in analysis.flags)
+        risk_factors.extend(f for f in analysis.risk_factors if f not in risk_factors)
+        entity_labels.extend(analysis.entity_labels)
+        counterparties.update(analysis.high_risk_counterparties)
+    
+    analyses = [b.analysis for b in breakdowns if b.analysis is not None]
+    # The merged score never drops below the riskiest single chain
+    unified_score, _ = calculate_advanced_risk_score(merged_flags, entity_labels, 0)
+    unified_score = max([unified_score] + [a.risk_score for a in analyses])
+    
+    return json_response(MultiChainAddressAnalysis.model_construct(
+        address=address,
+        chains=chain_list,
+        active_chains=[b.chain for b in breakdowns if b.analysis is not None],
+        total_transactions=sum(a.total_transactions for a in analyses),
+        risk_score=unified_score,
+        risk_level=risk_level_for_score(unified_score),
+        risk_factors=risk_factors,
+        flags=flags,
+        flag_codes=merged_flags,
+        high_risk_counterparties=sorted(counterparties),
+        sanctions_check=any(a.sanctions_check for a in analyses),
+        mixer_interaction=any(a.mixer_interaction for a in analyses),
+        elapsed_seconds=round(time.perf_counter() - started, 3),
+        per_chain={b.chain: b for b in breakdowns}
+    ))
+
 def analyze_time_patterns(timestamps: List[datetime]) -> TimePattern:
     """Analyze temporal patterns in transaction history (e.g., density, timing)"""
     if len(timestamps) < 2:
@@ -861,6 +4972,395 @@ def analyze_time_patterns(timestamps: List[datetime]) -> TimePattern:
         time_details=details
     )
 
+@app.get("/api/transaction-flow/{tx_hash}", response_model=TransactionFlowGraph)
+async def transaction_flow(tx_hash: str, chain: str = "eth"):
+    """
+    Directed multi-token flow graph of a transaction
+    
+    - **tx_hash**: Transaction hash
+    - **chain**: Blockchain network (default: eth)
+    
+    Returns every token movement (all Transfer, Deposit and Withdrawal logs plus the native value)
+    aggregated per (source, target, token) edge, with exact inflow/outflow/net per address and token.
+    """
+    try:
+        tx_data = await moralis_request_async(
+            f"/transaction/{tx_hash}/verbose",
+            params={"chain": chain}
+        )
+        
+        decode_missing_events(tx_data.get("logs", []))
+        edges, balances, swap_counts, transfer_count = build_token_flow_graph(tx_data)
+        
+        # Labels known from the transaction itself or the static lists
+        known_labels = {}
+        for side in ("from", "to"):
+            addr = (tx_data.get(f"{side}_address") or "").lower()
+            label = tx_data.get(f"{side}_address_label") or tx_data.get(f"{side}_address_entity")
+            if addr and label:
+                known_labels[addr] = label
+        
+        nodes = []
+        for addr in list(balances) + [a for a in swap_counts if a not in balances]:
+            token_totals = balances.get(addr, {})
+            nodes.append(FlowNode(
+                address=addr,
+                label=known_labels.get(addr) or KNOWN_EXCHANGES.get(addr) or MIXER_ADDRESSES.get(addr),
+                swap_count=swap_counts.get(addr, 0),
+                balances=[
+                    FlowBalance(
+                        token=token,
+                        inflow=str(inflow),
+                        outflow=str(outflow),
+                        net=str(inflow - outflow)
+                    )
+                    for token, (inflow, outflow) in token_totals.items()
+                ]
+            ))
+        
+        flow_edges = [
+            FlowEdge(
+                source=source,
+                target=target,
+                token=token,
+                amount=str(amount),
+                transfer_count=count,
+                first_log_index=log_index,
+                kind=kind,
+                token_ids=token_ids
+            )
+            for (source, target, token), (amount, count, log_index, kind, token_ids) in edges.items()
+        ]
+        flow_edges.sort(key=lambda e: -1 if e.first_log_index is None else int(e.first_log_index))
+        
+        return TransactionFlowGraph(
+            tx_hash=tx_hash,
+            chain=chain,
+            log_count=len(tx_data.get("logs", [])),
+            transfer_count=transfer_count,
+            tokens=sorted({token for (_, _, token) in edges}),
+            nodes=nodes,
+            edges=flow_edges
+        )
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Error building transaction flow: {str(e)}")
+
+@app.get("/api/trace/{address}", response_model=TraceResult)
+async def trace_address(
+    address: str,
+    chain: str = "eth",
+    max_hops: int = 3,
+    direction: str = "both",
+    min_value_eth: float = 0.0,
+    max_age_days: Optional[int] = None,
+    max_requests: int = Query(TRACE_DEFAULT_BUDGET, ge=1, le=TRACE_MAX_BUDGET)
+):
+    """
+    Multi-hop taint tracing over the counterparty graph
+    
+    - **address**: Wallet address to trace from
+    - **chain**: Blockchain network (default: eth)
+    - **max_hops**: Maximum hops to walk (1-5, default: 3)
+    - **direction**: "incoming" (source of funds), "outgoing" (destination of funds) or "both"
+    - **min_value_eth**: Ignore transfers below this value
+    - **max_age_days**: Ignore transfers older than this many days
+    - **max_requests**: Upstream request budget for the whole trace (at most TRACE_MAX_REQUEST_BUDGET)
+    
+    Returns the shortest path to every sanctioned or mixer node reached.
+    """
+    if direction not in ("incoming", "outgoing", "both"):
+        raise HTTPException(status_code=400, detail="direction must be 'incoming', 'outgoing' or 'both'")
+    if not 1 <= max_hops <= TRACE_MAX_HOPS:
+        raise HTTPException(status_code=400, detail=f"max_hops must be between 1 and {TRACE_MAX_HOPS}")
+    
+    try:
+        return await trace_counterparty_graph(
+            address,
+            chain,
+            max_hops=max_hops,
+            direction=direction,
+            min_value_eth=min_value_eth,
+            max_age_days=max_age_days,
+            max_requests=max_requests
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Error tracing address: {str(e)}")
+
+@app.get("/api/clusters/{address}", response_model=WalletCluster)
+async def get_wallet_cluster(address: str, chain: str = "eth", refresh: bool = False, max_links: int = 1000):
+    """
+    Wallet cluster (common-ownership group) containing an address
+    
+    - **address**: Wallet address
+    - **chain**: Blockchain network used when refreshing (default: eth)
+    - **refresh**: Fetch the address history and apply clustering heuristics before reading
+    - **max_links**: Maximum number of evidence links returned
+    
+    Clusters are built from shared deposit addresses, shared funding sources and gas-payer
+    relationships observed in analyzed transactions, and read back from persisted state.
+    """
+    try:
+        if refresh:
+            tx_data = await moralis_request_async(
+                f"/{address}/verbose",
+                params={"chain": chain, "limit": 100, "order": "DESC"}
+            )
+            transactions = tx_data.get("result", [])
+            await run_db(
+                cluster_engine.observe,
+                transactions, subject=address, history_complete=len(transactions) < 100 and not tx_data.get("cursor")
+            )
+        return await run_db(cluster_engine.get_cluster, address, max_links=max_links)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Error loading wallet cluster: {str(e)}")
+
+@app.get("/api/history/{key}", response_model=List[StoredAnalysis])
+async def analysis_history(key: str, limit: int = 20, include_result: bool = True):
+    """
+    Stored results of earlier analyses, newest first
+    
+    A transaction appears once per rule-set and label-set version it was analysed under.
+    
+    - **key**: Transaction hash, or an address (matches every analysis that touched it)
+    - **limit**: Maximum number of analyses returned (default: 20)
+    - **include_result**: Include the full stored response of each analysis
+    
+    Served from the local store without any upstream calls.
+    """
+    try:
+        return await run_db(analysis_store.history, key, min(limit, 500), include_result)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Error loading analysis history: {str(e)}")
+
+@app.get("/api/search", response_model=AnalysisSearchResult)
+async def search_analyses(
+    risk_level: Optional[str] = None,
+    flag: Optional[str] = None,
+    entity: Optional[str] = None,
+    address: Optional[str] = None,
+    chain: Optional[str] = None,
+    kind: Optional[str] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    min_value_usd: Optional[float] = None,
+    max_value_usd: Optional[float] = None,
+    sort: str = "block_time",
+    order: str = "desc",
+    cursor: Optional[str] = None,
+    limit: int = 50,
+    include_result: bool = False
+):
+    """
+    Search stored analyses
+    
+    - **risk_level**: Comma-separated levels (e.g. CRITICAL,HIGH)
+    - **flag**: Comma-separated flag codes; matches analyses with any of them (e.g. MIXER_DETECTED)
+    - **entity**: Entity/label words; every word must match (e.g. "tornado")
+    - **address**: Analyses touching this address
+    - **chain** / **kind**: Exact match; kind is "transaction" or "address"
+    - **since** / **until**: Block time range (ISO 8601)
+    - **min_value_usd** / **max_value_usd**: USD value range
+    - **sort**: block_time (default), risk_score, value_usd or analyzed_at; rows without the sort value are skipped
+    - **order**: desc (default) or asc
+    - **cursor**: `next_cursor` from the previous page
+    
+    Example: `/api/search?risk_level=CRITICAL&kind=transaction&entity=tornado&since=2024-05-01`
+    """
+    if sort not in AnalysisStore.SORT_COLUMNS:
+        raise HTTPException(status_code=400, detail=f"sort must be one of: {', '.join(AnalysisStore.SORT_COLUMNS)}")
+    if order not in ("asc", "desc"):
+        raise HTTPException(status_code=400, detail="order must be asc or desc")
+    
+    def split(value: Optional[str]) -> List[str]:
+        return [v.strip() for v in (value or "").split(",") if v.strip()]
+    
+    def unix(value: Optional[datetime]) -> Optional[int]:
+        if value is None:
+            return None
+        return int((value if value.tzinfo else value.replace(tzinfo=timezone.utc)).timestamp())
+    
+    started = time.perf_counter()
+    try:
+        items, next_cursor = await run_db(
+            analysis_store.search,
+            risk_levels=[level.upper() for level in split(risk_level)],
+            flag_codes=[code.upper() for code in split(flag)],
+            entity=entity,
+            address=address,
+            chain=chain,
+            kind=kind,
+            since=unix(since),
+            until=unix(until),
+            min_value_usd=min_value_usd,
+            max_value_usd=max_value_usd,
+            sort=sort,
+            descending=order == "desc",
+            cursor=cursor,
+            limit=max(1, min(limit, 500)),
+            include_result=include_result
+        )
+    except (ValueError, TypeError) as e:
+        raise HTTPException(status_code=400, detail=f"Invalid search parameters: {str(e)}")
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Error searching analyses: {str(e)}")
+    return AnalysisSearchResult(
+        items=items,
+        next_cursor=next_cursor,
+        elapsed_ms=round((time.perf_counter() - started) * 1000, 2)
+    )
+
+@app.get("/api/exposure/{address}", response_model=ExposureSummary)
+async def get_exposure(address: str, chain: str = "eth"):
+    """
+    Precomputed indirect exposure of an address
+    
+    Lists every sanctioned/mixer source whose funds reached the address within
+    EXPOSURE_MAX_HOPS hops, with the decayed amount received from each. Read from the index
+    maintained by the background job; no upstream calls are made.
+    """
+    try:
+        return await run_db(exposure_index.summary, address, chain)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Error loading exposure: {str(e)}")
+
+@app.post("/api/exposure/rebuild")
+async def rebuild_exposure(chain: str = "eth", x_admin_token: Optional[str] = Header(None)):
+    """
+    Rebuild a chain's exposure index now instead of waiting for the next scheduled run
+    
+    Requires the `X-Admin-Token` header. One rebuild per chain runs at a time.
+    """
+    require_admin(x_admin_token)
+    if chain in exposure_index.rebuilding:
+        raise HTTPException(status_code=409, detail=f"An exposure rebuild for {chain} is already running")
+    try:
+        started = time.perf_counter()
+        exposed = await exposure_index.rebuild(chain)
+        return {"chain": chain, "exposed_addresses": exposed, "elapsed_seconds": round(time.perf_counter() - started, 3)}
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Error rebuilding exposure index: {str(e)}")
+
+@app.get("/api/baseline/{address}", response_model=AddressBaselineStats)
+async def get_address_baseline(address: str, chain: str = "eth"):
+    """
+    Rolling behavioral baseline of an address
+    
+    Built incrementally from every analysis and watchlist poll of the address; once it has
+    BASELINE_MIN_SAMPLES transactions, value, velocity and counterparty-churn anomalies are flagged
+    relative to it instead of fixed thresholds.
+    """
+    stats = await run_db(baseline_store.stats, address, chain)
+    if stats is None:
+        raise HTTPException(status_code=404, detail="No baseline for this address yet")
+    return stats
+
+@app.get("/api/heatmap/{address}", response_model=ActivityHeatmap)
+async def get_activity_heatmap(address: str, chain: str = "eth"):
+    """
+    Hour-of-day x day-of-week activity heatmap of an address
+    
+    Counts and native value sums per UTC cell, maintained incrementally from every analysis
+    and watchlist poll of the address, plus the inferred UTC offset of its owner.
+    """
+    try:
+        return await run_db(baseline_store.heatmap, address, chain)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Error loading heatmap: {str(e)}")
+
+@app.post("/api/watchlist", response_model=WatchlistStatus)
+async def add_to_watchlist(request: WatchlistAddRequest):
+    """
+    Add addresses to the watchlist
+    
+    Addresses already on the watchlist for the chain are left unchanged. Each new address is
+    polled promptly once to record its current position; only later transactions are screened.
+    """
+    try:
+        await run_db(watchlist_monitor.add, request.addresses, request.chain, request.priority)
+        return await run_db(watchlist_monitor.status)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Error updating watchlist: {str(e)}")
+
+@app.delete("/api/watchlist/{address}")
+async def remove_from_watchlist(address: str, chain: str = "eth"):
+    """Stop watching an address (its alerts are kept)"""
+    if not await run_db(watchlist_monitor.remove, address, chain):
+        raise HTTPException(status_code=404, detail="Address is not on the watchlist")
+    return {"address": address, "chain": chain, "removed": True}
+
+@app.get("/api/watchlist", response_model=List[WatchlistEntry])
+async def list_watchlist(limit: int = 100, offset: int = 0):
+    """Watched addresses, riskiest first"""
+    return await run_db(watchlist_monitor.entries, limit, offset)
+
+@app.get("/api/watchlist/status", response_model=WatchlistStatus)
+async def watchlist_status():
+    """Scheduler state and counters"""
+    return await run_db(watchlist_monitor.status)
+
+@app.get("/api/watchlist/alerts", response_model=List[WatchlistAlert])
+async def watchlist_alerts(after_id: int = 0, limit: int = 100):
+    """
+    Local alert queue
+    
+    - **after_id**: Return alerts with a larger id (pass the last id processed)
+    - **limit**: Maximum number of alerts returned
+    """
+    return await run_db(watchlist_monitor.pending_alerts, after_id, limit)
+
+@app.post("/api/block-scan", response_model=BlockScanStatus)
+async def start_block_scan(request: BlockScanRequest):
+    """
+    Screen every transaction in a block range against the sanctions and mixer lists
+    
+    Runs in the background; poll **GET** `/api/block-scan/{scan_id}` for progress and hits.
+    Transaction senders/recipients, log emitters and addresses in indexed topics or decoded
+    log parameters are all checked.
+    """
+    if request.to_block < request.from_block or request.from_block < 0:
+        raise HTTPException(status_code=400, detail="Invalid block range")
+    if request.to_block - request.from_block + 1 > BLOCK_SCAN_MAX_BLOCKS:
+        raise HTTPException(status_code=400, detail=f"Block range exceeds {BLOCK_SCAN_MAX_BLOCKS} blocks")
+    try:
+        scan_id = await run_db(block_scanner.create, request.chain, request.from_block, request.to_block)
+        await block_scanner.start(scan_id)
+        return await run_db(block_scanner.status, scan_id, hits_limit=0)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Error starting block scan: {str(e)}")
+
+@app.get("/api/block-scan/{scan_id}", response_model=BlockScanStatus)
+async def get_block_scan(scan_id: int, hits_limit: int = 1000, hits_offset: int = 0):
+    """Progress of a block scan and the hits found so far"""
+    status = await run_db(block_scanner.status, scan_id, hits_limit, hits_offset)
+    if status is None:
+        raise HTTPException(status_code=404, detail="Block scan not found")
+    return status
+
+@app.post("/api/block-scan/{scan_id}/pause", response_model=BlockScanStatus)
+async def pause_block_scan(scan_id: int):
+    """Stop a running scan at its last checkpoint"""
+    if await run_db(block_scanner.status, scan_id, hits_limit=0) is None:
+        raise HTTPException(status_code=404, detail="Block scan not found")
+    await block_scanner.pause(scan_id)
+    return await run_db(block_scanner.status, scan_id, hits_limit=0)
+
+@app.post("/api/block-scan/{scan_id}/resume", response_model=BlockScanStatus)
+async def resume_block_scan(scan_id: int):
+    """Continue a paused or failed scan from its checkpoints"""
+    if await run_db(block_scanner.status, scan_id, hits_limit=0) is None:
+        raise HTTPException(status_code=404, detail="Block scan not found")
+    await block_scanner.start(scan_id)
+    return await run_db(block_scanner.status, scan_id, hits_limit=0)
+
 @app.get("/")
 def root():
     """Root endpoint to verify service status and capabilities"""
@@ -873,17 +5373,170 @@ def root():
             "Multi-factor risk scoring",
             "Behavioral pattern detection",
             "Entity label extraction",
-            "Temporal anomaly detection"
+            "Temporal anomaly detection",
+            "Per-transaction token flow graphs",
+            "Multi-hop taint tracing",
+            "Wallet clustering",
+            "Concurrent multi-chain address profiles",
+            "Watchlist monitoring with alerting",
+            "Block-range sanctions screening",
+            "Persisted analysis history",
+            "Indexed search over stored analyses",
+            "Precomputed indirect exposure",
+            "Rolling per-address behavioral baselines",
+            "Activity heatmaps with timezone inference",
+            "Prometheus metrics",
+            "On-demand sampling profiler"
         ],
         "endpoints": {
             "analyze_transaction": "/api/analyze-transaction/{tx_hash}",
             "analyze_address": "/api/analyze-address/{address}",
+            "analyze_address_multichain": "/api/analyze-address/{address}/multichain",
+            "transaction_flow": "/api/transaction-flow/{tx_hash}",
+            "trace": "/api/trace/{address}",
+            "clusters": "/api/clusters/{address}",
+            "history": "/api/history/{key}",
+            "search": "/api/search",
+            "exposure": "/api/exposure/{address}",
+            "baseline": "/api/baseline/{address}",
+            "heatmap": "/api/heatmap/{address}",
+            "watchlist": "/api/watchlist",
+            "watchlist_alerts": "/api/watchlist/alerts",
+            "block_scan": "/api/block-scan",
+            "metrics": "/metrics",
+            "admin_profile": "/api/admin/profile",
             "health": "/health",
             "docs": "/docs"
         },
         "status": "operational"
     }
 
+# Profiling
+# Shared secret for admin endpoints (X-Admin-Token); admin endpoints are disabled when unset
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")
+PROFILER_MAX_SECONDS = float(os.getenv("PROFILER_MAX_SECONDS", "60"))
+# Seconds between stack samples (200 Hz by default)
+PROFILER_INTERVAL = float(os.getenv("PROFILER_INTERVAL", "0.005"))
+
+def require_admin(token: Optional[str]):
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=404, detail="Admin endpoints are disabled")
+    if not token or not hmac.compare_digest(token.encode(), ADMIN_TOKEN.encode()):
+        raise HTTPException(status_code=403, detail="Invalid admin token")
+
+class StackSampler:
+    """Samples every thread's Python stack at a fixed interval and counts collapsed stacks.
+
+    Runs in its own thread and only reads frames, so the profiled threads pay nothing between samples.
+    """
+
+    def __init__(self, interval: float = PROFILER_INTERVAL):
+        self.interval = interval
+        self.counts: Dict[str, int] = defaultdict(int)
+        self.samples = 0
+
+    @staticmethod
+    def frame_name(frame) -> str:
+        code = frame.f_code
+        return f"{os.path.basename(code.co_filename)}:{code.co_name}"
+
+    def sample(self, own_ident: int, thread_names: Dict[int, str]):
+        for ident, frame in sys._current_frames().items():
+            if ident == own_ident:
+                continue
+            stack = []
+            while frame is not None:
+                stack.append(self.frame_name(frame))
+                frame = frame.f_back
+            stack.append(thread_names.get(ident, str(ident)))
+            self.counts[";".join(reversed(stack))] += 1
+        self.samples += 1
+
+    def run(self, seconds: float):
+        own_ident = threading.get_ident()
+        deadline = time.perf_counter() + seconds
+        thread_names = {thread.ident: thread.name for thread in threading.enumerate()}
+        next_sample = time.perf_counter()
+        while next_sample < deadline:
+            if self.samples % 200 == 0:
+                thread_names = {thread.ident: thread.name for thread in threading.enumerate()}
+            self.sample(own_ident, thread_names)
+            next_sample += self.interval
+            time.sleep(max(0.0, next_sample - time.perf_counter()))
+
+    def collapsed(self) -> str:
+        """Brendan Gregg's folded-stack format, ready for flamegraph.pl or speedscope"""
+        return "".join(f"{stack} {count}\n" for stack, count in sorted(self.counts.items()))
+
+_profiler_lock = asyncio.Lock()
+
+@app.post("/api/admin/profile")
+async def profile(seconds: float = 10.0, format: str = "collapsed", x_admin_token: Optional[str] = Header(None)):
+    """
+    Profile the running worker for a number of seconds
+    
+    - **seconds**: Profiling window (capped by PROFILER_MAX_SECONDS)
+    - **format**: `collapsed` samples every thread's stack (flamegraph input, low overhead);
+      `pstats` runs cProfile on the event-loop thread and returns a binary dump for pstats/snakeviz
+    
+    Requires the `X-Admin-Token` header. One profile runs at a time.
+    """
+    require_admin(x_admin_token)
+    if format not in ("collapsed", "pstats"):
+        raise HTTPException(status_code=400, detail="format must be 'collapsed' or 'pstats'")
+    if not 0 < seconds <= PROFILER_MAX_SECONDS:
+        raise HTTPException(status_code=400, detail=f"seconds must be in (0, {PROFILER_MAX_SECONDS:g}]")
+    if _profiler_lock.locked():
+        raise HTTPException(status_code=409, detail="A profile is already running")
+    
+    async with _profiler_lock:
+        if format == "pstats":
+            # Deterministic profiling of everything the event loop runs in the window (higher overhead)
+            profiler = cProfile.Profile()
+            profiler.enable()
+            try:
+                await asyncio.sleep(seconds)
+            finally:
+                profiler.disable()
+            profiler.create_stats()
+            return Response(
+                content=marshal.dumps(profiler.stats),
+                media_type="application/octet-stream",
+                headers={"Content-Disposition": 'attachment; filename="profile.pstats"'}
+            )
+        
+        sampler = StackSampler()
+        await asyncio.get_running_loop().run_in_executor(None, sampler.run, seconds)
+        return Response(
+            content=sampler.collapsed(),
+            media_type="text/plain",
+            headers={"X-Profile-Samples": str(sampler.samples)}
+        )
+
+_event_loop_monitor: Optional[asyncio.Task] = None
+
+@app.on_event("startup")
+async def start_event_loop_monitor():
+    global _event_loop_monitor
+    _event_loop_monitor = asyncio.create_task(monitor_event_loop_lag())
+
+@app.on_event("shutdown")
+async def stop_event_loop_monitor():
+    if _event_loop_monitor:
+        _event_loop_monitor.cancel()
+
+@app.get("/metrics")
+def metrics():
+    """Prometheus text exposition of request, upstream, cache and event-loop metrics"""
+    for name, cache in (("counterparty_verdicts", counterparty_verdicts), ("tx_response", tx_response_cache)):
+        cache_hits_total.set(name, value=cache.hits)
+        cache_misses_total.set(name, value=cache.misses)
+        cache_entries.set(name, value=len(cache.entries))
+    lines = []
+    for metric in METRICS:
+        lines.extend(metric.render())
+    return Response(content="\n".join(lines) + "\n", media_type="text/plain; version=0.0.4")
+
 @app.get("/health")
 def health():
     """Health check endpoint containing a live Moralis connectivity test"""
@@ -894,6 +5547,12 @@ def health():
             "status": "healthy",
             "moralis_connected": True,
             "api_version": "1.0.0",
+            "counterparty_cache": {
+                "entries": len(counterparty_verdicts.entries),
+                "hits": counterparty_verdicts.hits,
+                "misses": counterparty_verdicts.misses,
+                "label_set_version": counterparty_verdicts.version
+            },
             "timestamp": datetime.utcnow().isoformat()
         }
     except:
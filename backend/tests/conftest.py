@@ -0,0 +1,48 @@
+import os
+import sys
+import tempfile
+
+import pytest
+
+# app reads its configuration at import time: point it at a throwaway database, keep the
+# background schedulers off and satisfy the Moralis key check before the first import
+os.environ["MORALIS_KEY"] = "test-key"
+os.environ["FORENSICS_DB_PATH"] = os.path.join(tempfile.mkdtemp(prefix="forensics-tests-"), "forensics.db")
+os.environ["WATCHLIST_ENABLED"] = "false"
+os.environ["EXPOSURE_ENABLED"] = "false"
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app as forensics  # noqa: E402
+
+
+@pytest.fixture
+def app_module():
+    return forensics
+
+
+@pytest.fixture
+def moralis(monkeypatch):
+    """Serve upstream calls from a dict of endpoint -> response (or exception to raise) and record every call"""
+    responses = {}
+    calls = []
+
+    async def fake_request(endpoint, params=None):
+        calls.append((endpoint, dict(params or {})))
+        if endpoint not in responses:
+            raise forensics.HTTPException(status_code=404, detail="Not found")
+        response = responses[endpoint]
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+    monkeypatch.setattr(forensics, "moralis_request_async", fake_request)
+    fake_request.responses = responses
+    fake_request.calls = calls
+    return fake_request
+
+
+@pytest.fixture
+def client():
+    from fastapi.testclient import TestClient
+    return TestClient(forensics.app)
@@ -0,0 +1,47 @@
+import asyncio
+import json
+
+
+def address(tag: str) -> str:
+    return "0x" + tag.encode().hex().ljust(40, "0")[:40]
+
+
+def transfer(tx_hash, sender, recipient, value, timestamp):
+    return {
+        "hash": tx_hash, "from_address": sender, "to_address": recipient, "value": str(value),
+        "block_number": "1", "block_timestamp": timestamp, "logs": []
+    }
+
+
+def test_address_analysis_round_trip(app_module, moralis):
+    subject, counterparty = address("analysis-subject"), address("analysis-peer")
+    moralis.responses[f"/{subject}/verbose"] = {"result": [
+        transfer("0xa1", counterparty, subject, 2 * 10**18, "2024-03-01T10:00:00.000Z"),
+        transfer("0xa2", subject, counterparty, 10**18, "2024-03-02T10:00:00.000Z"),
+    ]}
+    result = asyncio.run(app_module.run_address_analysis(subject))
+
+    [stored] = app_module.analysis_store.history(subject)
+    assert (stored.kind, stored.subject, stored.risk_score) == ("address", subject, result.risk_score)
+    assert stored.result == json.loads(result.model_dump_json())
+    # Counterparties index the analysis too
+    assert [s.id for s in app_module.analysis_store.history(counterparty, include_result=False)] == [stored.id]
+
+
+def test_transaction_analysis_is_stored_once(app_module, moralis, client):
+    sender, recipient = address("dedupe-sender"), address("dedupe-recipient")
+    tx_hash = "0x" + "d1" * 32
+    moralis.responses[f"/transaction/{tx_hash}/verbose"] = transfer(
+        tx_hash, sender, recipient, 10**18, "2024-03-01T10:00:00.000Z"
+    )
+    first = client.get(f"/api/analyze-transaction/{tx_hash}")
+    assert first.status_code == 200
+    # A cache hit, a revalidation and a cold recompute under the same versions add no rows
+    assert client.get(f"/api/analyze-transaction/{tx_hash}").status_code == 200
+    assert client.get(
+        f"/api/analyze-transaction/{tx_hash}", headers={"If-None-Match": first.headers["ETag"]}
+    ).status_code == 304
+    app_module.tx_response_cache.entries.clear()
+    assert client.get(f"/api/analyze-transaction/{tx_hash}").status_code == 200
+
+    assert [s.subject for s in app_module.analysis_store.history(tx_hash, include_result=False)] == [tx_hash]
@@ -0,0 +1,29 @@
+def address(tag: str) -> str:
+    return "0x" + tag.encode().hex().ljust(40, "0")[:40]
+
+
+def hourly(subject, peers, day="2024-04-01"):
+    return [
+        {
+            "hash": f"0xb{i}", "from_address": subject, "to_address": peer, "value": str(10**18),
+            "block_timestamp": f"{day}T{i:02d}:00:00.000Z"
+        }
+        for i, peer in enumerate(peers)
+    ]
+
+
+def test_baseline_round_trip(app_module):
+    store = app_module.baseline_store
+    subject, peer = address("baseline-subject"), address("baseline-peer")
+    transactions = hourly(subject, [peer if i % 2 else address(f"baseline-{i}") for i in range(6)])
+    store.observe(subject, "eth", transactions)
+    # Re-observing the same page is a no-op: only transactions newer than the baseline are folded in
+    store.observe(subject, "eth", transactions)
+
+    stats = store.stats(subject, "eth")
+    assert stats.transactions_observed == 6
+    assert stats.last_seen == "2024-04-01T05:00:00+00:00"
+    assert abs(stats.inter_arrival_seconds.mean - 3600) < 1
+    assert abs(stats.counterparty_churn - 4 / 6) < 1e-9
+    assert store.seen_counterparties(subject, "eth", {peer, address("never-seen")}) == {peer}
+    assert store.stats(address("no-baseline"), "eth") is None
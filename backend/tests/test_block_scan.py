@@ -0,0 +1,49 @@
+import asyncio
+
+SANCTIONED = "0x722122df12d4e14e13ac3b6895a86e84145b6967"
+
+
+def block(number, recipient):
+    return {"number": str(number), "transactions": [{
+        "hash": f"0x{number:x}", "from_address": f"0x{number:040x}", "to_address": recipient, "logs": []
+    }]}
+
+
+def scan(app_module, from_block, to_block):
+    scanner = app_module.block_scanner
+
+    async def run():
+        scan_id = await app_module.run_db(scanner.create, "eth", from_block, to_block)
+        await scanner.start(scan_id)
+        await scanner.tasks[scan_id]
+        return scanner.status(scan_id)
+
+    return asyncio.run(run())
+
+
+def test_scan_records_hits_and_completes(app_module, moralis):
+    for number in range(100, 104):
+        moralis.responses[f"/block/{number}"] = block(number, SANCTIONED if number == 102 else f"0x{number + 1:040x}")
+    status = scan(app_module, 100, 103)
+    assert (status.status, status.blocks_done, status.transactions_screened) == ("completed", 4, 4)
+    assert [(hit.block_number, hit.address, hit.category) for hit in status.hits] == [(102, SANCTIONED, "sanctioned")]
+
+
+def test_upstream_failure_marks_scan_failed(app_module, moralis, monkeypatch):
+    monkeypatch.setattr(app_module, "BLOCK_SCAN_RETRIES", 1)
+    moralis.responses["/block/200"] = block(200, f"0x{201:040x}")
+    moralis.responses["/block/201"] = app_module.HTTPException(status_code=500, detail="upstream down")
+    status = scan(app_module, 200, 201)
+    assert (status.status, status.error) == ("failed", "upstream down")
+
+
+def test_stage_failure_marks_scan_failed(app_module, moralis, monkeypatch):
+    def broken(block):
+        raise ValueError("bad block")
+
+    monkeypatch.setattr(app_module, "extract_block_addresses", broken)
+    monkeypatch.setattr(app_module, "BLOCK_SCAN_QUEUE_SIZE", 1)
+    for number in range(300, 310):
+        moralis.responses[f"/block/{number}"] = block(number, f"0x{number + 1:040x}")
+    status = scan(app_module, 300, 309)
+    assert (status.status, status.error, status.blocks_done) == ("failed", "bad block", 0)
@@ -0,0 +1,52 @@
+import asyncio
+
+
+def address(tag: str) -> str:
+    return "0x" + tag.encode().hex().ljust(40, "0")[:40]
+
+
+def transfer(tx_hash, sender, recipient, value, timestamp, **extra):
+    return {
+        "hash": tx_hash, "from_address": sender, "to_address": recipient, "value": str(value),
+        "block_number": "1", "block_timestamp": timestamp, "logs": [], **extra
+    }
+
+
+def test_funding_source_needs_complete_history(app_module):
+    engine = app_module.cluster_engine
+    funder, funded = address("cluster-funder"), address("cluster-funded")
+    first = transfer("0xc1", funder, funded, 10**17, "2024-01-01T00:00:00.000Z")
+    later = transfer("0xc2", funded, address("cluster-shop"), 10**16, "2024-01-02T00:00:00.000Z")
+
+    engine.observe([first, later], subject=funded, history_complete=False)
+    assert engine.get_cluster(funded).size == 1
+
+    engine.observe([first, later], subject=funded, history_complete=True)
+    cluster = engine.get_cluster(funded)
+    assert {w.address for w in cluster.wallets} == {funder, funded}
+    assert cluster.heuristics == {"funding_source": 1}
+    assert engine.get_cluster(funder).cluster_id == cluster.cluster_id
+
+
+def test_shared_deposit_address_links_its_payers(app_module):
+    engine = app_module.cluster_engine
+    exchange = next(iter(app_module.KNOWN_EXCHANGES))
+    deposit, alice, bob = address("deposit"), address("deposit-alice"), address("deposit-bob")
+    engine.observe([
+        transfer("0xd1", deposit, exchange, 10**18, "2024-02-01T00:00:00.000Z"),
+        transfer("0xd2", alice, deposit, 10**18, "2024-02-02T00:00:00.000Z"),
+        transfer("0xd3", bob, deposit, 10**18, "2024-02-03T00:00:00.000Z"),
+    ])
+    cluster = engine.get_cluster(alice)
+    assert {w.address for w in cluster.wallets} == {deposit, alice, bob}
+    assert cluster.heuristics == {"shared_deposit": 2}
+
+
+def test_cluster_endpoint_refresh(app_module, moralis, client):
+    funder, funded = address("endpoint-funder"), address("endpoint-funded")
+    moralis.responses[f"/{funded}/verbose"] = {"result": [
+        transfer("0xe1", funder, funded, 10**17, "2024-03-01T00:00:00.000Z")
+    ]}
+    assert client.get(f"/api/clusters/{funded}").json()["size"] == 1
+    body = client.get(f"/api/clusters/{funded}", params={"refresh": "true"}).json()
+    assert {w["address"] for w in body["wallets"]} == {funder, funded}
@@ -0,0 +1,17 @@
+import asyncio
+import threading
+
+
+def test_run_db_uses_the_database_thread(app_module):
+    name = asyncio.run(app_module.run_db(lambda: threading.current_thread().name))
+    assert name.startswith("sqlite")
+
+
+def test_run_db_passes_arguments_and_errors(app_module):
+    assert asyncio.run(app_module.run_db(divmod, 7, 2)) == (3, 1)
+    try:
+        asyncio.run(app_module.run_db(int, "not a number"))
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("run_db swallowed the error")
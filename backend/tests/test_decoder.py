@@ -0,0 +1,67 @@
+import pytest
+
+
+def topic_of(signature: str) -> str:
+    keccak = pytest.importorskip("Crypto.Hash.keccak")
+    return "0x" + keccak.new(digest_bits=256, data=signature.encode()).hexdigest()
+
+
+def address_topic(address: str) -> str:
+    return "0x" + "0" * 24 + address[2:]
+
+
+def test_signature_table_topics_match_keccak(app_module):
+    for topic, spec in app_module.EVENT_SIGNATURES.items():
+        assert topic == topic_of(spec["signature"]), spec["signature"]
+
+
+def test_signature_table_inputs_match_signature(app_module):
+    for spec in app_module.EVENT_SIGNATURES.values():
+        name, _, types = spec["signature"].partition("(")
+        assert name == spec["name"]
+        assert types.rstrip(")").split(",") == [i["type"] for i in spec["inputs"]]
+
+
+def test_weth_wrap_topics(app_module):
+    assert app_module.WETH_WRAP_TOPICS["Deposit"] == topic_of("Deposit(address,uint256)")
+    assert app_module.WETH_WRAP_TOPICS["Withdrawal"] == topic_of("Withdrawal(address,uint256)")
+    assert app_module.TOPIC_TRANSFER == topic_of("Transfer(address,address,uint256)")
+
+
+def test_decodes_erc20_transfer(app_module):
+    sender, recipient = "0x" + "11" * 20, "0x" + "22" * 20
+    decoded = app_module.decode_log({
+        "topic0": app_module.TOPIC_TRANSFER,
+        "topic1": address_topic(sender),
+        "topic2": address_topic(recipient),
+        "data": "0x" + f"{10**30:064x}"
+    })
+    assert decoded["label"] == "Transfer"
+    assert [p["value"] for p in decoded["params"]] == [sender, recipient, str(10**30)]
+
+
+def test_decodes_bundled_event(app_module):
+    dst = "0x" + "ab" * 20
+    decoded = app_module.decode_log({
+        "topics": [app_module.WETH_WRAP_TOPICS["Deposit"], address_topic(dst)],
+        "data": "0x" + f"{5 * 10**18:064x}"
+    })
+    assert decoded["label"] == "Deposit"
+    assert {p["name"]: p["value"] for p in decoded["params"]} == {"dst": dst, "wad": str(5 * 10**18)}
+
+
+def test_undecodable_logs_are_left_alone(app_module):
+    logs = [
+        # Indexed parameter missing from the topics
+        {"topics": [app_module.WETH_WRAP_TOPICS["Deposit"]], "data": "0x" + "0" * 64},
+        # Unknown event
+        {"topics": ["0x" + "ee" * 32], "data": "0x"}
+    ]
+    assert app_module.decode_missing_events(logs) == 0
+    assert not any("decoded_event" in log for log in logs)
+
+
+def test_moralis_decoded_logs_are_kept(app_module):
+    logs = [{"decoded_event": {"label": "Custom"}, "topic0": app_module.TOPIC_TRANSFER}]
+    assert app_module.decode_missing_events(logs) == 0
+    assert logs[0]["decoded_event"] == {"label": "Custom"}
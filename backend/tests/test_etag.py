@@ -0,0 +1,20 @@
+def test_etag_and_cache_follow_the_price_table(app_module, moralis, client, monkeypatch):
+    tx_hash = "0x" + "e7" * 32
+    moralis.responses[f"/transaction/{tx_hash}/verbose"] = {
+        "hash": tx_hash, "from_address": "0x" + "01" * 20, "to_address": "0x" + "02" * 20,
+        "value": str(10**18), "block_number": "1", "block_timestamp": "2024-03-01T10:00:00.000Z", "logs": []
+    }
+    first = client.get(f"/api/analyze-transaction/{tx_hash}")
+    etag = first.headers["ETag"]
+    assert client.get(f"/api/analyze-transaction/{tx_hash}", headers={"If-None-Match": etag}).status_code == 304
+
+    # New price data must invalidate both the client's copy and the server's cached body
+    prices = app_module.PriceTable({"ETH": 4000})
+    monkeypatch.setattr(app_module, "price_table", prices)
+    repriced = client.get(f"/api/analyze-transaction/{tx_hash}", headers={"If-None-Match": etag})
+    assert repriced.status_code == 200 and repriced.headers["ETag"] != etag
+    assert repriced.json()["details"]["value_usd"] == 4000.0
+
+    monkeypatch.setattr(app_module, "APP_VERSION", "next-build")
+    rebuilt = client.get(f"/api/analyze-transaction/{tx_hash}", headers={"If-None-Match": repriced.headers["ETag"]})
+    assert rebuilt.status_code == 200 and rebuilt.headers["ETag"] != repriced.headers["ETag"]
@@ -0,0 +1,37 @@
+def address(tag: str) -> str:
+    return "0x" + tag.encode().hex().ljust(40, "0")[:40]
+
+
+def test_exposure_round_trip(app_module):
+    index = app_module.exposure_index
+    exposed, source = address("exposed"), next(iter(app_module.SANCTIONS_LIST))
+    index._replace(
+        "exposure-test",
+        [(exposed, "exposure-test", source, "sanctioned", 2, str(3 * 10**18))],
+        [(exposed, "exposure-test", str(3 * 10**18), "0", 2)],
+        [(exposed, "exposure-test", "0xe1", str(2 * 10**18), "0"), (exposed, "exposure-test", "0xe2", str(10**18), "0")],
+        4
+    )
+    assert index.lookup(exposed, "exposure-test") == (3 * 10**18, 0, 2)
+    assert index.transfer_taint(exposed, "exposure-test", ["0xe1", "0xunrelated"]) == (2 * 10**18, 0)
+    summary = index.summary(exposed, "exposure-test")
+    assert (summary.sanctioned_amount, summary.nearest_hops, summary.sources[0].source) == (3.0, 2, source)
+
+    # A rebuild replaces the chain's rows instead of adding to them
+    index._replace("exposure-test", [], [], [], 0)
+    assert index.lookup(exposed, "exposure-test") is None
+    assert index.transfer_taint(exposed, "exposure-test", ["0xe1"]) == (0, 0)
+
+
+def test_rebuild_requires_admin_and_runs_once_per_chain(app_module, client, monkeypatch):
+    monkeypatch.setattr(app_module, "ADMIN_TOKEN", "secret")
+    assert client.post("/api/exposure/rebuild").status_code == 403
+    assert client.post("/api/exposure/rebuild", headers={"X-Admin-Token": "wrong"}).status_code == 403
+
+    monkeypatch.setattr(app_module.exposure_index, "rebuilding", {"eth"})
+    assert client.post("/api/exposure/rebuild", headers={"X-Admin-Token": "secret"}).status_code == 409
+
+
+def test_rebuild_is_disabled_without_admin_token(app_module, client, monkeypatch):
+    monkeypatch.setattr(app_module, "ADMIN_TOKEN", "")
+    assert client.post("/api/exposure/rebuild").status_code == 404
@@ -0,0 +1,79 @@
+def address_topic(address: str) -> str:
+    return "0x" + "0" * 24 + address[2:]
+
+
+A, B, C = ("0x" + c * 40 for c in "abc")
+COLLECTION = "0x" + "7" * 40
+BIG_ID = 10**70
+
+
+def params(**values):
+    return [{"name": name, "value": value} for name, value in values.items()]
+
+
+def log(label, log_index, **values):
+    return {"address": COLLECTION, "log_index": str(log_index), "decoded_event": {"label": label, "params": params(**values)}}
+
+
+def graph(app_module, *logs):
+    return app_module.build_token_flow_graph({"from_address": A, "to_address": COLLECTION, "value": "0", "logs": list(logs)})
+
+
+def test_erc20_transfer_amount(app_module):
+    edges, balances, _, count = graph(app_module, log("Transfer", 0, **{"from": A, "to": B, "value": "250"}))
+    assert edges[(A, B, COLLECTION)][0] == 250
+    assert balances[B][COLLECTION] == [250, 0]
+    assert count == 1
+
+
+def test_erc721_token_id_is_not_an_amount(app_module):
+    edges, balances, _, _ = graph(
+        app_module,
+        log("Transfer", 0, **{"from": A, "to": B, "tokenId": str(BIG_ID)}),
+        log("Transfer", 1, **{"from": A, "to": B, "tokenId": "8"}),
+    )
+    amount, count, _, kind, token_ids = edges[(A, B, COLLECTION)]
+    assert (amount, count, kind, token_ids) == (2, 2, "nft", [str(BIG_ID), "8"])
+    assert balances[A][COLLECTION] == [0, 2]
+
+
+def test_undecoded_erc721_transfer_reads_id_from_topic3(app_module):
+    raw = {
+        "address": COLLECTION, "log_index": "0",
+        "topic0": app_module.TOPIC_TRANSFER, "topic1": address_topic(A), "topic2": address_topic(B),
+        "topic3": "0x" + f"{BIG_ID:064x}", "data": "0x"
+    }
+    app_module.decode_missing_events([raw])
+    edges, _, _, _ = graph(app_module, raw)
+    assert edges[(A, B, COLLECTION)][0] == 1
+    assert edges[(A, B, COLLECTION)][4] == [str(BIG_ID)]
+
+
+def test_erc1155_transfers_use_their_values(app_module):
+    edges, balances, _, count = graph(
+        app_module,
+        log("TransferSingle", 0, operator=A, **{"from": A, "to": B, "id": str(BIG_ID), "value": "5"}),
+        log("TransferBatch", 1, operator=A, **{"from": B, "to": C, "ids": ["1", "2"], "values": ["3", "4"]}),
+        log("TransferBatch", 2, operator=A, **{"from": B, "to": C, "ids": '["9"]', "values": '["1"]'}),
+    )
+    assert edges[(A, B, COLLECTION)][0] == 5
+    assert edges[(A, B, COLLECTION)][4] == [str(BIG_ID)]
+    assert edges[(B, C, COLLECTION)][0] == 8
+    assert edges[(B, C, COLLECTION)][4] == ["1", "2", "9"]
+    assert balances[B][COLLECTION] == [5, 8]
+    assert count == 3
+
+
+def test_mismatched_batch_is_skipped(app_module):
+    edges, _, _, count = graph(app_module, log("TransferBatch", 0, **{"from": A, "to": B, "ids": ["1", "2"], "values": ["3"]}))
+    assert edges == {} and count == 0
+
+
+def test_nft_cycle_bottleneck_counts_tokens(app_module):
+    edges, _, _, _ = graph(
+        app_module,
+        log("Transfer", 0, **{"from": A, "to": B, "tokenId": str(BIG_ID)}),
+        log("Transfer", 1, **{"from": B, "to": A, "tokenId": str(BIG_ID)}),
+    )
+    [finding] = app_module.detect_transaction_cycles(edges)
+    assert finding.value == "1"
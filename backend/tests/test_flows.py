@@ -0,0 +1,70 @@
+A, B, C, D = ("0x" + c * 40 for c in "abcd")
+TOKEN, OTHER = "0x" + "1" * 40, "0x" + "2" * 40
+
+
+def edge(amount):
+    return [amount, 1, 0, "transfer", []]
+
+
+def components(app_module, adjacency):
+    return sorted(sorted(c) for c in app_module.strongly_connected_components(adjacency))
+
+
+def test_scc_groups_cycles(app_module):
+    adjacency = {A: [B], B: [C], C: [A, D], D: []}
+    assert components(app_module, adjacency) == [[A, B, C], [D]]
+
+
+def test_scc_handles_long_chains_without_recursion(app_module):
+    nodes = [f"0x{i:040x}" for i in range(5000)]
+    adjacency = {a: [b] for a, b in zip(nodes, nodes[1:])}
+    adjacency[nodes[-1]] = [nodes[0]]
+    assert [len(c) for c in app_module.strongly_connected_components(adjacency)] == [5000]
+
+
+def test_same_token_cycle_is_reported_with_bottleneck(app_module):
+    edges = {(A, B, TOKEN): edge(100), (B, C, TOKEN): edge(40), (C, A, TOKEN): edge(90)}
+    [finding] = app_module.detect_transaction_cycles(edges)
+    assert finding.token == TOKEN
+    assert finding.path[0] == finding.path[-1] == A
+    assert set(finding.path) == {A, B, C}
+    assert finding.value == "40"
+    assert finding.component_size == 3
+
+
+def test_swap_across_tokens_is_not_a_cycle(app_module):
+    edges = {(A, B, TOKEN): edge(100), (B, A, OTHER): edge(100)}
+    assert app_module.detect_transaction_cycles(edges) == []
+
+
+def native(tx_hash, sender, recipient, value, timestamp):
+    return {"hash": tx_hash, "from_address": sender, "to_address": recipient, "value": str(value), "block_timestamp": timestamp}
+
+
+def test_round_trip_within_window(app_module):
+    transactions = [
+        native("0x2", B, A, 7, "2024-01-01T02:00:00Z"),
+        native("0x1", A, B, 10, "2024-01-01T00:00:00Z"),
+    ]
+    [finding] = app_module.detect_round_trips(A, transactions, window_hours=24)
+    assert finding.path == [A, B, A]
+    assert finding.tx_hashes == ["0x1", "0x2"]
+    assert finding.value == "7"
+    assert finding.duration_seconds == 7200
+
+
+def test_round_trip_outside_window_or_reversed(app_module):
+    late = [native("0x1", A, B, 10, "2024-01-01T00:00:00Z"), native("0x2", B, A, 10, "2024-01-03T00:00:00Z")]
+    assert app_module.detect_round_trips(A, late, window_hours=24) == []
+    # Receiving first and sending later is a payment, not a round trip
+    reversed_order = [native("0x1", B, A, 10, "2024-01-01T00:00:00Z"), native("0x2", A, B, 10, "2024-01-01T01:00:00Z")]
+    assert app_module.detect_round_trips(A, reversed_order, window_hours=24) == []
+
+
+def test_round_trip_through_exchange_is_ignored(app_module):
+    exchange = next(iter(app_module.KNOWN_EXCHANGES))
+    transactions = [
+        native("0x1", A, exchange, 10, "2024-01-01T00:00:00Z"),
+        native("0x2", exchange, A, 10, "2024-01-01T01:00:00Z"),
+    ]
+    assert app_module.detect_round_trips(A, transactions, window_hours=24) == []
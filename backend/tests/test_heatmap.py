@@ -0,0 +1,16 @@
+def address(tag: str) -> str:
+    return "0x" + tag.encode().hex().ljust(40, "0")[:40]
+
+
+def test_heatmap_counts_by_weekday_and_hour(app_module, client):
+    subject = address("heatmap-subject")
+    # 2024-04-01 was a Monday
+    app_module.baseline_store.observe(subject, "eth", [
+        {"hash": f"0xh{i}", "from_address": subject, "to_address": address("heatmap-peer"), "value": str(10**18),
+         "block_timestamp": f"2024-04-01T{hour:02d}:00:00.000Z"}
+        for i, hour in enumerate((9, 9, 14))
+    ])
+    body = client.get(f"/api/heatmap/{subject}").json()
+    assert body["transactions"] == 3
+    assert body["counts"][0][9] == 2 and body["counts"][0][14] == 1
+    assert body["value_sums"][0][9] == 2.0
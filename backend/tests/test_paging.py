@@ -0,0 +1,76 @@
+import base64
+import json
+
+import pytest
+
+ADDRESS = "0x" + "5" * 40
+URL = f"/api/analyze-address/{ADDRESS}"
+
+
+@pytest.fixture
+def history(moralis):
+    transactions = [
+        {
+            "hash": f"0x{i:064x}",
+            "from_address": ADDRESS,
+            "to_address": f"0x{i + 1:040x}",
+            "value": str(10**17),
+            "block_number": str(1000 - i),
+            "block_timestamp": f"2024-05-{28 - i % 28:02d}T{23 - i % 24:02d}:00:00.000Z",
+            "logs": []
+        }
+        for i in range(25)
+    ]
+    moralis.responses[f"/{ADDRESS}/verbose"] = {"result": transactions}
+    return transactions
+
+
+def cursor_of(value) -> str:
+    return base64.urlsafe_b64encode(json.dumps(value).encode()).decode()
+
+
+def test_pages_cover_the_window_exactly_once(client, history):
+    full = client.get(URL).json()
+    assert full["next_transactions_cursor"] is None
+
+    seen, cursor = [], None
+    while True:
+        params = {"tx_limit": 10, "fields": "recent_transactions.hash"}
+        if cursor:
+            params["tx_cursor"] = cursor
+        page = client.get(URL, params=params).json()
+        assert set(page) == {"recent_transactions", "next_transactions_cursor"}
+        assert len(page["recent_transactions"]) <= 10
+        seen += [tx["hash"] for tx in page["recent_transactions"]]
+        cursor = page["next_transactions_cursor"]
+        if not cursor:
+            break
+    assert seen == [tx["hash"] for tx in full["recent_transactions"]]
+    assert len(seen) == 25
+
+
+def test_cursor_resumes_by_position_when_its_transaction_left_the_window(client, history):
+    full = client.get(URL).json()["recent_transactions"]
+    # Same block time as the fifth transaction but a hash that was never in the window
+    gone = [full[4]["block_timestamp"], "0x0"]
+    page = client.get(URL, params={"tx_limit": 5, "tx_cursor": cursor_of(gone)}).json()
+    assert [tx["hash"] for tx in page["recent_transactions"]] == [tx["hash"] for tx in full[5:10]]
+
+
+@pytest.mark.parametrize("cursor", [
+    "not base64 at all!",
+    base64.urlsafe_b64encode(b"not json").decode(),
+    cursor_of({"block_timestamp": "x"}),
+    cursor_of(["2024-05-01T00:00:00Z"]),
+    cursor_of([1, 2]),
+    cursor_of(["2024-05-01T00:00:00Z", None]),
+])
+def test_malformed_cursor_is_a_client_error(client, history, cursor):
+    response = client.get(URL, params={"tx_limit": 5, "tx_cursor": cursor})
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Invalid tx_cursor"
+
+
+@pytest.mark.parametrize("tx_limit", [0, -3, 1001])
+def test_tx_limit_out_of_range_is_rejected(client, history, tx_limit):
+    assert client.get(URL, params={"tx_limit": tx_limit}).status_code == 422
@@ -0,0 +1,78 @@
+import json
+import os
+
+import pytest
+
+RULES = {
+    "version": 1,
+    "rulesets": {
+        "risk": [
+            {"id": "sanctioned", "when": {"any_code": ["SANCTIONED_FROM", "SANCTIONED_TO"]}, "score": 70, "factor": "Sanctioned"},
+            {"id": "mixer", "when": {"any_code": ["MIXER_DETECTED"]}, "score": 40, "factor": "Mixer"},
+            {"id": "complex", "when": {"metric": "complexity", "op": ">", "value": 50}, "score": 20, "factor": "Complexity {complexity}"},
+            {"id": "flat", "score": 1}
+        ]
+    }
+}
+
+
+@pytest.fixture
+def rules_path(tmp_path):
+    path = tmp_path / "rules.json"
+    path.write_text(json.dumps(RULES))
+    return path
+
+
+def flags(app_module, *codes):
+    return [app_module.make_flag(code, code) for code in codes]
+
+
+def test_codes_and_metrics_score(app_module, rules_path):
+    engine = app_module.RiskRuleEngine(str(rules_path))
+    assert engine.evaluate("risk", []) == (1, [])
+    assert engine.evaluate("risk", flags(app_module, "MIXER_DETECTED")) == (41, ["Mixer"])
+    score, factors = engine.evaluate("risk", flags(app_module, "SANCTIONED_TO"), {"complexity": 60})
+    assert score == 91
+    assert factors == ["Sanctioned", "Complexity 60"]
+
+
+def test_score_is_clamped_and_unknown_codes_ignored(app_module, rules_path):
+    engine = app_module.RiskRuleEngine(str(rules_path))
+    score, _ = engine.evaluate("risk", flags(app_module, "SANCTIONED_FROM", "MIXER_DETECTED", "UNKNOWN"), {"complexity": 99})
+    assert score == 100
+    assert engine.evaluate("missing", flags(app_module, "MIXER_DETECTED")) == (0, [])
+
+
+def test_any_code_matches_once_per_rule(app_module, rules_path):
+    engine = app_module.RiskRuleEngine(str(rules_path))
+    score, factors = engine.evaluate("risk", flags(app_module, "SANCTIONED_FROM", "SANCTIONED_TO"))
+    assert (score, factors) == (71, ["Sanctioned"])
+
+
+def test_unknown_operator_is_rejected(app_module, tmp_path):
+    path = tmp_path / "rules.json"
+    path.write_text(json.dumps({"rulesets": {"risk": [{"id": "bad", "when": {"metric": "x", "op": "~"}, "score": 5}]}}))
+    with pytest.raises(ValueError):
+        app_module.RiskRuleEngine(str(path))
+
+
+def test_broken_edit_keeps_previous_rules(app_module, rules_path, monkeypatch):
+    monkeypatch.setattr(app_module, "RISK_RULES_RELOAD_SECONDS", 0)
+    engine = app_module.RiskRuleEngine(str(rules_path))
+    version = engine.current_version()
+    rules_path.write_text("{not json")
+    os.utime(rules_path, (1, 1))
+    assert engine.current_version() == version
+    assert engine.evaluate("risk", flags(app_module, "MIXER_DETECTED"))[0] == 41
+
+    changed = json.loads(json.dumps(RULES))
+    changed["rulesets"]["risk"][1]["score"] = 10
+    rules_path.write_text(json.dumps(changed))
+    os.utime(rules_path, (2, 2))
+    assert engine.current_version() != version
+    assert engine.evaluate("risk", flags(app_module, "MIXER_DETECTED"))[0] == 11
+
+
+def test_bundled_rules_score_sanctioned_as_critical(app_module):
+    score, _ = app_module.risk_rules.evaluate("risk", flags(app_module, "SANCTIONED_TO"))
+    assert app_module.risk_level_for_score(score) == "CRITICAL"
@@ -0,0 +1,24 @@
+import asyncio
+
+
+def address(tag: str) -> str:
+    return "0x" + tag.encode().hex().ljust(40, "0")[:40]
+
+
+def test_search_by_address_and_kind(app_module, moralis, client):
+    subject, counterparty = address("search-subject"), address("search-peer")
+    moralis.responses[f"/{subject}/verbose"] = {"result": [{
+        "hash": "0xf1", "from_address": counterparty, "to_address": subject, "value": str(10**18),
+        "block_number": "1", "block_timestamp": "2024-03-01T10:00:00.000Z", "logs": []
+    }]}
+    asyncio.run(app_module.run_address_analysis(subject))
+    [stored] = app_module.analysis_store.history(subject, include_result=False)
+
+    body = client.get("/api/search", params={"address": subject, "kind": "address", "sort": "analyzed_at"}).json()
+    assert [item["id"] for item in body["items"]] == [stored.id]
+    assert client.get("/api/search", params={"address": subject, "kind": "transaction"}).json()["items"] == []
+
+
+def test_search_rejects_bad_parameters(client):
+    assert client.get("/api/search", params={"sort": "bogus"}).status_code == 400
+    assert client.get("/api/search", params={"cursor": "!!"}).status_code == 400
@@ -0,0 +1,19 @@
+import pytest
+
+
+@pytest.mark.parametrize("max_requests", ["0", "100000"])
+def test_trace_budget_out_of_range_is_rejected(app_module, client, moralis, max_requests):
+    response = client.get("/api/trace/0x" + "ab" * 20, params={"max_requests": max_requests})
+    assert response.status_code == 422
+    assert moralis.calls == []
+
+
+def test_trace_hops_use_the_chain_native_symbol(client, moralis):
+    root, sanctioned = "0x" + "cd" * 20, "0x722122df12d4e14e13ac3b6895a86e84145b6967"
+    moralis.responses[f"/{root}"] = {"result": [{
+        "hash": "0xb1", "from_address": root, "to_address": sanctioned, "value": str(2 * 10**18),
+        "block_timestamp": "2024-03-01T10:00:00.000Z"
+    }]}
+    body = client.get(f"/api/trace/{root}", params={"chain": "bsc", "max_hops": 1}).json()
+    [path] = body["paths"]
+    assert path["path"][0]["value"] == "2.0000 BNB"
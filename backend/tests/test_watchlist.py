@@ -0,0 +1,44 @@
+import asyncio
+import json
+
+
+def address(tag: str) -> str:
+    return "0x" + tag.encode().hex().ljust(40, "0")[:40]
+
+
+def test_watchlist_round_trip(app_module):
+    monitor = app_module.watchlist_monitor
+    watched = address("watched")
+    assert monitor.add([watched, " "], "eth", 50) == 1
+    assert monitor.add([watched], "eth", 90) == 0
+
+    alert = (1.0, watched, "eth", "0xd1", 7, 80, json.dumps(["message"]), json.dumps(["MIXER_DETECTED"]))
+    state = (80, 0.3, 7, 1.0, 2.0, None)
+    inserted = monitor._record_poll(watched, "eth", [alert], state)
+    assert [row[1:] for row in inserted] == [alert]
+    # The same transaction is never queued twice
+    assert monitor._record_poll(watched, "eth", [alert], state) == []
+
+    [entry] = [e for e in monitor.entries(1000, 0) if e.address == watched]
+    assert (entry.risk_score, entry.last_block, entry.alert_count) == (80, 7, 1)
+    [queued] = [a for a in monitor.pending_alerts(0, 1000) if a.address == watched]
+    assert (queued.tx_hash, queued.flag_codes, queued.delivered) == ("0xd1", ["MIXER_DETECTED"], False)
+
+    monitor._mark_delivered([queued.id])
+    assert monitor.pending_alerts(queued.id - 1, 1)[0].delivered
+    assert monitor.remove(watched, "eth")
+    assert not monitor.remove(watched, "eth")
+
+
+def test_failed_poll_backs_off(app_module, moralis):
+    monitor = app_module.watchlist_monitor
+    watched = address("watched-failing")
+    monitor.add([watched], "eth", 10)
+    moralis.responses[f"/{watched}/verbose"] = app_module.HTTPException(status_code=502, detail="upstream down")
+    asyncio.run(monitor.poll(watched, "eth", 10, 0.0, 5, "page-2", 0))
+    row = app_module.get_db().execute(
+        "SELECT failures, page_cursor, next_poll FROM watchlist WHERE address = ?", (watched,)
+    ).fetchone()
+    assert row[0] == 1 and row[1] is None
+    assert not [d for d in monitor._due(1000) if d[0] == watched]
+    monitor.remove(watched, "eth")